@@ -0,0 +1,244 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import numpy as np
+from GFlowMeter.dissect import Get_Network_Layer
+from GFlowMeter.flowkey import Get_Endpoints, Get_Session_Key
+from GFlowMeter.flowtable import Flow_Table
+from GFlowMeter.gflow import EMIT_BATCH_FLOWS, GFlow_Meter
+from GFlowMeter.reader import Read_Records
+from GFlowMeter.shard import Shard_Flows
+from GFlowMeter.writers import OUTPUT_FORMATS, Get_Writer, Split_Dataset
+from synthetic_pcap import Add_Profile_Arguments, Generate_Pcap, Get_Profile
+
+'''
+GFlowMeter throughput benchmarks.
+Every pipeline stage is timed on its own over the same synthetic (or given) PCAP file:
+read, keying, capture (Flow_Table), tabular (Get_Hex_Flows), statistical
+(Get_Statistical_Features) and one write per output format. With --shards, the flows of the file are
+also assembled with an idle timeout in one process and in --shards processes (shard_flows).
+Like a real run, --dataset-type A or B skips the stages that dataset type does not need.
+The best of --repeat runs is reported and written to a JSON file, see --compare to diff two runs.
+'''
+
+
+def Time_Stage(
+    function: Callable[[Any], Any],
+    repeat: int,
+    setup: Optional[Callable[[], Any]] = None
+) -> Tuple[float, Any]:
+    """
+    Time a stage, keeping the fastest run.
+
+    Args:
+        function: Stage to time, called with the result of setup (or None)
+        repeat: Number of runs
+        setup: Untimed preparation run before every call
+
+    Returns:
+        Tuple of (best wall time in seconds, result of the last call)
+    """
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        tic = time.perf_counter()
+        result = function(state)
+        best = min(best, time.perf_counter() - tic)
+    return best, result
+
+
+def Key_Records(records: List[Any], bidirectional: bool) -> int:
+    keys = set()
+    for record in records:
+        offset, version = Get_Network_Layer(record.data, record.link_type)
+        endpoints = Get_Endpoints(record.data, record.link_type, offset, version)
+        keys.add(Get_Session_Key(endpoints) if bidirectional else endpoints)
+    return len(keys)
+
+
+def Run_Benchmarks(pcap_path: str, args: argparse.Namespace, work_folder: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Time every stage of the pipeline on one PCAP file.
+
+    Args:
+        pcap_path: PCAP file to process
+        args: Parsed command line arguments
+        work_folder: Scratch folder for the writer outputs
+
+    Returns:
+        Dictionary of stage name to its measurements
+    """
+    repeat = args.repeat
+    tool = GFlow_Meter(pcap_path, work_folder, args.sample_type, args.target_sample_length, args.dataset_type,
+                       args.padding_per_packet, show_progress=False)
+    stages: Dict[str, Dict[str, Any]] = {}
+
+    def record(name: str, seconds: float, items: int, unit: str, packets: Optional[int] = None) -> None:
+        stages[name] = {'seconds': seconds, unit: items, f'{unit}_per_second': items / seconds if seconds else None}
+        if packets is not None:
+            stages[name]['packets_per_second'] = packets / seconds if seconds else None
+        print(f"  {name:<18} {seconds * 1000:10.1f} ms  {items / seconds if seconds else 0:12,.0f} {unit}/s")
+
+    seconds, records = Time_Stage(lambda _: list(Read_Records(pcap_path)), repeat)
+    num_packets = len(records)
+    record('read', seconds, num_packets, 'packets')
+
+    seconds, num_keys = Time_Stage(lambda _: Key_Records(records, tool.sample_type == 'bidirectional'), repeat)
+    record('keying', seconds, num_packets, 'packets')
+
+    def capture(_: None) -> Flow_Table:
+        table = Flow_Table(args.sample_type, args.target_sample_length, args.padding_per_packet,
+                           tabular=tool.Check_For_Tabular(), statistical=tool.Check_For_Statistical())
+        table.Add_Records(records)
+        table.Flush()
+        return table
+    seconds, table = Time_Stage(capture, repeat)
+    flows = table.Pop_Expired()
+    record('capture', seconds, num_packets, 'packets')
+    stages['capture']['flows'] = len(flows)
+    stages['keying']['keys'] = num_keys
+
+    tabular, statistical = None, None
+    if tool.Check_For_Tabular():
+        seconds, tabular = Time_Stage(lambda _: tool.Get_Hex_Flows(table, flows), repeat)
+        record('tabular', seconds, len(flows), 'samples', num_packets)
+
+    if tool.Check_For_Statistical():
+        seconds, statistical = Time_Stage(lambda _: tool.Get_Statistical_Features(flows), repeat)
+        record('statistical', seconds, len(flows), 'samples', num_packets)
+
+    dataset = Split_Dataset(pcap_path, 1, np.array([flow.sample_index for flow in flows], dtype=np.int64),
+                            [flow.key for flow in flows], tabular, statistical, tool.feature_names)
+    for output_format in OUTPUT_FORMATS:
+        def write(folder: str) -> str:
+            with Get_Writer(output_format, folder) as writer:
+                writer.Write(dataset)
+            return folder
+        try:
+            seconds, folder = Time_Stage(write, repeat, lambda: tempfile.mkdtemp(dir=work_folder))
+        except ImportError as e:
+            print(f"  write_{output_format:<12} skipped ({e})")
+            stages[f'write_{output_format}'] = {'skipped': str(e)}
+            continue
+        record(f'write_{output_format}', seconds, dataset.num_samples, 'samples')
+        stages[f'write_{output_format}']['bytes'] = Folder_Size(folder)
+
+    # Whole in-process pipeline on the same file: read, capture and the feature sets of the dataset type
+    seconds, _ = Time_Stage(lambda _: tool.Build_Dataset(), repeat)
+    record('end_to_end', seconds, num_packets, 'packets')
+
+    # The same file with flow timeouts, read by one process like workers: 1, then sharded like shard_flows
+    if args.shards > 1:
+        timed = GFlow_Meter(pcap_path, work_folder, args.sample_type, args.target_sample_length, args.dataset_type,
+                            args.padding_per_packet, show_progress=False, idle_timeout=args.idle_timeout)
+        seconds, _ = Time_Stage(lambda _: sum(dataset.num_samples
+                                              for dataset in timed.Iter_Datasets(0, EMIT_BATCH_FLOWS)), repeat)
+        record('timeouts_serial', seconds, num_packets, 'packets')
+        config = {'sample_type': args.sample_type, 'target_sample_length': args.target_sample_length,
+                  'dataset_type': args.dataset_type, 'padding_per_packet': args.padding_per_packet,
+                  'idle_timeout': args.idle_timeout}
+        seconds, _ = Time_Stage(lambda _: sum(dataset.num_samples
+                                              for dataset in Shard_Flows(pcap_path, config, args.shards)), repeat)
+        record('timeouts_sharded', seconds, num_packets, 'packets')
+        stages['timeouts_sharded'].update(shards=args.shards,
+                                          speedup=stages['timeouts_serial']['seconds'] / seconds)
+    return stages
+
+
+def Folder_Size(folder: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(folder) for name in names)
+
+
+def Get_Commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def Compare_Results(baseline: Dict[str, Any], results: Dict[str, Any]) -> None:
+    """
+    Print the speed of every stage relative to a baseline result file.
+
+    Args:
+        baseline: Results of an earlier run
+        results: Results of this run
+    """
+    print(f"\nCompared to {baseline.get('commit') or 'baseline'} ({baseline.get('timestamp')}):")
+    for name, stage in results['stages'].items():
+        before = baseline['stages'].get(name, {})
+        if 'seconds' not in stage or 'seconds' not in before:
+            continue
+        print(f"  {name:<18} {before['seconds'] / stage['seconds']:6.2f}x")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description='Time every GFlowMeter stage and write the results as JSON')
+    parser.add_argument('--pcap', help='Benchmark this PCAP file instead of a synthetic one')
+    Add_Profile_Arguments(parser)
+    parser.add_argument('--sample-type', choices=('bidirectional', 'unidirectional'), default='bidirectional')
+    parser.add_argument('--target-sample-length', type=int, default=784)
+    parser.add_argument('--dataset-type', choices=('A', 'B', 'C'), default='C',
+                        help='A tabular, B statistical, C both')
+    parser.add_argument('--padding-per-packet', action='store_true')
+    parser.add_argument('--shards', type=int, default=0,
+                        help='Also time flow assembly with an idle timeout in one process and in this many')
+    parser.add_argument('--idle-timeout', type=float, default=10.0, help='Idle timeout of the --shards stages')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage, the fastest is kept')
+    parser.add_argument('--output', help='Results file (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--compare', help='Earlier results file to compare against')
+    return parser.parse_args()
+
+
+def main() -> None:
+    args = parse_args()
+    started = datetime.now(timezone.utc)
+    work_folder = tempfile.mkdtemp(prefix='gflow_bench_')
+    try:
+        pcap_path = args.pcap
+        profile = None
+        if pcap_path is None:
+            profile = Get_Profile(args)
+            pcap_path = os.path.join(work_folder, f'synthetic.{profile.file_format}')
+            packets, total_bytes = Generate_Pcap(pcap_path, profile)
+            print(f"Generated {packets} packets ({total_bytes} bytes) in {profile.flows} flows")
+        print(f"Benchmarking {pcap_path} (best of {args.repeat})")
+        stages = Run_Benchmarks(pcap_path, args, work_folder)
+    finally:
+        shutil.rmtree(work_folder, ignore_errors=True)
+
+    results = {
+        'timestamp': started.isoformat(),
+        'commit': Get_Commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'pcap': args.pcap,
+        'profile': profile._asdict() if profile is not None else None,
+        'settings': {'sample_type': args.sample_type, 'target_sample_length': args.target_sample_length,
+                     'dataset_type': args.dataset_type, 'padding_per_packet': args.padding_per_packet,
+                     'repeat': args.repeat, 'shards': args.shards, 'idle_timeout': args.idle_timeout},
+        'stages': stages,
+    }
+    output = args.output or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results',
+                                         started.strftime('%Y%m%d_%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as file:
+            Compare_Results(json.load(file), results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+import argparse
+import random
+import struct
+from typing import BinaryIO, Dict, List, NamedTuple, Tuple
+
+'''
+Deterministic synthetic PCAP / PCAPNG generator for the benchmarks.
+Frames are packed with struct only (no Scapy), so the same profile and seed always produce
+a byte-identical file. Flows are spread over the capture duration and their packets are
+interleaved in timestamp order, like a real capture.
+'''
+
+LINK_TYPES = {'ether': 1, 'sll': 113}
+
+FILE_FORMATS = ('pcap', 'pcapng')
+
+# IP protocol numbers
+PROTOCOLS = {'tcp': 6, 'udp': 17, 'sctp': 132, 'icmp': 1}
+ICMPV6 = 58
+
+ETHERTYPES = {4: 0x0800, 6: 0x86DD}
+
+
+class Traffic_Profile(NamedTuple):
+    flows: int = 1000
+    packets_per_flow: int = 20
+    min_payload: int = 0
+    max_payload: int = 1400
+    protocol_mix: Dict[str, float] = {'tcp': 0.6, 'udp': 0.3, 'sctp': 0.05, 'icmp': 0.05}
+    ipv6_ratio: float = 0.25
+    link_type: str = 'ether'
+    duration: float = 60.0                  # Seconds covered by the capture
+    seed: int = 0
+    file_format: str = 'pcap'               # pcap (microseconds) or pcapng (Enhanced Packet Blocks, nanoseconds)
+
+
+class Synthetic_Flow(NamedTuple):
+    protocol: str
+    version: int
+    client: bytes
+    server: bytes
+    client_port: int
+    server_port: int
+
+
+def Generate_Pcap(path: str, profile: Traffic_Profile) -> Tuple[int, int]:
+    """
+    Write a synthetic PCAP or PCAPNG file.
+
+    Args:
+        path: Output file path
+        profile: Traffic to generate
+
+    Returns:
+        Tuple of (packets written, bytes written)
+
+    Raises:
+        ValueError: If the profile names an unknown link type, protocol or file format
+    """
+    if profile.file_format not in FILE_FORMATS:
+        raise ValueError(f"Invalid file format: {profile.file_format}. Must be one of {', '.join(FILE_FORMATS)}")
+    if profile.link_type not in LINK_TYPES:
+        raise ValueError(f"Invalid link type: {profile.link_type}. Must be one of {', '.join(LINK_TYPES)}")
+    unknown = set(profile.protocol_mix) - set(PROTOCOLS)
+    if unknown:
+        raise ValueError(f"Invalid protocols: {', '.join(sorted(unknown))}. Must be in {', '.join(PROTOCOLS)}")
+
+    rng = random.Random(profile.seed)
+    packets: List[Tuple[float, int, bytes]] = []
+    for flow_number in range(profile.flows):
+        flow = New_Flow(rng, profile, flow_number)
+        timestamp = rng.uniform(0.0, profile.duration)
+        for packet_number in range(profile.packets_per_flow):
+            # Requests and replies alternate, with exponential gaps of 10 ms on average
+            forward = packet_number % 2 == 0
+            payload = rng.randbytes(rng.randint(profile.min_payload, profile.max_payload))
+            frame = Build_Frame(profile.link_type, flow, forward, packet_number, payload)
+            packets.append((timestamp, len(packets), frame))
+            timestamp += rng.expovariate(100.0)
+
+    # The packet number breaks timestamp ties, so the order is deterministic
+    packets.sort()
+    with open(path, 'wb') as file:
+        if profile.file_format == 'pcapng':
+            Write_Pcapng(file, LINK_TYPES[profile.link_type], packets)
+        else:
+            file.write(struct.pack('<IHHiIII', 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINK_TYPES[profile.link_type]))
+            for timestamp, _, frame in packets:
+                seconds = int(timestamp)
+                microseconds = min(int(round((timestamp - seconds) * 1e6)), 999999)
+                file.write(struct.pack('<IIII', seconds, microseconds, len(frame), len(frame)))
+                file.write(frame)
+    return len(packets), sum(len(frame) for _, _, frame in packets)
+
+
+def Write_Pcapng(file: BinaryIO, link_type: int, packets: List[Tuple[float, int, bytes]]) -> None:
+    # Section Header, one Interface Description with if_tsresol = 9 (nanoseconds), then Enhanced Packet Blocks
+    file.write(struct.pack('<IIIHHqI', 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28))
+    file.write(struct.pack('<IIHHIHHBxxxHHI', 0x00000001, 32, link_type, 0, 65535, 9, 1, 9, 0, 0, 32))
+    for timestamp, _, frame in packets:
+        nanoseconds = int(round(timestamp * 1e9))
+        padding = -len(frame) % 4
+        block_length = 32 + len(frame) + padding
+        file.write(struct.pack('<IIIIIII', 0x00000006, block_length, 0, nanoseconds >> 32, nanoseconds & 0xFFFFFFFF,
+                               len(frame), len(frame)))
+        file.write(frame + bytes(padding) + struct.pack('<I', block_length))
+
+
+def New_Flow(rng: random.Random, profile: Traffic_Profile, flow_number: int) -> Synthetic_Flow:
+    protocols = list(profile.protocol_mix)
+    protocol = rng.choices(protocols, weights=[profile.protocol_mix[name] for name in protocols])[0]
+    version = 6 if rng.random() < profile.ipv6_ratio else 4
+    if version == 4:
+        # 10.0.0.0/8 clients, 172.16.0.0/12 servers
+        client = bytes((10,)) + flow_number.to_bytes(3, 'big')
+        server = bytes((172, 16 | rng.randrange(16), rng.randrange(256), rng.randrange(1, 255)))
+    else:
+        client = bytes.fromhex('fd000000000000000000') + flow_number.to_bytes(6, 'big')
+        server = bytes.fromhex('fd010000000000000000') + rng.randbytes(6)
+    return Synthetic_Flow(protocol, version, client, server, rng.randrange(1024, 65536),
+                          rng.choice((53, 80, 443, 5060, 8080, 9899)))
+
+
+def Build_Frame(link_type: str, flow: Synthetic_Flow, forward: bool, packet_number: int, payload: bytes) -> bytes:
+    """
+    Pack one frame of a synthetic flow.
+
+    Args:
+        link_type: 'ether' or 'sll'
+        flow: Flow the frame belongs to
+        forward: True for client to server, False for the reply
+        packet_number: Position of the packet in its flow (sequence numbers)
+        payload: Transport payload
+
+    Returns:
+        Frame bytes, link-layer header included
+    """
+    src, dst = (flow.client, flow.server) if forward else (flow.server, flow.client)
+    sport, dport = (flow.client_port, flow.server_port) if forward else (flow.server_port, flow.client_port)
+    protocol = PROTOCOLS[flow.protocol]
+
+    if flow.protocol == 'tcp':
+        flags = 0x02 if packet_number == 0 else 0x18
+        transport = struct.pack('>HHIIBBHHH', sport, dport, 1000 + packet_number, packet_number, 5 << 4, flags,
+                                65535, 0, 0)
+    elif flow.protocol == 'udp':
+        transport = struct.pack('>HHHH', sport, dport, 8 + len(payload), 0)
+    elif flow.protocol == 'sctp':
+        transport = struct.pack('>HHII', sport, dport, 0x5C7B0000 | flow.client_port, 0)
+    else:
+        # Echo request / reply (ICMPv6 over IPv6)
+        if flow.version == 6:
+            protocol = ICMPV6
+            icmp_type = 128 if forward else 129
+        else:
+            icmp_type = 8 if forward else 0
+        transport = struct.pack('>BBHHH', icmp_type, 0, 0, flow.client_port, packet_number)
+
+    segment = transport + payload
+    if flow.version == 4:
+        header = struct.pack('>BBHHHBBH4s4s', 0x45, 0, 20 + len(segment), packet_number & 0xFFFF, 0x4000, 64,
+                             protocol, 0, src, dst)
+        header = header[:10] + struct.pack('>H', Checksum(header)) + header[12:]
+    else:
+        header = struct.pack('>IHBB16s16s', 6 << 28, len(segment), protocol, 64, src, dst)
+    packet = header + segment
+
+    ethertype = ETHERTYPES[flow.version]
+    if link_type == 'ether':
+        mac_src, mac_dst = (b'\x02\x00\x00\x00\x00\x01', b'\x02\x00\x00\x00\x00\x02')
+        if not forward:
+            mac_src, mac_dst = mac_dst, mac_src
+        return mac_dst + mac_src + struct.pack('>H', ethertype) + packet
+    # Linux cooked capture: packet type (0 to us, 4 outgoing), ARPHRD_ETHER, address length, address, protocol
+    return struct.pack('>HHH8sH', 4 if forward else 0, 1, 6, b'\x02\x00\x00\x00\x00\x01', ethertype) + packet
+
+
+def Checksum(header: bytes) -> int:
+    total = sum(struct.unpack(f'>{len(header) // 2}H', header))
+    while total > 0xFFFF:
+        total = (total & 0xFFFF) + (total >> 16)
+    return ~total & 0xFFFF
+
+
+def Parse_Protocol_Mix(text: str) -> Dict[str, float]:
+    """
+    Parse a protocol mix given as 'tcp=0.6,udp=0.3,sctp=0.05,icmp=0.05'.
+
+    Args:
+        text: Comma separated protocol=weight pairs
+
+    Returns:
+        Dictionary of protocol name to weight
+
+    Raises:
+        ValueError: If a pair is malformed or a weight is negative
+    """
+    mix = {}
+    for pair in text.split(','):
+        name, separator, weight = pair.partition('=')
+        if not separator:
+            raise ValueError(f"Invalid protocol weight: {pair}. Expected protocol=weight")
+        if float(weight) < 0:
+            raise ValueError(f"Invalid protocol weight: {pair}. Must not be negative")
+        mix[name.strip().lower()] = float(weight)
+    return mix
+
+
+def Add_Profile_Arguments(parser: argparse.ArgumentParser) -> None:
+    defaults = Traffic_Profile()
+    parser.add_argument('--flows', type=int, default=defaults.flows, help='Number of flows')
+    parser.add_argument('--packets-per-flow', type=int, default=defaults.packets_per_flow,
+                        help='Packets in every flow')
+    parser.add_argument('--payload', type=int, nargs=2, metavar=('MIN', 'MAX'),
+                        default=(defaults.min_payload, defaults.max_payload), help='Payload size range in bytes')
+    parser.add_argument('--protocols', type=Parse_Protocol_Mix,
+                        default=defaults.protocol_mix, help='Protocol mix, e.g. tcp=0.6,udp=0.3,sctp=0.05,icmp=0.05')
+    parser.add_argument('--ipv6-ratio', type=float, default=defaults.ipv6_ratio, help='Share of IPv6 flows')
+    parser.add_argument('--link-type', choices=sorted(LINK_TYPES), default=defaults.link_type,
+                        help='Link-layer header (Ethernet or Linux cooked capture)')
+    parser.add_argument('--duration', type=float, default=defaults.duration, help='Capture duration in seconds')
+    parser.add_argument('--seed', type=int, default=defaults.seed, help='Random seed')
+    parser.add_argument('--file-format', choices=FILE_FORMATS, default=defaults.file_format,
+                        help='Capture file format')
+
+
+def Get_Profile(args: argparse.Namespace) -> Traffic_Profile:
+    return Traffic_Profile(args.flows, args.packets_per_flow, args.payload[0], args.payload[1], args.protocols,
+                           args.ipv6_ratio, args.link_type, args.duration, args.seed, args.file_format)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description='Generate a deterministic synthetic PCAP or PCAPNG file')
+    parser.add_argument('output', help='Output capture file')
+    Add_Profile_Arguments(parser)
+    args = parser.parse_args()
+    packets, total_bytes = Generate_Pcap(args.output, Get_Profile(args))
+    print(f"Wrote {packets} packets ({total_bytes} bytes) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+import array
+import hashlib
+import json
+import os
+import shutil
+import time
+from typing import Any, BinaryIO, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+from .dissect import Get_Network_Layer, Cut_Addresses, Get_Header_Length
+from .flowkey import Flow_Key, Get_Endpoints, SAMPLED_PROTOCOLS
+from .logger import get_logger
+from .metrics import get_metrics
+from .reader import Read_Records, Record
+
+logger = get_logger()
+
+'''
+On-disk cache of decoded packets.
+A PCAP file is dissected once per capture_interval: the endpoints, timestamp, lengths and stripped
+bytes of every packet of the sampled protocols are stored column by column, keyed by the SHA-256 of
+the file's content and the capture_interval. Reruns that only change output-side settings
+(target_sample_length, padding_per_packet, dataset_type, sample_type, timeouts, output_format)
+rebuild their flows from the memory-mapped columns without parsing a single frame.
+The cache folder is bounded in size, the least recently used entries are evicted first.
+'''
+
+# Entries written with another version are rebuilt, it changes whenever decoding does
+CACHE_VERSION = 2
+
+# Columns of an entry, besides data.bin (stripped bytes of all packets, back to back) and meta.json
+COLUMNS = ('window_packets', 'window_rows', 'endpoints', 'flows', 'timestamps', 'lengths', 'offsets')
+
+MASK_64 = (1 << 64) - 1
+
+
+class Decoded_Packet(NamedTuple):
+    endpoints: Flow_Key                     # Directional key, source endpoint first
+    timestamp: float
+    total_length: int                       # Captured frame length
+    header_length: int                      # Link-layer (or IP) header length, see Get_Header_Length
+    data: np.ndarray                        # uint8 frame bytes without link-layer header, addresses and ports
+
+
+class Decoded_Window():
+    def __init__(
+        self,
+        packets: int,
+        endpoints: List[Flow_Key],
+        flows: np.ndarray,
+        timestamps: np.ndarray,
+        lengths: np.ndarray,
+        offsets: np.ndarray,
+        data: np.ndarray
+    ) -> None:
+        self.packets = packets              # Every packet of the window, also those of other protocols
+        self.endpoints = endpoints          # Distinct endpoints of the window, indexed by flows
+        self.flows = flows
+        self.timestamps = timestamps
+        self.lengths = lengths              # (rows, 2): total length, header length
+        self.offsets = offsets              # rows + 1 offsets into data
+        self.data = data
+
+    def __len__(self) -> int:
+        # Counted like the list of records of the window
+        return self.packets
+
+    def __iter__(self) -> Iterator[Decoded_Packet]:
+        endpoints, data = self.endpoints, self.data
+        offsets = self.offsets.tolist()
+        for row, (flow, timestamp, (total_length, header_length)) in enumerate(
+                zip(self.flows.tolist(), self.timestamps.tolist(), self.lengths.tolist())):
+            yield Decoded_Packet(endpoints[flow], timestamp, total_length, header_length,
+                                 data[offsets[row]:offsets[row + 1]])
+
+    @property
+    def rows(self) -> int:
+        # Packets of the sampled protocols, the ones iterated over
+        return len(self.flows)
+
+
+class Packet_Columns():
+    # Decoded columns of a sequence of records, the stripped bytes go to data_file as they come
+    def __init__(self, data_file: BinaryIO) -> None:
+        self.data_file = data_file
+        self.endpoint_ids: Dict[Flow_Key, int] = {}
+        self.flows = array.array('I')
+        self.timestamps = array.array('d')
+        self.lengths = array.array('I')
+        self.offsets = array.array('q', [0])
+        self.written = 0
+
+    def Add(self, record: Record) -> bool:
+        # Returns False for a packet of another protocol, which is not stored
+        frame, link_type = record.data, record.link_type
+        offset, version = Get_Network_Layer(frame, link_type)
+        endpoints = Get_Endpoints(frame, link_type, offset, version)
+        if endpoints.protocol not in SAMPLED_PROTOCOLS:
+            return False
+        endpoint_id = self.endpoint_ids.get(endpoints)
+        if endpoint_id is None:
+            endpoint_id = self.endpoint_ids[endpoints] = len(self.endpoint_ids)
+        self.flows.append(endpoint_id)
+        self.timestamps.append(record.timestamp)
+        self.lengths.append(len(frame))
+        self.lengths.append(Get_Header_Length(frame, link_type, offset, version))
+        self.written += self.data_file.write(Cut_Addresses(frame, offset, version))
+        self.offsets.append(self.written)
+        return True
+
+    def Get_Columns(self) -> Dict[str, np.ndarray]:
+        # Every column of an entry except the window ones
+        endpoints_table = np.array([(key.protocol, key.address_a >> 64, key.address_a & MASK_64, key.port_a,
+                                     key.address_b >> 64, key.address_b & MASK_64, key.port_b)
+                                    for key in self.endpoint_ids], dtype=np.uint64).reshape(-1, 7)
+        return {
+            'endpoints': endpoints_table,
+            'flows': np.frombuffer(self.flows, dtype=np.uint32),
+            'timestamps': np.frombuffer(self.timestamps, dtype=np.float64),
+            'lengths': np.frombuffer(self.lengths, dtype=np.uint32).reshape(-1, 2),
+            'offsets': np.frombuffer(self.offsets, dtype=np.int64),
+        }
+
+
+class Decoded_Capture():
+    def __init__(self, entry_path: str) -> None:
+        self.entry_path = entry_path
+        # Plain views of the mapped files, slices are pickled by value when a window goes to a worker
+        columns = {name: np.load(os.path.join(entry_path, f'{name}.npy'), mmap_mode='r').view(np.ndarray)
+                   for name in COLUMNS}
+        self.window_packets = columns['window_packets']
+        self.window_rows = columns['window_rows']
+        self.flows = columns['flows']
+        self.timestamps = columns['timestamps']
+        self.lengths = columns['lengths']
+        self.offsets = columns['offsets']
+        data_path = os.path.join(entry_path, 'data.bin')
+        # np.memmap cannot map an empty file
+        self.data = np.zeros(0, dtype=np.uint8)
+        if os.path.getsize(data_path):
+            self.data = np.memmap(data_path, dtype=np.uint8, mode='r').view(np.ndarray)
+        self.endpoints = [Flow_Key(protocol, (a_high << 64) | a_low, port_a, (b_high << 64) | b_low, port_b)
+                          for protocol, a_high, a_low, port_a, b_high, b_low, port_b
+                          in columns['endpoints'].tolist()]
+
+    def __len__(self) -> int:
+        return len(self.window_packets)
+
+    def Get_Window(self, number: int) -> Decoded_Window:
+        # Window numbers are 1-based, like Time_Window
+        return self.Get_Rows(int(self.window_packets[number - 1]), int(self.window_rows[number - 1]),
+                             int(self.window_rows[number]))
+
+    def Get_All(self) -> Decoded_Window:
+        return self.Get_Rows(int(self.window_packets.sum()), 0, len(self.flows))
+
+    def Get_Rows(self, packets: int, start: int, end: int) -> Decoded_Window:
+        # Endpoints are renumbered per window, so a window sent to a worker carries only its own keys
+        ids, flows = np.unique(self.flows[start:end], return_inverse=True)
+        offsets = self.offsets[start:end + 1]
+        base = int(offsets[0]) if len(offsets) else 0
+        return Decoded_Window(packets, [self.endpoints[i] for i in ids.tolist()], flows.astype(np.int32),
+                              self.timestamps[start:end], self.lengths[start:end], offsets - base,
+                              self.data[base:int(offsets[-1])] if len(offsets) else self.data[:0])
+
+
+def Hash_File(path: str) -> str:
+    """
+    SHA-256 of a file's content, read in 1 MiB blocks.
+
+    Args:
+        path: File to hash
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def Get_Entry_Name(content_hash: str, capture_interval: Optional[float]) -> str:
+    # None: the whole file is one window (flow timeouts)
+    interval = 'whole' if capture_interval is None else f'{float(capture_interval)!r}s'
+    return f'{content_hash}_{interval}'
+
+
+def Load_Capture(
+    pcap_path: str,
+    cache_folder: str,
+    capture_interval: Optional[float],
+    max_bytes: int
+) -> Decoded_Capture:
+    """
+    Get the decoded packets of a PCAP file from the cache, dissecting and storing them on a miss.
+
+    Args:
+        pcap_path: PCAP file
+        cache_folder: Cache folder, created if needed
+        capture_interval: Window length in seconds, None for a single window
+        max_bytes: Size bound of the cache folder, least recently used entries are evicted beyond it
+
+    Returns:
+        Decoded_Capture of the file's windows
+    """
+    metrics = get_metrics()
+    entry_path = os.path.join(cache_folder, Get_Entry_Name(Hash_File(pcap_path), capture_interval))
+    if Check_Entry(entry_path):
+        # The modification time orders entries by last use
+        os.utime(entry_path)
+        metrics.Increment('cache_lookups_total', result='hit')
+        logger.debug(f"Decoded-packet cache hit for {pcap_path}: {entry_path}")
+        return Decoded_Capture(entry_path)
+
+    metrics.Increment('cache_lookups_total', result='miss')
+    logger.debug(f"Decoded-packet cache miss for {pcap_path}, dissecting it")
+    os.makedirs(cache_folder, exist_ok=True)
+    # Built next to its final name and renamed, so concurrent runs never see a partial entry
+    temporary_path = f'{entry_path}.{os.getpid()}.tmp'
+    shutil.rmtree(temporary_path, ignore_errors=True)
+    try:
+        with metrics.Timer('stage_duration_seconds', stage='decode'):
+            Decode_Pcap(pcap_path, capture_interval, temporary_path)
+        if Check_Entry(entry_path):
+            shutil.rmtree(temporary_path)   # Stored by another run in the meantime
+        else:
+            shutil.rmtree(entry_path, ignore_errors=True)
+            os.rename(temporary_path, entry_path)
+    except BaseException:
+        shutil.rmtree(temporary_path, ignore_errors=True)
+        raise
+    Evict(cache_folder, max_bytes, keep=entry_path)
+    return Decoded_Capture(entry_path)
+
+
+def Check_Entry(entry_path: str) -> bool:
+    try:
+        with open(os.path.join(entry_path, 'meta.json'), 'r', encoding='utf-8') as file:
+            return json.load(file).get('version') == CACHE_VERSION
+    except (OSError, ValueError):
+        return False
+
+
+def Decode_Pcap(pcap_path: str, capture_interval: Optional[float], entry_path: str) -> None:
+    """
+    Dissect every packet of a PCAP file once and store the columns of a cache entry.
+
+    Args:
+        pcap_path: PCAP file
+        capture_interval: Window length in seconds, None for a single window
+        entry_path: Folder of the entry, created
+    """
+    from .utils import Time_Window
+
+    os.makedirs(entry_path)
+    window = Time_Window(capture_interval) if capture_interval is not None else None
+    window_packets: List[int] = []
+    window_rows: List[int] = [0]
+
+    with open(os.path.join(entry_path, 'data.bin'), 'wb') as data_file:
+        packets = Packet_Columns(data_file)
+        for record in Read_Records(pcap_path):
+            number = window(record) if window is not None else 1
+            if number > len(window_packets):
+                window_rows.append(window_rows[-1])
+                window_packets.append(0)
+            window_packets[-1] += 1
+            if packets.Add(record):
+                window_rows[-1] += 1
+
+    columns = {
+        'window_packets': np.array(window_packets, dtype=np.int64),
+        'window_rows': np.array(window_rows, dtype=np.int64),
+        **packets.Get_Columns(),
+    }
+    for name, column in columns.items():
+        np.save(os.path.join(entry_path, f'{name}.npy'), column)
+    meta = {'version': CACHE_VERSION, 'pcap': os.path.basename(pcap_path), 'capture_interval': capture_interval,
+            'windows': len(window_packets), 'packets': sum(window_packets), 'rows': len(packets.flows),
+            'created': time.time()}
+    with open(os.path.join(entry_path, 'meta.json'), 'w', encoding='utf-8') as file:
+        json.dump(meta, file, indent=1)
+
+
+def Evict(cache_folder: str, max_bytes: int, keep: Optional[str] = None) -> None:
+    """
+    Delete the least recently used cache entries until the folder fits its size bound.
+
+    Args:
+        cache_folder: Cache folder
+        max_bytes: Size bound in bytes
+        keep: Entry that is never evicted (the one just stored), even if it alone exceeds the bound
+    """
+    entries: List[Tuple[float, int, str]] = []
+    for item in os.scandir(cache_folder):
+        if item.is_dir() and not item.name.endswith('.tmp'):
+            size = sum(os.path.getsize(os.path.join(item.path, name)) for name in os.listdir(item.path))
+            entries.append((item.stat().st_mtime, size, item.path))
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if keep is not None and os.path.abspath(path) == os.path.abspath(keep):
+            continue
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        logger.debug(f"Evicted cache entry {path} ({size} bytes)")
+
+
+def Get_Cache_Settings(config: Dict[str, Any]) -> Optional[Tuple[str, int]]:
+    """
+    Read the decoded-packet cache settings of a configuration.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (cache folder, size bound in bytes), None if the cache is off
+
+    Raises:
+        ValueError: If cache_max_gb is not a positive number
+    """
+    cache_folder = config.get('cache_folder')
+    if not cache_folder:
+        return None
+    max_gb = config.get('cache_max_gb', 10)
+    if isinstance(max_gb, bool) or not isinstance(max_gb, (int, float)) or max_gb <= 0:
+        raise ValueError(f"Invalid cache_max_gb: {max_gb}. Must be a positive number of gigabytes")
+    return cache_folder, int(max_gb * 1024 ** 3)
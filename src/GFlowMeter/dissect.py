@@ -0,0 +1,200 @@
+import struct
+from typing import Tuple
+import numpy as np
+
+'''
+Byte-level header offsets for the link types GFlowMeter understands.
+Everything here works on the raw frame bytes, no Scapy dissection involved.
+'''
+
+# Link types (http://www.tcpdump.org/linktypes.html)
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW_OLD = 12
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86DD
+ETHERTYPE_VLAN = (0x8100, 0x88A8, 0x9100)
+
+# BSD loopback address families that carry IPv6
+LOOPBACK_AF_INET6 = (24, 28, 30)
+
+# Link-layer header lengths (VLAN tags count as payload, like the Ethernet payload in Scapy)
+LINK_HEADER_LENGTHS = {
+    LINKTYPE_NULL: 4,
+    LINKTYPE_ETHERNET: 14,
+    LINKTYPE_LOOP: 4,
+    LINKTYPE_LINUX_SLL: 16,
+    LINKTYPE_LINUX_SLL2: 20,
+}
+
+# Bytes kept from the start of the network header, and where the kept tail starts again.
+# IPv4: drops src/dst addresses and the transport ports (12:24)
+# IPv6: drops src/dst addresses and the 8 bytes after them (12:48)
+ADDRESS_CUT = {4: (12, 24), 6: (12, 48)}
+
+
+def Get_Network_Layer(frame: bytes, link_type: int) -> Tuple[int, int]:
+    """
+    Locate the outermost IP header of a raw frame.
+
+    Args:
+        frame: Captured frame bytes
+        link_type: PCAP link type of the frame
+
+    Returns:
+        Tuple of (offset of the IP header, IP version), or (-1, 0) when the frame carries no IPv4/IPv6
+    """
+    if link_type == LINKTYPE_ETHERNET:
+        offset, ethertype_offset = 14, 12
+    elif link_type == LINKTYPE_LINUX_SLL:
+        offset, ethertype_offset = 16, 14
+    elif link_type == LINKTYPE_LINUX_SLL2:
+        offset, ethertype_offset = 20, 0
+    elif link_type in (LINKTYPE_RAW, LINKTYPE_RAW_OLD):
+        if len(frame) == 0:
+            return -1, 0
+        version = frame[0] >> 4
+        return (0, version) if version in (4, 6) else (-1, 0)
+    elif link_type == LINKTYPE_IPV4:
+        return 0, 4
+    elif link_type == LINKTYPE_IPV6:
+        return 0, 6
+    elif link_type in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if len(frame) < 4:
+            return -1, 0
+        # NULL stores the family in host byte order, LOOP in network byte order
+        family = struct.unpack_from('>I' if link_type == LINKTYPE_LOOP else '<I', frame, 0)[0]
+        if link_type == LINKTYPE_NULL and family > 0xFFFF:
+            family = struct.unpack_from('>I', frame, 0)[0]
+        if family == 2:
+            return 4, 4
+        if family in LOOPBACK_AF_INET6:
+            return 4, 6
+        return -1, 0
+    else:
+        return -1, 0
+
+    if len(frame) < offset:
+        return -1, 0
+    ethertype = (frame[ethertype_offset] << 8) | frame[ethertype_offset + 1]
+    # Skip 802.1Q / 802.1ad tags on Ethernet frames
+    while link_type == LINKTYPE_ETHERNET and ethertype in ETHERTYPE_VLAN and len(frame) >= offset + 4:
+        ethertype = (frame[offset + 2] << 8) | frame[offset + 3]
+        offset += 4
+    if ethertype == ETHERTYPE_IPV4:
+        return offset, 4
+    if ethertype == ETHERTYPE_IPV6:
+        return offset, 6
+    return -1, 0
+
+
+def Strip_Addresses(frame: bytes, link_type: int) -> np.ndarray:
+    """
+    Drop the link-layer header, IP addresses and ports from a raw frame.
+
+    Args:
+        frame: Captured frame bytes
+        link_type: PCAP link type of the frame
+
+    Returns:
+        uint8 array of the remaining bytes, frames without IPv4/IPv6 are returned unchanged
+    """
+    offset, version = Get_Network_Layer(frame, link_type)
+    return Cut_Addresses(frame, offset, version)
+
+
+def Cut_Addresses(frame: bytes, offset: int, version: int) -> np.ndarray:
+    """
+    Same as Strip_Addresses, for a frame whose IP header was already located.
+
+    Args:
+        frame: Captured frame bytes
+        offset: Offset of the IP header (as returned by Get_Network_Layer)
+        version: IP version (4 or 6), 0 if the frame carries no IP
+
+    Returns:
+        uint8 array of the remaining bytes
+    """
+    view = np.frombuffer(frame, dtype=np.uint8)
+    if version == 0:
+        return view
+    keep, resume = ADDRESS_CUT[version]
+    return np.concatenate((view[offset:offset + keep], view[offset + resume:]))
+
+
+def Get_Header_Length(frame: bytes, link_type: int, offset: int, version: int) -> int:
+    """
+    Length of the outermost header of a frame, i.e. what separates the packet from its payload.
+
+    Args:
+        frame: Captured frame bytes
+        link_type: PCAP link type of the frame
+        offset: Offset of the IP header (as returned by Get_Network_Layer)
+        version: IP version (4 or 6), 0 if the frame carries no IP
+
+    Returns:
+        Header length in bytes (link-layer header, or the IP header for raw IP link types)
+    """
+    if link_type in LINK_HEADER_LENGTHS:
+        return LINK_HEADER_LENGTHS[link_type]
+    if offset == 0 and version == 4:
+        return (frame[0] & 0x0F) * 4 if len(frame) else 0
+    if offset == 0 and version == 6:
+        return 40
+    return len(frame)
+
+
+# IPv6 extension headers that are skipped to reach the transport header
+IPV6_EXTENSION_HEADERS = (0, 43, 60, 51)
+IPV6_FRAGMENT_HEADER = 44
+
+
+def Get_Transport_Layer(frame: bytes, offset: int, version: int) -> Tuple[int, int]:
+    """
+    Locate the transport header behind an IP header.
+
+    Args:
+        frame: Captured frame bytes
+        offset: Offset of the IP header (as returned by Get_Network_Layer)
+        version: IP version (4 or 6)
+
+    Returns:
+        Tuple of (IP protocol number, offset of the transport header). The offset is -1 when
+        the transport header is not available (non-first fragments or truncated headers).
+    """
+    if version == 4:
+        if len(frame) < offset + 20:
+            return -1, -1
+        protocol = frame[offset + 9]
+        # Only the first fragment carries the transport header
+        if ((frame[offset + 6] << 8) | frame[offset + 7]) & 0x1FFF:
+            return protocol, -1
+        return protocol, offset + (frame[offset] & 0x0F) * 4
+
+    if len(frame) < offset + 40:
+        return -1, -1
+    protocol = frame[offset + 6]
+    offset += 40
+    while protocol in IPV6_EXTENSION_HEADERS or protocol == IPV6_FRAGMENT_HEADER:
+        if len(frame) < offset + 8:
+            return protocol, -1
+        next_protocol = frame[offset]
+        if protocol == IPV6_FRAGMENT_HEADER:
+            if ((frame[offset + 2] << 8) | frame[offset + 3]) & 0xFFF8:
+                return next_protocol, -1
+            length = 8
+        elif protocol == 51:
+            # Authentication Header length is in 4-octet units (minus 2)
+            length = (frame[offset + 1] + 2) * 4
+        else:
+            length = (frame[offset + 1] + 1) * 8
+        protocol = next_protocol
+        offset += length
+    return protocol, offset
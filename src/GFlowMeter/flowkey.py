@@ -0,0 +1,117 @@
+import ipaddress
+from enum import IntEnum
+from typing import NamedTuple
+from .dissect import Get_Network_Layer, Get_Transport_Layer
+
+'''
+Canonical flow keys.
+Addresses are packed into integers (IPv4 as IPv4-mapped IPv6) and ports are plain integers,
+so keys hash and compare as small tuples of ints instead of formatted strings.
+'''
+
+
+class Protocol(IntEnum):
+    TCP = 6
+    UDP = 17
+    SCTP = 132
+    IP_OTHER = 256  # Any other IP traffic, keyed by addresses only
+    NON_IP = 257    # Frames without IPv4/IPv6, keyed by link type only
+
+
+# Protocols whose keys carry ports
+PORT_PROTOCOLS = frozenset({Protocol.TCP, Protocol.UDP, Protocol.SCTP})
+
+# Protocols that are turned into samples
+SAMPLED_PROTOCOLS = frozenset({Protocol.TCP, Protocol.UDP, Protocol.SCTP})
+
+IPV4_MAPPED_PREFIX = 0xFFFF << 32
+
+
+class Flow_Key(NamedTuple):
+    protocol: int   # Protocol value
+    address_a: int
+    port_a: int
+    address_b: int
+    port_b: int
+
+
+def Get_Endpoints(frame: bytes, link_type: int, offset: int, version: int) -> Flow_Key:
+    """
+    Build the directional key of a raw frame, with the source endpoint first.
+
+    Args:
+        frame: Captured frame bytes
+        link_type: PCAP link type of the frame
+        offset: Offset of the IP header (as returned by Get_Network_Layer)
+        version: IP version (4 or 6), 0 if the frame carries no IP
+
+    Returns:
+        Flow_Key of (protocol, source address, source port, destination address, destination port).
+        Frames without IPv4/IPv6 are keyed by link type only.
+    """
+    if version == 0:
+        return Flow_Key(Protocol.NON_IP, link_type, 0, 0, 0)
+
+    if version == 4:
+        src = IPV4_MAPPED_PREFIX | int.from_bytes(frame[offset + 12:offset + 16], 'big')
+        dst = IPV4_MAPPED_PREFIX | int.from_bytes(frame[offset + 16:offset + 20], 'big')
+    else:
+        src = int.from_bytes(frame[offset + 8:offset + 24], 'big')
+        dst = int.from_bytes(frame[offset + 24:offset + 40], 'big')
+
+    protocol, transport_offset = Get_Transport_Layer(frame, offset, version)
+    if protocol in PORT_PROTOCOLS and transport_offset != -1 and len(frame) >= transport_offset + 4:
+        sport = (frame[transport_offset] << 8) | frame[transport_offset + 1]
+        dport = (frame[transport_offset + 2] << 8) | frame[transport_offset + 3]
+        return Flow_Key(protocol, src, sport, dst, dport)
+
+    # Other IP traffic and fragments without a transport header
+    return Flow_Key(Protocol.IP_OTHER, src, 0, dst, 0)
+
+
+def Get_Session_Key(endpoints: Flow_Key) -> Flow_Key:
+    """
+    Order the endpoints of a directional key so that both directions of a session share one key.
+
+    Args:
+        endpoints: Directional key as returned by Get_Endpoints
+
+    Returns:
+        Flow_Key with (address_a, port_a) <= (address_b, port_b). Keys without ports are returned unchanged.
+    """
+    if endpoints.protocol in PORT_PROTOCOLS and \
+            (endpoints.address_b, endpoints.port_b) < (endpoints.address_a, endpoints.port_a):
+        return Flow_Key(endpoints.protocol, endpoints.address_b, endpoints.port_b,
+                        endpoints.address_a, endpoints.port_a)
+    return endpoints
+
+
+def Get_Flow_Key(frame: bytes, link_type: int, bidirectional: bool) -> Flow_Key:
+    """
+    Build the flow key of a raw frame.
+
+    Args:
+        frame: Captured frame bytes
+        link_type: PCAP link type of the frame
+        bidirectional: If True, both directions of a session map to the same key
+
+    Returns:
+        Flow_Key of (protocol, address_a, port_a, address_b, port_b)
+    """
+    offset, version = Get_Network_Layer(frame, link_type)
+    endpoints = Get_Endpoints(frame, link_type, offset, version)
+    return Get_Session_Key(endpoints) if bidirectional else endpoints
+
+
+def Format_Address(address: int) -> str:
+    """
+    Format a packed flow key address.
+
+    Args:
+        address: Address as stored in a Flow_Key
+
+    Returns:
+        Dotted IPv4 for IPv4-mapped addresses, otherwise the compressed IPv6 form
+    """
+    ipv6 = ipaddress.IPv6Address(address)
+    return str(ipv6.ipv4_mapped) if ipv6.ipv4_mapped is not None else str(ipv6)
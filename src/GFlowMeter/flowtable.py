@@ -0,0 +1,258 @@
+import heapq
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from .dissect import Get_Network_Layer, Cut_Addresses, Get_Header_Length
+from .cache import Decoded_Packet
+from .flowkey import Flow_Key, Get_Endpoints, Get_Session_Key, SAMPLED_PROTOCOLS
+from .reader import Record
+from .stats import FWD, BWD, Flow_Stats
+
+'''
+Single-pass flow assembler.
+Every packet is keyed, given its flow's sample index and direction, cut into the flow's tabular
+buffer and folded into the flow's running statistics as it is read. Only the stages the dataset
+type needs run: a statistics-only table never extracts payload bytes, a tabular-only table never
+parses transport headers for the statistics.
+With idle / active timeouts, flows are finalized as soon as they expire and leave the table,
+so memory depends on the number of concurrent flows instead of the capture length.
+'''
+
+
+class Flow():
+    __slots__ = ('sample_index', 'key', 'src', 'packets', 'chunks', 'buffered', 'stats', 'first_seen', 'last_seen')
+
+    def __init__(
+        self,
+        sample_index: int,
+        key: Flow_Key,
+        src: int,
+        bidirectional: bool,
+        timestamp: float,
+        statistical: bool = True
+    ) -> None:
+        self.sample_index = sample_index
+        self.key = key
+        self.src = src                          # Source address of the first packet, defines the forward direction
+        self.packets = 0
+        self.chunks: List[np.ndarray] = []      # Stripped packet bytes kept for the tabular sample
+        self.buffered = 0
+        self.stats = Flow_Stats(bidirectional) if statistical else None
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+
+
+class Flow_Table():
+    def __init__(
+        self,
+        sample_type: str = 'bidirectional',
+        target_sample_length: int = 784,
+        padding_per_packet: bool = False,
+        start_index: int = 0,
+        idle_timeout: Optional[float] = None,
+        active_timeout: Optional[float] = None,
+        tabular: bool = True,
+        statistical: bool = True
+    ) -> None:
+        self.bidirectional = sample_type == 'bidirectional'
+        self.target_sample_length = target_sample_length
+        self.padding_per_packet = padding_per_packet
+        # Stages to run per packet, flows of a disabled stage keep no chunks / no stats
+        self.tabular = tabular
+        self.statistical = statistical
+        self.start_index = start_index
+        self.next_index = start_index
+        self.flows: Dict[Flow_Key, Flow] = {}
+        self.packets = 0
+
+        # Flow timeouts in seconds, None disables them
+        self.idle_timeout = idle_timeout
+        self.active_timeout = active_timeout
+        self.timeouts = idle_timeout is not None or active_timeout is not None
+        self.clock = float('-inf')                              # Latest packet timestamp seen
+        self.expiry_heap: List[Tuple[float, int, Flow_Key]] = []  # (expiry, sample index, key), lazily updated
+        self.expired: List[Flow] = []                           # Finished flows, not yet taken by Pop_Expired
+
+    def __len__(self) -> int:
+        return len(self.flows)
+
+
+
+
+    def Add_Records(self, records: Iterable[Record]) -> 'Flow_Table':
+        for record in records:
+            self.Add(record)
+        return self
+
+
+
+
+    def Add(self, record: Record) -> None:
+        frame, link_type = record.data, record.link_type
+        self.packets += 1
+        offset, version = Get_Network_Layer(frame, link_type)
+        endpoints = Get_Endpoints(frame, link_type, offset, version)
+        if endpoints.protocol not in SAMPLED_PROTOCOLS:
+            return
+        flow = self.Get_Flow(endpoints, record.timestamp)
+
+        # Statistical accumulators
+        if self.statistical:
+            total_bytes = len(frame)
+            flow.stats.Add(FWD if endpoints.address_a == flow.src else BWD, record.timestamp, total_bytes,
+                           total_bytes - Get_Header_Length(frame, link_type, offset, version))
+
+        # Tabular buffer, only the bytes that can still end up in the sample are kept
+        if not self.tabular:
+            return
+        limit = self.Get_Limit(flow)
+        if limit > 0:
+            chunk = Cut_Addresses(frame, offset, version)[:limit]
+            flow.chunks.append(chunk)
+            flow.buffered += len(chunk)
+
+
+
+
+    def Add_Decoded(self, packet: Decoded_Packet) -> None:
+        # Same as Add for a packet dissected earlier (decoded-packet cache), which is of a sampled protocol
+        self.packets += 1
+        endpoints = packet.endpoints
+        flow = self.Get_Flow(endpoints, packet.timestamp)
+        if self.statistical:
+            flow.stats.Add(FWD if endpoints.address_a == flow.src else BWD, packet.timestamp, packet.total_length,
+                           packet.total_length - packet.header_length)
+        if not self.tabular:
+            return
+        limit = self.Get_Limit(flow)
+        if limit > 0:
+            chunk = packet.data[:limit]
+            flow.chunks.append(chunk)
+            flow.buffered += len(chunk)
+
+
+
+
+    def Get_Flow(self, endpoints: Flow_Key, timestamp: float) -> Flow:
+        # Flows get their sample index in order of first appearance
+        key = Get_Session_Key(endpoints) if self.bidirectional else endpoints
+        if self.timeouts and timestamp > self.clock:
+            self.clock = timestamp
+            self.Evict()
+        flow = self.flows.get(key)
+        if self.timeouts:
+            # A packet after the timeout starts a new flow with the same key
+            if flow is not None and self.Get_Expiry(flow) < timestamp:
+                self.Expire(flow)
+                flow = None
+        if flow is None:
+            flow = Flow(self.next_index, key, endpoints.address_a, self.bidirectional, timestamp, self.statistical)
+            self.flows[key] = flow
+            self.next_index += 1
+            if self.timeouts:
+                heapq.heappush(self.expiry_heap, (self.Get_Expiry(flow), flow.sample_index, key))
+        elif timestamp > flow.last_seen:
+            flow.last_seen = timestamp
+        flow.packets += 1
+        return flow
+
+
+
+
+    def Advance(self, clock: float) -> None:
+        # Moves the clock to a packet added to another table (flow-sharded assembly), expiring the flows it ends
+        if self.timeouts and clock > self.clock:
+            self.clock = clock
+            self.Evict()
+
+
+
+
+    def Get_Limit(self, flow: Flow) -> int:
+        # Bytes of the current packet that can still end up in the sample
+        if self.padding_per_packet:
+            # Each packet is cut to target / (final packet count), which is at most target / (count so far)
+            return self.target_sample_length // flow.packets
+        return self.target_sample_length - flow.buffered
+
+
+
+
+    def Get_Expiry(self, flow: Flow) -> float:
+        expiry = float('inf')
+        if self.idle_timeout is not None:
+            expiry = flow.last_seen + self.idle_timeout
+        if self.active_timeout is not None:
+            expiry = min(expiry, flow.first_seen + self.active_timeout)
+        return expiry
+
+
+
+
+    def Evict(self) -> None:
+        # Heap entries are only refreshed when they reach the top, so each flow has exactly one entry
+        heap = self.expiry_heap
+        while heap and heap[0][0] < self.clock:
+            _, sample_index, key = heapq.heappop(heap)
+            flow = self.flows.get(key)
+            if flow is None or flow.sample_index != sample_index:
+                continue
+            expiry = self.Get_Expiry(flow)
+            if expiry < self.clock:
+                self.Expire(flow)
+            else:
+                heapq.heappush(heap, (expiry, sample_index, key))
+
+
+
+
+    def Expire(self, flow: Flow) -> None:
+        del self.flows[flow.key]
+        self.expired.append(flow)
+
+
+
+
+    def Flush(self) -> None:
+        # End of capture, every remaining flow is finished (in sample index order)
+        self.expired.extend(self.flows.values())
+        self.flows = {}
+        self.expiry_heap = []
+
+
+
+
+    def Pop_Expired(self) -> List[Flow]:
+        expired = self.expired
+        self.expired = []
+        return expired
+
+
+
+
+    def Get_Sample(self, flow: Flow) -> np.ndarray:
+        target_sample_length = self.target_sample_length
+        chunks = flow.chunks
+        if self.padding_per_packet:
+            packet_length = target_sample_length // flow.packets
+            chunks = [Pad_Sample(chunk, packet_length) for chunk in chunks] if packet_length > 0 else []
+        sample = np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.uint8)
+        return Pad_Sample(sample, target_sample_length)
+
+
+def Pad_Sample(sample: np.ndarray, target_sample_length: int) -> np.ndarray:
+    """
+    Zero-pad or truncate a sample to a fixed length.
+
+    Args:
+        sample: uint8 array of sample bytes
+        target_sample_length: Length of the returned sample
+
+    Returns:
+        uint8 array of exactly target_sample_length bytes
+    """
+    pad = target_sample_length - len(sample)
+    if pad == 0:
+        return sample
+    elif pad > 0:
+        return np.concatenate((sample, np.zeros(pad, dtype=np.uint8)))
+    return sample[:target_sample_length]
@@ -1,23 +1,21 @@
-import warnings
-import logging
 import os
 import tqdm
-import hexdump
 import time
-from typing import Dict, List, Tuple, Any, Optional, Union
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Union
+from .cache import Decoded_Window
+from .flowkey import Flow_Key
 from .logger import get_logger
+from .metrics import get_metrics
+from .reader import Is_Stream, Read_Records, Record
+from .flowtable import Flow, Flow_Table
+from .stats import Get_Statistical_Matrix
+from .writers import Dataset_Writer, CSV_Writer, Split_Dataset, Concat_Datasets
+import numpy as np
 
 logger = get_logger()
-logging.getLogger("scapy.runtime").setLevel(logging.ERROR)
-warnings.simplefilter("ignore", DeprecationWarning)
-warnings.filterwarnings("ignore", category=UserWarning, message="No IPv4 address found on .*")
-import scapy.all
-import pandas as pd
-import numpy as np
-from sys import platform
-if platform == 'darwin' or platform == 'linux1' or platform == 'linux2':
-    from scapy.config import conf
-    conf.use_pcap = True
+
+# Expired flows written together when flow timeouts are enabled
+EMIT_BATCH_FLOWS = 10000
 
 '''
 A: Tabular
@@ -25,6 +23,14 @@ B: Statistical
 C: Tabular + Statistical
 '''
 
+
+class Sample(NamedTuple):
+    sample_index: int
+    tabular: Optional[np.ndarray]           # uint8 (target_sample_length,), None for dataset type B
+    statistical: Optional[np.ndarray]       # float64 (features,), None for dataset type A
+    flow_key: Flow_Key
+
+
 class GFlow_Meter():
     def __init__(
         self, 
@@ -33,32 +39,39 @@ class GFlow_Meter():
         sample_type: str = 'bidirectional', 
         target_sample_length: int = 784,
         dataset_type: str = 'C', 
-        padding_per_packet: bool = False
+        padding_per_packet: bool = False,
+        records: Union[Iterable[Record], Decoded_Window, None] = None,
+        split: Optional[int] = None,
+        writer: Optional[Dataset_Writer] = None,
+        show_progress: bool = True,
+        idle_timeout: Optional[float] = None,
+        active_timeout: Optional[float] = None
     ) -> None:
         try:
             logger.debug(f"Initializing GFlow_Meter for {pcap_path}")
             
-            # Validate pcap_path
-            if not os.path.exists(pcap_path):
+            # Validate pcap_path ('-' is standard input)
+            if not os.path.exists(pcap_path) and not Is_Stream(pcap_path):
                 raise FileNotFoundError(f"PCAP file not found: {pcap_path}")
             
             # Path Handling
+            # records: packets of one time window (split) of pcap_path, read instead of the whole file,
+            # or the window's packets from the decoded-packet cache
+            # writer: shared output backend, by default per-sample CSVs are written to save_folder
             self.pcap_path = pcap_path
-            self.save_folder_name = os.path.basename(self.pcap_path).split('.')[0] + f'_{sample_type}_{target_sample_length}'
+            self.records = records
+            self.split = split if split is not None else 1
+            self.writer = writer
+            self.show_progress = show_progress
+            split_name = f'split_{split}' if split is not None else os.path.basename(self.pcap_path).split('.')[0]
+            self.save_folder_name = split_name + f'_{sample_type}_{target_sample_length}'
             
-            try:
-                if save_folder_path is None:
-                    pcap_folder = os.path.dirname(os.path.abspath(self.pcap_path))
-                    self.save_folder = os.path.join(pcap_folder, self.save_folder_name)
-                else:
-                    self.save_folder = os.path.join(save_folder_path, self.save_folder_name)
-                
-                if not os.path.exists(self.save_folder):
-                    os.makedirs(self.save_folder)
-                    logger.debug(f"Created save folder: {self.save_folder}")
-            except OSError as e:
-                logger.error(f"Error creating save folder: {e}", exc_info=True)
-                raise
+            # The save folder is only created by Generate_Dataset, the iterators never touch the disk
+            if save_folder_path is None:
+                pcap_folder = os.path.dirname(os.path.abspath(self.pcap_path))
+                self.save_folder = os.path.join(pcap_folder, self.save_folder_name)
+            else:
+                self.save_folder = os.path.join(save_folder_path, self.save_folder_name)
 
             # Save Parameters
             self.dataset_type = dataset_type
@@ -73,21 +86,26 @@ class GFlow_Meter():
                 logger.error(error_msg)
                 raise ValueError(error_msg)
 
+            # Check Flow Timeouts (seconds, None disables them)
+            self.idle_timeout = idle_timeout
+            self.active_timeout = active_timeout
+            for name, timeout in (('idle_timeout', idle_timeout), ('active_timeout', active_timeout)):
+                if timeout is not None and (isinstance(timeout, bool) or not isinstance(timeout, (int, float))
+                                            or timeout <= 0):
+                    error_msg = f"Invalid {name}: {timeout}. Must be a positive number of seconds"
+                    logger.error(error_msg)
+                    raise ValueError(error_msg)
+
             # Check Flow-Types
             if self.sample_type != 'unidirectional' and self.sample_type != 'bidirectional':
                 error_msg = f"Invalid sample type: {self.sample_type}. Must be 'unidirectional' or 'bidirectional'"
                 logger.error(error_msg)
                 raise ValueError(error_msg)
 
-            # Layers Setup
-            self.tcp_layer = scapy.layers.inet.TCP
-            self.udp_layer = scapy.layers.inet.UDP
-            self.sctp_layer = scapy.layers.sctp.SCTP
-
             # Read_Feature_Names
+            self.feature_names = []
             if self.Check_For_Statistical():
                 try:
-                    self.feature_names = []
                     # Get the directory where this script is located
                     script_dir = os.path.dirname(os.path.abspath(__file__))
                     misc_dir = os.path.join(script_dir, 'misc')
@@ -102,8 +120,7 @@ class GFlow_Meter():
                     
                     if not self.feature_names:
                         raise ValueError(f"Feature names file is empty: {feature_names_path}")
-                    
-                    self.df_statistical = pd.DataFrame(columns=self.feature_names, dtype=float)
+
                     logger.debug(f"Loaded {len(self.feature_names)} feature names from {feature_names_path}")
                 except FileNotFoundError as e:
                     logger.error(f"Feature names file not found: {e}")
@@ -133,6 +150,12 @@ class GFlow_Meter():
 
 
 
+    def Check_For_Timeouts(self) -> bool:
+        return self.idle_timeout is not None or self.active_timeout is not None
+
+
+
+
     def Check_For_Tabular(self) -> bool:
         if self.dataset_type == 'A' or self.dataset_type =='C':
             return True
@@ -146,48 +169,32 @@ class GFlow_Meter():
         try:
             logger.debug(f"Generating dataset starting at index {start_index}")
             
-            capture = self.Capture_Flows()
-            
-            # Check for Sub-cases
-            if self.Check_For_Tabular():
+            if self.writer is None and not os.path.exists(self.save_folder):
                 try:
-                    samples, num_samples, session_sample_index = self.Get_Hex_Flows(capture, start_index)
-                    if len(samples) == 0:
-                        logger.warning("No samples generated from hex flows")
-                        return 0
-                    
-                    self.Generate_Tabular_Dataset(samples)
-                    logger.debug(f"Generated {num_samples} tabular samples")
-                    
-                    # Check for statistical
-                    if self.Check_For_Statistical():
-                        try:
-                            self.Generate_Statistical_Dataset(capture, session_sample_index)
-                            logger.debug("Generated statistical dataset")
-                        except Exception as e:
-                            logger.error(f"Error generating statistical dataset: {e}", exc_info=True)
-                            raise
-                    
-                    return num_samples
-                except Exception as e:
-                    logger.error(f"Error in tabular dataset generation: {e}", exc_info=True)
+                    os.makedirs(self.save_folder)
+                    logger.debug(f"Created save folder: {self.save_folder}")
+                except OSError as e:
+                    logger.error(f"Error creating save folder: {e}", exc_info=True)
                     raise
 
-            # Sub-Case 3: Only Statistical
-            if self.Check_For_Statistical():
+            # Without timeouts every flow ends with the capture, so there is a single batch
+            batch_size = EMIT_BATCH_FLOWS if self.Check_For_Timeouts() else None
+            num_samples = 0
+            for dataset in self.Iter_Datasets(start_index, batch_size):
+                if dataset.num_samples == 0:
+                    continue
                 try:
-                    # Need to get session_sample_index first
-                    _, _, session_sample_index = self.Get_Hex_Flows(capture, start_index)
-                    self.Generate_Statistical_Dataset(capture, session_sample_index)
-                    logger.debug("Generated statistical dataset only")
-                    # Return number of samples (would need to calculate from capture)
-                    return len(session_sample_index)
+                    writer = self.writer if self.writer is not None else CSV_Writer(self.save_folder)
+                    writer.Write(dataset)
+                    logger.debug(f"Wrote {dataset.num_samples} samples")
                 except Exception as e:
-                    logger.error(f"Error in statistical-only dataset generation: {e}", exc_info=True)
+                    logger.error(f"Error writing dataset: {e}", exc_info=True)
                     raise
+                num_samples += dataset.num_samples
             
-            logger.warning("No dataset type selected for generation")
-            return 0
+            if num_samples == 0:
+                logger.warning("No flows of the sampled protocols found")
+            return num_samples
             
         except Exception as e:
             logger.error(f"Error generating dataset: {e}", exc_info=True)
@@ -196,87 +203,113 @@ class GFlow_Meter():
 
 
 
-    def Generate_Tabular_Dataset(self, samples: List[Dict[str, Any]]) -> None:
-        logger.debug("Generating Tabular Dataset")
-        tic = time.time()
-        samples_df = pd.DataFrame(samples)
-        samples_df.reset_index(drop=True, inplace=True)
+    def Build_Dataset(self, start_index: int = 0) -> Split_Dataset:
+        # All flows of the capture in one dataset
+        return next(self.Iter_Datasets(start_index))
 
-        # Export Data
-        save_folder_path = os.path.join(self.save_folder, 'Tabular')
-        if not os.path.exists(save_folder_path): os.makedirs(save_folder_path)
-        # Iterate over each row in the dataframe
-        for idx, row in samples_df.iterrows():
-            filename = f"Sample_{row['Sample_Index']}.csv"
-            # Convert the row to a dataframe and drop the Sample_Index column
-            row_df = pd.DataFrame([row.drop('Sample_Index')])
-            # Save the row as a CSV file
-            row_df.to_csv(os.path.join(save_folder_path, filename), index=False)
 
-        toc = time.time()
-        logger.debug(f"Tabular Generated in {(toc - tic) / 60:.3f} minutes")
 
 
+    def Iter_Samples(self, start_index: int = 0) -> Iterator[Sample]:
+        # One sample at a time, in the order Generate_Dataset writes them, without writing anything
+        batch_size = EMIT_BATCH_FLOWS if self.Check_For_Timeouts() else None
+        for dataset in self.Iter_Datasets(start_index, batch_size):
+            tabular, statistical = dataset.tabular, dataset.statistical
+            for row, sample_index in enumerate(dataset.sample_indices.tolist()):
+                yield Sample(sample_index, tabular[row] if tabular is not None else None,
+                             statistical[row] if statistical is not None else None, dataset.flow_keys[row])
 
 
-    def Generate_Statistical_Dataset(self, capture: Any, session_sample_index: Dict[str, int]) -> None:
-        logger.debug("Generating Statistical Dataset")
-        tic = time.time()
-        samples = self.Get_Statistical_Features(capture, session_sample_index)
-        if samples.empty or len(samples) == 0:
-            logger.debug("No statistical samples to generate")
-            return
 
-        # Export Data
-        save_folder_path = os.path.join(self.save_folder, 'Statistical')
-        if not os.path.exists(save_folder_path): os.makedirs(save_folder_path)
-        # Iterate over each row in the dataframe
-        for idx, row in samples.iterrows():
-            filename = f"Sample_{int(row['Sample_Index'])}.csv"
-            # Convert the row to a dataframe and drop the Sample_Index column
-            row_df = pd.DataFrame([row.drop('Sample_Index')])
-            # Save the row as a CSV file
-            row_df.to_csv(os.path.join(save_folder_path, filename), index=False)
 
-        toc = time.time()
-        logger.debug(f"Statistical Generated in {(toc - tic) / 60:.3f} minutes")
+    def Iter_Batches(self, batch_size: int, start_index: int = 0) -> Iterator[Split_Dataset]:
+        # Datasets of exactly batch_size samples (the last one may be smaller), without writing anything
+        if isinstance(batch_size, bool) or not isinstance(batch_size, int) or batch_size <= 0:
+            error_msg = f"Invalid batch size: {batch_size}. Must be a positive integer"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        # With timeouts, expired flows are built batch by batch instead of all at the end of the capture
+        pending: List[Split_Dataset] = []
+        num_pending = 0
+        for dataset in self.Iter_Datasets(start_index, batch_size if self.Check_For_Timeouts() else None):
+            if dataset.num_samples == 0:
+                continue
+            pending.append(dataset)
+            num_pending += dataset.num_samples
+            if num_pending < batch_size:
+                continue
+            dataset = Concat_Datasets(pending)
+            num_full = num_pending - num_pending % batch_size
+            for start in range(0, num_full, batch_size):
+                yield dataset.Slice(start, start + batch_size)
+            pending = [dataset.Slice(num_full, num_pending)] if num_full < num_pending else []
+            num_pending -= num_full
+        if pending:
+            yield Concat_Datasets(pending)
 
 
 
 
-    def Capture_Flows(self) -> Any:
+    def Iter_Datasets(self, start_index: int = 0, batch_size: Optional[int] = None) -> Iterator[Split_Dataset]:
         try:
-            tic = time.time()
-            logger.debug(f"Capturing flows from {os.path.basename(self.pcap_path)}")
+            metrics = get_metrics()
+            pcap_name = os.path.basename(self.pcap_path)
+            # Time spent by the consumer of a yielded batch is not counted
+            tic = time.perf_counter()
+            elapsed = 0.0
+            self.feature_seconds = 0.0          # Added to by Get_Dataset
+            self.batch_closed = tic             # When the flows of the batch being yielded were finished
+            logger.debug(f"Capturing flows from {pcap_name}")
             
-            if not os.path.exists(self.pcap_path):
+            if not os.path.exists(self.pcap_path) and not Is_Stream(self.pcap_path):
                 raise FileNotFoundError(f"PCAP file not found: {self.pcap_path}")
             
+            capture = Flow_Table(self.sample_type, self.target_sample_length, self.padding_per_packet, start_index,
+                                 self.idle_timeout, self.active_timeout, self.Check_For_Tabular(),
+                                 self.Check_For_Statistical())
+            counted_packets, counted_flows = 0, start_index
+
+            def count() -> None:
+                # Counters are brought up to date with every batch, so live captures report as they go
+                nonlocal counted_packets, counted_flows
+                metrics.Increment('packets_read_total', capture.packets - counted_packets, pcap=pcap_name)
+                metrics.Increment('flows_built_total', capture.next_index - counted_flows, pcap=pcap_name)
+                counted_packets, counted_flows = capture.packets, capture.next_index
+
             try:
-                capture = scapy.all.sniff(offline=self.pcap_path)
-                logger.debug(f"Loaded PCAP file with {len(capture)} packets")
+                records = self.records if self.records is not None else Read_Records(self.pcap_path)
+                add, total = capture.Add, None
+                if isinstance(records, Decoded_Window):
+                    # Dissected on an earlier run, only the packets of the sampled protocols are stored
+                    add, total = capture.Add_Decoded, records.rows
+                    capture.packets += records.packets - records.rows
+                records = tqdm.tqdm(records, desc='\033[97mProcess Flows\033[0m', total=total,
+                                    colour='green', unit=' packets', leave=False, disable=not self.show_progress)
+                for record in records:
+                    add(record)
+                    # Expired flows are emitted as soon as a batch is complete
+                    if batch_size is not None and len(capture.expired) >= batch_size:
+                        self.batch_closed = time.perf_counter()
+                        count()
+                        dataset = self.Get_Dataset(capture, capture.Pop_Expired())
+                        elapsed += time.perf_counter() - tic
+                        yield dataset
+                        tic = time.perf_counter()
             except Exception as e:
                 logger.error(f"Error reading PCAP file {self.pcap_path}: {e}", exc_info=True)
                 raise
+            logger.debug(f"Organized {capture.packets} packets into {capture.next_index - start_index} flows")
+            self.batch_closed = time.perf_counter()
+            count()
             
-            try:
-                if self.sample_type == 'unidirectional':
-                    capture = capture.sessions(self.Unidirectional_Flows_Split)
-                elif self.sample_type == 'bidirectional':
-                    capture = capture.sessions(self.Bidirectional_Sessions_Split)
-                else:
-                    error_msg = f"Invalid sample_type: {self.sample_type}"
-                    logger.error(error_msg)
-                    raise ValueError(error_msg)
-                
-                logger.debug(f"Organized capture into {len(capture)} sessions")
-            except Exception as e:
-                logger.error(f"Error organizing capture sessions: {e}", exc_info=True)
-                raise
-            
-            toc = time.time()
-            logger.debug(f'Capture completed in {(toc - tic) / 60:.3f} minutes')
-            return capture
+            capture.Flush()
+            dataset = self.Get_Dataset(capture, capture.Pop_Expired())
+            elapsed += time.perf_counter() - tic
+            metrics.Observe('split_duration_seconds', elapsed, pcap=pcap_name)
+            # Reading and flow assembly are one streaming pass, the feature stages are timed in Get_Dataset
+            metrics.Observe('stage_duration_seconds', elapsed - self.feature_seconds, stage='capture')
+            yield dataset
             
         except FileNotFoundError:
             raise
@@ -287,353 +320,45 @@ class GFlow_Meter():
 
 
 
-    def Unidirectional_Flows_Split(self, packet: Any) -> str:
-        ip_layer = scapy.layers.inet.IP if 'IP' in packet else scapy.layers.inet6.IPv6
-        if ('IP' in packet) or ('IPv6' in packet):
-            if 'TCP' in packet:
-                sess = str(['TCP', packet[ip_layer].src, packet[self.tcp_layer].sport,
-                            packet[ip_layer].dst, packet[self.tcp_layer].dport])
-            elif 'UDP' in packet:
-                sess = str(['UDP', packet[ip_layer].src, packet[self.udp_layer].sport,
-                            packet[ip_layer].dst, packet[self.udp_layer].dport])
-
-            elif 'SCTP' in packet:
-                sess = str(['SCTP', packet[ip_layer].src, packet[self.sctp_layer].sport,
-                            packet[ip_layer].dst, packet[self.sctp_layer].sport])
-            else:
-                sess = str(['IP_Based_Sorted', packet[ip_layer].src, packet[ip_layer].dst])
-        else:
-            sess = packet.sprintf("No_IPv4_or_IPV6 --> Ethernet type=%04xr,Ether.type%")
-        return sess
-
-
-
-
-    def Bidirectional_Sessions_Split(self, packet: Any) -> str:
-        ip_layer = scapy.layers.inet.IP if 'IP' in packet else scapy.layers.inet6.IPv6
-        if ('IP' in packet) or ('IPv6' in packet):
-            if 'TCP' in packet:
-                sess = str(['TCP'] + sorted([packet[ip_layer].src, str(packet[self.tcp_layer].sport),
-                                             packet[ip_layer].dst, str(packet[self.tcp_layer].dport)],
-                                            key=str))
-            elif 'UDP' in packet:
-                sess = str(['UDP'] + sorted([packet[ip_layer].src, str(packet[self.udp_layer].sport),
-                                             packet[ip_layer].dst, str(packet[self.udp_layer].dport)],
-                                            key=str))
-            elif 'SCTP' in packet:
-                sess = str(['SCTP'] + sorted([packet[ip_layer].src, str(packet[self.sctp_layer].sport),
-                                              packet[ip_layer].dst, str(packet[self.sctp_layer].dport)],
-                                             key=str))
-            else:
-                sess = str(['IP_Based_Sorted', packet[ip_layer].src, packet[ip_layer].dst])
-        else:
-            sess = packet.sprintf("No_IPv4_or_IPV6 --> Ethernet type=%04xr,Ether.type%")
-        return sess
-
-
-
-
-    def Get_Hex_Flows(self, capture: Any, start_index: int) -> Tuple[List[Dict[str, Any]], int, Dict[str, int]]:
-        samples = []
-        sample_index = start_index
-        session_sample_index = {}  # Map session keys to sample indices
-        for packet_description, packet_list in tqdm.tqdm(capture.items(), total=len(capture),
-                                                         desc='\033[97mProcess Flows\033[0m', colour='green',
-                                                         disable=len(capture) == 0):
-            sample_packets = []
-            if self.Check_For_Protocols(packet_description):
-                session_sample_index[packet_description] = sample_index  # Assign sample_index to session
-                for packet in packet_list:
-                    processed_packet = self.Process_Packet(packet)
-                    if self.padding_per_packet is True:
-                        processed_packet = self.Pad_Sample(processed_packet,
-                                                           int(self.target_sample_length / len(packet_list)))
-                    sample_packets += processed_packet
-                sample_packets = self.Pad_Sample(sample_packets, self.target_sample_length)
-                # Add the sample index to the sample data
-                sample_data = {'Sample_Index': sample_index}
-                sample_data.update({i: val for i, val in enumerate(sample_packets)})
-                samples.append(sample_data)
-                sample_index += 1
-            else:
-                continue
-        num_samples = sample_index - start_index
-        return samples, num_samples, session_sample_index
-
-
-
-
-    def Check_For_Protocols(self, packet_description: str) -> bool:
-        ck1, ck2, ck3, ck4 = False, False, False, False
-        if 'TCP' in packet_description:
-            ck1 = True
-        elif 'UDP' in packet_description:
-            ck2 = True
-        elif 'ICMPv4' in packet_description:
-            ck3 = True
-        elif 'SCTP' in packet_description:
-            ck4 = True
-        return ck1 or ck2 or ck3 or ck4
-
-
-
-
-    def Process_Packet(self, packet: Any) -> List[int]:
-        ip_layer = scapy.layers.inet.IP if 'IP' in packet else scapy.layers.inet6.IPv6
-        hex_stream = hexdump.dump(scapy.all.Raw(packet).load, sep=' ')
-
-        # Remove Mac Addresses
-        if 'Ether' in packet:
-            hex_stream = hex_stream[42:]
-        elif 'CookedLinux' in packet:
-            hex_stream = hex_stream[48:]
-        elif 'CookedLinuxV2' in packet:
-            hex_stream = hex_stream[60:]
-
-        # Remove IPs and Ports
-        if ip_layer is scapy.layers.inet6.IPv6:
-            # hex_stream = hex_stream[0:36] + hex_stream[132:]  # Use this for Keeping Src and Dst Ports
-            hex_stream = hex_stream[0:36] + hex_stream[144:]
-            hex_stream = [int(element, base=16) for element in hex_stream.split(" ")]
-            return hex_stream
-        else:
-            if packet.getlayer(ip_layer).version == 4:
-                # hex_stream = hex_stream[0:36] + hex_stream[60:] # Use this for Keeping Src and Dst Ports
-                hex_stream = hex_stream[0:36] + hex_stream[72:]
-            elif packet.getlayer(ip_layer).version == 6:
-                # hex_stream = hex_stream[0:36] + hex_stream[132:] # Use this for Keeping Src and Dst Ports
-                hex_stream = hex_stream[0:36] + hex_stream[144:]
-            hex_stream = [int(element, base=16) for element in hex_stream.split(" ")]
-            return hex_stream
-
-
-
-
-    def Pad_Sample(self, sample: List[int], target_sample_length: int) -> List[int]:
-        sample_length = len(sample)
-        pad = target_sample_length - sample_length
-        if pad == 0:
-            return sample
-        elif pad > 0:
-            sample = sample + [0 for i in range(pad)]
-        else:
-            sample = sample[:target_sample_length]
-        return sample
-
-
-
-
-    def Get_Statistical_Features(self, capture: Any, session_sample_index: Dict[str, int]) -> pd.DataFrame:
-        if self.sample_type == 'unidirectional':
-            fwd = self.Get_Unidirectional_Flow_List(capture, session_sample_index)
-        else:
-            fwd, bwd = self.Get_Bidirectional_Flow_List(capture, session_sample_index)
-        # Return if no sessions of desired protocols are found
-        if len(fwd) == 0:
-            return pd.DataFrame()
-        # Extract Unidirectional Features
-        Dataframes, Fwd_Timestamps = [], []
-
-        for idx, fwd_flow in enumerate(fwd):
-            if len(fwd_flow) == 0:
-                logger.warning(f"Empty forward flow at index {idx}, skipping")
-                continue
-            fwd_df = self.df_statistical.copy()
-            fwd_df, fwd_timestamps = self.Extract_Fwd_Features(fwd_flow, fwd_df)
-            fwd_df['Sample_Index'] = fwd_flow[0].sample_index  # Assign the sample index
-            Dataframes.append(fwd_df)
-            Fwd_Timestamps.append(fwd_timestamps)
-        
-        # Check if we have any dataframes to process
-        if len(Dataframes) == 0:
-            logger.warning("No valid flows found for statistical feature extraction")
-            return pd.DataFrame()
-        
-        if self.sample_type == 'unidirectional':
-            return pd.concat(Dataframes, ignore_index=True)
-
-        # Extract Bidirectional and Total Features
-        for idx, (bwd_flow, df, fwd_timestamps) in enumerate(zip(bwd, Dataframes, Fwd_Timestamps)):
-            # Extract Bwd Features
-            df, bwd_timestamps = self.Extract_Bwd_Features(bwd_flow, df)
-            # Extract Total Features
-            df = self.Calculate_Total_Size_Features(df)
-            timestamps = fwd_timestamps + bwd_timestamps
-            df = self.Calculate_Temporal_Features(timestamps, df, 'Flow ')
-            Dataframes[idx] = df
-        return pd.concat(Dataframes, ignore_index=True)
-
-
-
-
-    def Get_Unidirectional_Flow_List(self, capture: Any, session_sample_index: Dict[str, int]) -> List[List[Any]]:
-        fwd = []
-        for packet_description, packet_list in tqdm.tqdm(capture.items(), total=len(capture),
-                                                         desc='\033[97mProcess Unidirectional Flows\033[0m',
-                                                         colour='green',
-                                                         disable=len(capture) == 0):
-            if self.Check_For_Protocols(packet_description):
-                sample_index = session_sample_index.get(packet_description)
-                if sample_index is None:
-                    continue  # or handle error
-                # Assign sample_index to packets
-                for packet in packet_list:
-                    packet.sample_index = sample_index
-                fwd.append(packet_list)
-        return fwd
-
-
-
-
-    def Get_Bidirectional_Flow_List(self, capture: Any, session_sample_index: Dict[str, int]) -> Tuple[List[List[Any]], List[List[Any]]]:
-        fwd, bwd = [], []
-        for packet_description, packet_list in tqdm.tqdm(capture.items(), total=len(capture),
-                                                         desc='\033[97mProcess Bidirectional Flows\033[0m',
-                                                         colour='green',
-                                                         disable=len(capture) == 0):
-            if self.Check_For_Protocols(packet_description):
-                sample_index = session_sample_index.get(packet_description)
-                if sample_index is None:
-                    continue  # or handle error
-                # Get the srcIP of the first packet
-                ip_layer = scapy.layers.inet.IP if 'IP' in packet_list[0] else scapy.layers.inet6.IPv6
-                src_IP = packet_list[0][ip_layer].src
-                fwd_flow, bwd_flow = [], []
-                for packet in packet_list:
-                    packet.sample_index = sample_index  # Assign sample_index
-                    if packet[ip_layer].src == src_IP:
-                        fwd_flow.append(packet)
-                    else:
-                        bwd_flow.append(packet)
-                fwd.append(fwd_flow)
-                bwd.append(bwd_flow)
-        return fwd, bwd
-
-
-
-
-    def Extract_Fwd_Features(self, fwd_flow: List[Any], fwd_df: pd.DataFrame) -> Tuple[pd.DataFrame, List[float]]:
-        fwd_timestamps, fwd_total_bytes, fwd_payload_bytes = [], [], []
-        for packet in fwd_flow:
-            fwd_timestamps.append(float(packet.time))
-            fwd_total_bytes.append(packet.__len__())
-            fwd_payload_bytes.append(packet.payload.__len__())
-
-        description = 'Fwd ' if self.sample_type == 'bidirectional' else 'Flow '
-        # Calculate Size Features
-        fwd_df = self.Calculate_Size_Features(len(fwd_flow), fwd_total_bytes, fwd_payload_bytes, fwd_df, description)
-
-        # Calculate Temporal Features
-        fwd_df = self.Calculate_Temporal_Features(fwd_timestamps, fwd_df, description)
-        return fwd_df, fwd_timestamps
-
-
-
-
-    def Calculate_Size_Features(self, packet_num: int, total_bytes: List[int], payload_bytes: List[int], df: pd.DataFrame, description: str = 'Flow ') -> pd.DataFrame:
-        # These Feature have no problem if the flow contains only one packet
-        df.loc[0, f'{description}Total Packets'] = packet_num
-        df.loc[0, f'{description}Total Bytes'] = sum(total_bytes)
-
-        df.loc[0, f'{description}Packet Bytes Min'] = min(total_bytes)
-        df.loc[0, f'{description}Packet Bytes Max'] = max(total_bytes)
-        df.loc[0, f'{description}Packet Bytes Avg'] = sum(total_bytes) / len(total_bytes)
-        df.loc[0, f'{description}Packet Bytes Variance'] = np.var(total_bytes)
-
-        df.loc[0, f'{description}Payload Bytes Min'] = min(payload_bytes)
-        df.loc[0, f'{description}Payload Bytes Max'] = max(payload_bytes)
-        df.loc[0, f'{description}Payload Bytes Avg'] = sum(payload_bytes) / len(payload_bytes)
-        df.loc[0, f'{description}Payload Bytes Variance'] = np.var(payload_bytes)
-
-        df.loc[0, f'{description}Header Bytes'] = np.sum(np.array(total_bytes) - np.array(payload_bytes))
-        return df
-
-
-
-
-    def Calculate_Temporal_Features(self, timestamps: List[float], df: pd.DataFrame, description: str = 'Flow ') -> pd.DataFrame:
-        timestamps.sort()
-        if (len(timestamps) == 1) or (timestamps[0] == 0 and len(timestamps) == 2):
-            df = self.Handle_Temporal_Exceptions(df, description)
-        else:
-            pairwise_diff = np.diff(timestamps)
-            if timestamps[0] == 0:
-                df.loc[0, f'{description}Duration'] = timestamps[-1] - timestamps[1]
-                pairwise_diff = pairwise_diff[1:]
-            else:
-                df.loc[0, f'{description}Duration'] = timestamps[-1] - timestamps[0]
-
-            # Exception where timestamps are all the same for some reason (maybe the split)
-            if df[f'{description}Duration'][0] == 0:
-                df = self.Handle_Temporal_Exceptions(df, description)
-                return df
-            df.loc[0, f'{description}Bytes/s'] = df[f'{description}Total Bytes'][0] / df.loc[
-                0, f'{description}Duration']
-            df.loc[0, f'{description}Packets/s'] = len(timestamps) / (timestamps[-1] - timestamps[0])
+    def Get_Dataset(self, capture: Flow_Table, flows: List[Flow]) -> Split_Dataset:
+        # Check for Sub-cases
+        tabular, statistical = None, None
+        tic = time.perf_counter()
+        if self.Check_For_Tabular():
+            try:
+                with get_metrics().Timer('stage_duration_seconds', stage='tabular'):
+                    tabular = self.Get_Hex_Flows(capture, flows)
+                logger.debug(f"Generated {len(tabular)} tabular samples")
+            except Exception as e:
+                logger.error(f"Error in tabular dataset generation: {e}", exc_info=True)
+                raise
 
-            df.loc[0, f'{description}IAT Total'] = pairwise_diff.sum()
-            df.loc[0, f'{description}IAT Min'] = pairwise_diff.min()
-            df.loc[0, f'{description}IAT Max'] = pairwise_diff.max()
-            df.loc[0, f'{description}IAT Avg'] = pairwise_diff.mean()
-            df.loc[0, f'{description}IAT Variance'] = np.var(pairwise_diff)
-        return df
+        if self.Check_For_Statistical():
+            try:
+                with get_metrics().Timer('stage_duration_seconds', stage='statistical'):
+                    statistical = self.Get_Statistical_Features(flows)
+                logger.debug("Generated statistical dataset")
+            except Exception as e:
+                logger.error(f"Error generating statistical dataset: {e}", exc_info=True)
+                raise
+        self.feature_seconds += time.perf_counter() - tic
 
+        sample_indices = np.array([flow.sample_index for flow in flows], dtype=np.int64)
+        flow_keys = [flow.key for flow in flows]
+        return Split_Dataset(self.pcap_path, self.split, sample_indices, flow_keys, tabular, statistical,
+                             self.feature_names)
 
 
 
-    def Handle_Temporal_Exceptions(self, df: pd.DataFrame, description: str) -> pd.DataFrame:
-        # Handles the cases where you have only one timestamp or zero timestamps (and assign 0 on the value)
-        df.loc[0, f'{description}Duration'] = 0
-        df.loc[0, f'{description}Bytes/s'] = 0
 
-        df.loc[0, f'{description}Packets/s'] = 0
-        df.loc[0, f'{description}IAT Total'] = 0
-        df.loc[0, f'{description}IAT Min'] = 0
-        df.loc[0, f'{description}IAT Max'] = 0
-        df.loc[0, f'{description}IAT Avg'] = 0
-        df.loc[0, f'{description}IAT Variance'] = 0
-        return df
+    def Get_Hex_Flows(self, capture: Flow_Table, flows: List[Flow]) -> np.ndarray:
+        samples = np.empty((len(flows), self.target_sample_length), dtype=np.uint8)
+        for row, flow in enumerate(flows):
+            samples[row] = capture.Get_Sample(flow)
+        return samples
 
 
 
 
-    def Extract_Bwd_Features(self, bwd_flow: List[Any], df: pd.DataFrame) -> Tuple[pd.DataFrame, List[float]]:
-        if len(bwd_flow) == 0:
-            bwd_timestamps, bwd_total_bytes, bwd_payload_bytes = [0], [0], [0]
-        else:
-            bwd_timestamps, bwd_total_bytes, bwd_payload_bytes = [], [], []
-            for packet in bwd_flow:
-                bwd_timestamps.append(float(packet.time))
-                bwd_total_bytes.append(packet.__len__())
-                bwd_payload_bytes.append(packet.payload.__len__())
-        description = 'Bwd '
-        # Calculate Size Features
-        df = self.Calculate_Size_Features(len(bwd_flow), bwd_total_bytes, bwd_payload_bytes, df, description)
-
-        # Calculate Temporal Features
-        df = self.Calculate_Temporal_Features(bwd_timestamps, df, description)
-        return df, bwd_timestamps
-
-
-
-
-    def Calculate_Total_Size_Features(self, df: pd.DataFrame) -> pd.DataFrame:
-        df.loc[0, 'Flow Total Packets'] = df['Fwd Total Packets'][0] + df['Bwd Total Packets'][0]
-        df.loc[0, 'Flow Total Bytes'] = df['Fwd Total Bytes'][0] + df['Bwd Total Bytes'][0]
-
-        df.loc[0, 'Flow Packet Bytes Min'] = min(df['Fwd Packet Bytes Min'][0], df['Bwd Packet Bytes Min'][0])
-        df.loc[0, 'Flow Packet Bytes Max'] = max(df['Fwd Packet Bytes Max'][0], df['Bwd Packet Bytes Max'][0])
-        df.loc[0, 'Flow Packet Bytes Avg'] = (df['Fwd Packet Bytes Avg'][0] + df['Bwd Packet Bytes Avg'][0]) / 2
-        df.loc[0, f'Flow Packet Bytes Variance'] = ((df['Fwd Packet Bytes Variance'][0] * df['Fwd Total Packets'][0])
-                                                    + (df['Bwd Packet Bytes Variance'][0] * df['Bwd Total Packets'][
-                    0])) / (df['Fwd Total Packets'][0] + df['Bwd Total Packets'][0])
-
-        df.loc[0, 'Flow Payload Bytes Min'] = min(df['Fwd Payload Bytes Min'][0], df['Bwd Payload Bytes Min'][0])
-        df.loc[0, 'Flow Payload Bytes Max'] = max(df['Fwd Payload Bytes Max'][0], df['Bwd Payload Bytes Max'][0])
-        df.loc[0, 'Flow Payload Bytes Avg'] = (df['Fwd Payload Bytes Avg'][0] + df['Bwd Payload Bytes Avg'][0]) / 2
-        df.loc[0, 'Flow Payload Bytes Variance'] = ((df['Fwd Payload Bytes Variance'][0] * df['Fwd Total Packets'][0])
-                                                    + (df['Bwd Payload Bytes Variance'][0] * df['Bwd Total Packets'][
-                    0])) / (df['Fwd Total Packets'][0] + df['Bwd Total Packets'][0])
-
-        df.loc[0, 'Flow Header Bytes'] = df['Fwd Header Bytes'][0] + df['Bwd Header Bytes'][0]
-        return df
+    def Get_Statistical_Features(self, flows: List[Flow]) -> np.ndarray:
+        return Get_Statistical_Matrix([flow.stats for flow in flows], self.feature_names)
@@ -1,9 +1,30 @@
 from . import utils as util
 from .logger import setup_logger
+from .writers import Background_Writer, CSV_Writer, Get_Shard_Limits, Get_Writer, Write_Error
+from .metrics import get_metrics
+from .manifest import Manifest
+from .scheduler import Schedule_Pcaps
+from .reader import Is_Stream
+from .cache import Get_Cache_Settings
+from .partition import Get_Partition_Bytes
+import argparse
 import sys
 
+def parse_args() -> argparse.Namespace:
+    """Parse command line options, which override the matching config.yaml keys."""
+    parser = argparse.ArgumentParser(prog='gflow', description='Generate datasets from PCAP files')
+    parser.add_argument('--pcap-path', default=None,
+                        help="PCAP file, folder or FIFO to read, '-' for a live capture on stdin (default: config)")
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes for time windows (0 = one per CPU, default: config or 1)')
+    parser.add_argument('--fresh', action='store_true',
+                        help='ignore the manifest of an earlier run in save_folder and process every file again')
+    return parser.parse_args()
+
+
 def main():
     """Main entry point for GFlowMeter."""
+    args = parse_args()
     logger = setup_logger()
     
     try:
@@ -14,27 +35,95 @@ def main():
         required_keys = ['pcap_path', 'save_folder', 'capture_interval', 'sample_type',
                         'target_sample_length', 'dataset_type', 'padding_per_packet']
         util.validate_config(config, required_keys)
+        if args.pcap_path is not None:
+            config['pcap_path'] = args.pcap_path
+        if args.workers is not None:
+            config['workers'] = args.workers
+        try:
+            config['workers'] = util.get_workers(config)
+            Get_Cache_Settings(config)
+            Get_Partition_Bytes(config)
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(1)
         
         # Get list of PCAP files to process
         pcap_files = util.get_pcap_files_list(config['pcap_path'])
         if not pcap_files:
             return
         
+        # The manifest records finished work, a rerun of an interrupted run continues where it stopped.
+        # A live capture cannot be read again, so it has none
+        live = Is_Stream(config['pcap_path'])
+        scheduled = config['workers'] > 1 and len(pcap_files) > 1
+        manifest = None
+        try:
+            if not live:
+                manifest = Manifest(config['save_folder'], config, pcap_files, fresh=args.fresh)
+        except (ValueError, OSError) as e:
+            logger.error(f"Cannot resume from the manifest in {config['save_folder']}: {e}")
+            sys.exit(1)
+        if manifest is not None and manifest.resumed:
+            print(f"♻️  Resuming: {manifest.Count_Done()}/{len(pcap_files)} PCAP files already processed")
+        
+        # Per-sample CSVs go to the folder of their PCAP file, other formats to one set of files for the whole run
+        output_format = config.get('output_format', 'csv')
+        try:
+            writer = Get_Writer(output_format, config['save_folder'], Get_Shard_Limits(config)) \
+                if output_format != 'csv' else CSV_Writer(config['save_folder'], per_pcap=True)
+            if manifest is not None and manifest.resumed:
+                writer.Resume(manifest.rows)
+        except (ValueError, ImportError) as e:
+            logger.error(str(e))
+            sys.exit(1)
+        # The next split is built while the writer thread writes the previous one. A live capture writes
+        # synchronously, so the emit latency includes the write
+        if not live:
+            writer = Background_Writer(writer)
+        
         # Process each PCAP file
         global_index = 0
-        for pcap_idx, pcap in enumerate(pcap_files, 1):
+        try:
+            if live:
+                # Samples are written as their flows end, until the stream is closed
+                global_index = util.process_stream(pcap_files[0], config, writer)
+            elif scheduled:
+                # Shared pool for all files, samples are numbered in file order like below
+                global_index = Schedule_Pcaps(pcap_files, config, writer, config['workers'], manifest)
+            else:
+                for pcap_idx, pcap in enumerate(pcap_files, 1):
+                    if manifest.Is_Done(pcap):
+                        global_index = manifest.Get_Entry(pcap)['next_index']
+                        logger.debug(f"Skipping {pcap}, already processed")
+                        continue
+                    try:
+                        num_samples = util.process_pcap_file(
+                            pcap,
+                            pcap_idx,
+                            len(pcap_files),
+                            config,
+                            global_index,
+                            writer,
+                            manifest
+                        )
+                        global_index += num_samples
+                    except Write_Error:
+                        raise
+                    except Exception as e:
+                        logger.error(f"Error processing PCAP file {pcap}: {e}", exc_info=True)
+                        # Not retried on resume, so the following files keep their indices
+                        writer.Then(lambda pcap=pcap, next_index=global_index:
+                                    manifest.Complete_Pcap(pcap, next_index))
+                        continue
+                    writer.Then(lambda: get_metrics().Export(config.get('metrics_summary'),
+                                                             config.get('metrics_textfile')))
+        finally:
             try:
-                num_samples = util.process_pcap_file(
-                    pcap,
-                    pcap_idx,
-                    len(pcap_files),
-                    config,
-                    global_index
-                )
-                global_index += num_samples
-            except Exception as e:
-                logger.error(f"Error processing PCAP file {pcap}: {e}", exc_info=True)
-                continue
+                # Raises if the writer thread failed, so the run ends with an error
+                writer.close()
+            finally:
+                # Final export, after the writers have flushed their last bytes
+                get_metrics().Export(config.get('metrics_summary'), config.get('metrics_textfile'))
         
         logger.debug(f"GFlowMeter completed successfully. Total samples generated: {global_index}")
         
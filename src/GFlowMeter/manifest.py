@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Dict, List
+from .logger import get_logger
+from .metrics import Write_Atomic
+
+logger = get_logger()
+
+'''
+Processing manifest for resumable runs.
+manifest.json in save_folder records the configuration fingerprint, the size and mtime of every
+PCAP file of the run, the first sample index of each file, how many of its time windows
+are complete, and how many samples the writer has committed.
+Windows are written in order, so the completed windows of a file are always a prefix and a rerun
+continues after them with the same sample indices an uninterrupted run would have used.
+Windows are recorded by the writer thread once their samples are written, files are started by the main thread.
+'''
+
+MANIFEST_NAME = 'manifest.json'
+MANIFEST_VERSION = 3
+
+# Settings that change the samples or their numbering, a run can only be resumed with the same values
+FINGERPRINT_KEYS = ('capture_interval', 'sample_type', 'target_sample_length', 'dataset_type', 'padding_per_packet',
+                    'output_format', 'idle_timeout', 'active_timeout')
+FINGERPRINT_DEFAULTS = {'output_format': 'csv'}
+
+
+class Manifest():
+    def __init__(
+        self,
+        save_folder: str,
+        config: Dict[str, Any],
+        pcap_files: List[str],
+        fresh: bool = False
+    ) -> None:
+        self.path = os.path.join(save_folder, MANIFEST_NAME)
+        self.lock = threading.Lock()
+        settings = {key: config.get(key, FINGERPRINT_DEFAULTS.get(key)) for key in FINGERPRINT_KEYS}
+        fingerprint = hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()
+        files = {os.path.abspath(pcap): Get_File_Signature(pcap) for pcap in pcap_files}
+
+        self.resumed = False
+        if not fresh and os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as file:
+                self.data = json.load(file)
+            Check_Manifest(self.data, fingerprint, files)
+            self.resumed = True
+            logger.debug(f"Resuming run from {self.path}")
+            return
+
+        self.data = {
+            'version': MANIFEST_VERSION,
+            'fingerprint': fingerprint,
+            'settings': settings,
+            'rows': 0,
+            'pcaps': {pcap: dict(signature, status='pending', start_index=None, next_index=None, splits_done=0)
+                      for pcap, signature in files.items()},
+        }
+        os.makedirs(save_folder, exist_ok=True)
+        self.Save()
+
+    @property
+    def rows(self) -> int:
+        return self.data['rows']
+
+    def Get_Entry(self, pcap: str) -> Dict[str, Any]:
+        return self.data['pcaps'][os.path.abspath(pcap)]
+
+    def Is_Done(self, pcap: str) -> bool:
+        return self.Get_Entry(pcap)['status'] == 'done'
+
+    def Count_Done(self) -> int:
+        return sum(entry['status'] == 'done' for entry in self.data['pcaps'].values())
+
+    def Start_Pcap(self, pcap: str, start_index: int) -> Dict[str, Any]:
+        with self.lock:
+            entry = self.Get_Entry(pcap)
+            if entry['status'] == 'pending':
+                entry.update(status='partial', start_index=start_index, next_index=start_index, splits_done=0)
+                self.Save()
+            elif entry['start_index'] != start_index:
+                raise RuntimeError(f"{pcap} was started at sample index {entry['start_index']}, not {start_index}")
+            return entry
+
+    def Complete_Split(self, pcap: str, split_number: int, next_index: int, rows: int) -> None:
+        with self.lock:
+            entry = self.Get_Entry(pcap)
+            entry['splits_done'] = split_number
+            entry['next_index'] = next_index
+            self.data['rows'] = rows
+            self.Save()
+
+    def Complete_Pcap(self, pcap: str, next_index: int) -> None:
+        with self.lock:
+            entry = self.Get_Entry(pcap)
+            entry['status'] = 'done'
+            entry['next_index'] = next_index
+            self.Save()
+
+    def Save(self) -> None:
+        Write_Atomic(self.path, json.dumps(self.data, indent=1))
+
+
+def Get_File_Signature(pcap: str) -> Dict[str, int]:
+    stat = os.stat(pcap)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def Check_Manifest(data: Dict[str, Any], fingerprint: str, files: Dict[str, Dict[str, int]]) -> None:
+    """
+    Check that a manifest describes the same run, so its sample indices can be continued.
+
+    Args:
+        data: Loaded manifest
+        fingerprint: Configuration fingerprint of this run
+        files: Signature of every PCAP file of this run, by absolute path
+
+    Raises:
+        ValueError: If the configuration or the set of PCAP files (or their contents) changed
+    """
+    hint = "delete it or run with --fresh to start over"
+    if data.get('version') != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version {data.get('version')}, {hint}")
+    if data['fingerprint'] != fingerprint:
+        raise ValueError(f"The configuration differs from the run recorded in the manifest "
+                         f"({data['settings']}), {hint}")
+    recorded = data['pcaps']
+    added = sorted(set(files) - set(recorded))
+    removed = sorted(set(recorded) - set(files))
+    changed = sorted(pcap for pcap in set(files) & set(recorded)
+                     if (recorded[pcap]['size'], recorded[pcap]['mtime_ns']) != (files[pcap]['size'],
+                                                                                 files[pcap]['mtime_ns']))
+    for problem, pcaps in (('new', added), ('missing', removed), ('modified', changed)):
+        if pcaps:
+            raise ValueError(f"{len(pcaps)} PCAP files are {problem} since the manifest was written "
+                             f"(e.g. {pcaps[0]}), {hint}")
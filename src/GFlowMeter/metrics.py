@@ -0,0 +1,262 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from .logger import get_logger
+
+logger = get_logger()
+
+'''
+Run metrics: counters and histograms with labels, kept in one registry per process.
+Worker processes record into a fresh registry (Metrics_Scope) that is sent back with their
+result and merged into the parent's. Threads of a process (e.g. the writer thread) share its registry.
+The registry is exported as a JSON run summary and as a
+Prometheus textfile (node exporter textfile collector), both rewritten atomically.
+'''
+
+PREFIX = 'gflowmeter_'
+
+# name: (type, help)
+METRICS = {
+    'packets_read_total': ('counter', 'Packets read from PCAP files'),
+    'flows_built_total': ('counter', 'Flows of the sampled protocols assembled from the packets'),
+    'samples_emitted_total': ('counter', 'Samples written to the dataset'),
+    'bytes_written_total': ('counter', 'Bytes written by the dataset writers'),
+    'cache_lookups_total': ('counter', 'Decoded-packet cache lookups, by result (hit / miss)'),
+    'stage_duration_seconds': ('histogram', 'Wall time of one pipeline stage on one split'),
+    'split_duration_seconds': ('histogram', 'Wall time to build the dataset of one split, writing excluded'),
+    'pcap_duration_seconds': ('histogram', 'Wall time to process one PCAP file'),
+    'emit_latency_seconds': ('histogram', 'Live capture: time from the packet that finished a batch of flows '
+                                          'to its samples being written'),
+}
+
+# Upper bounds in seconds, from sub-millisecond stages to hour-long PCAP files
+BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+class Histogram():
+    __slots__ = ('counts', 'count', 'total', 'minimum', 'maximum')
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)  # Per bucket (not cumulative), the last one is +Inf
+        self.count = 0
+        self.total = 0.0
+        self.minimum = math.inf
+        self.maximum = -math.inf
+
+    def Observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.total += value
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+
+    def Merge(self, other: 'Histogram') -> None:
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.total += other.total
+        self.minimum = min(self.minimum, other.minimum)
+        self.maximum = max(self.maximum, other.maximum)
+
+
+class Metrics():
+    def __init__(self) -> None:
+        self.started = time.time()
+        self.counters: Dict[str, Dict[Labels, float]] = {}
+        self.histograms: Dict[str, Dict[Labels, Histogram]] = {}
+        self.lock = threading.RLock()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Sent back from worker processes, without the lock
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]) -> None:
+        self.__dict__.update(state)
+        self.lock = threading.RLock()
+
+    def Increment(self, name: str, value: float = 1, **labels: str) -> None:
+        with self.lock:
+            series = self.counters.setdefault(name, {})
+            key = Get_Labels(labels)
+            series[key] = series.get(key, 0) + value
+
+    def Observe(self, name: str, value: float, **labels: str) -> None:
+        with self.lock:
+            series = self.histograms.setdefault(name, {})
+            key = Get_Labels(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].Observe(value)
+
+    @contextmanager
+    def Timer(self, name: str, **labels: str) -> Iterator[None]:
+        tic = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.Observe(name, time.perf_counter() - tic, **labels)
+
+    def Merge(self, other: 'Metrics') -> None:
+        with self.lock:
+            for name, series in other.counters.items():
+                for key, value in series.items():
+                    mine = self.counters.setdefault(name, {})
+                    mine[key] = mine.get(key, 0) + value
+            for name, series in other.histograms.items():
+                for key, histogram in series.items():
+                    mine = self.histograms.setdefault(name, {})
+                    if key not in mine:
+                        mine[key] = Histogram()
+                    mine[key].Merge(histogram)
+
+    def Total(self, name: str) -> float:
+        with self.lock:
+            return sum(self.counters.get(name, {}).values())
+
+    def Get_Summary(self) -> Dict[str, Any]:
+        now = time.time()
+        summary: Dict[str, Any] = {
+            'started': Format_Time(self.started),
+            'updated': Format_Time(now),
+            'elapsed_seconds': now - self.started,
+            'totals': {name: self.Total(name) for name in self.counters},
+            'counters': {},
+            'histograms': {},
+        }
+        for name, series in self.counters.items():
+            summary['counters'][name] = [{'labels': dict(key), 'value': value} for key, value in series.items()]
+        for name, series in self.histograms.items():
+            summary['histograms'][name] = [{
+                'labels': dict(key),
+                'count': histogram.count,
+                'sum': histogram.total,
+                'min': histogram.minimum,
+                'max': histogram.maximum,
+                'mean': histogram.total / histogram.count,
+                'buckets': dict(zip([str(bound) for bound in BUCKETS] + ['+Inf'], Cumulative(histogram.counts))),
+            } for key, histogram in series.items()]
+        return summary
+
+    def Get_Prometheus_Text(self) -> str:
+        lines = []
+        for name, (kind, description) in METRICS.items():
+            series = self.counters.get(name) if kind == 'counter' else self.histograms.get(name)
+            if not series:
+                continue
+            metric = PREFIX + name
+            lines.append(f'# HELP {metric} {description}')
+            lines.append(f'# TYPE {metric} {kind}')
+            for key, value in sorted(series.items()):
+                if kind == 'counter':
+                    lines.append(f'{metric}{Format_Labels(key)} {Format_Value(value)}')
+                    continue
+                bounds = [Format_Value(bound) for bound in BUCKETS] + ['+Inf']
+                for bound, count in zip(bounds, Cumulative(value.counts)):
+                    lines.append(f'{metric}_bucket{Format_Labels(key + (("le", bound),))} {count}')
+                lines.append(f'{metric}_sum{Format_Labels(key)} {Format_Value(value.total)}')
+                lines.append(f'{metric}_count{Format_Labels(key)} {value.count}')
+        # Lets alerts tell a stalled batch job from a finished one
+        for name, description, value in (('run_start_time_seconds', 'Start time of the run', self.started),
+                                          ('last_update_time_seconds', 'Time the metrics were exported', time.time())):
+            lines.append(f'# HELP {PREFIX}{name} {description}')
+            lines.append(f'# TYPE {PREFIX}{name} gauge')
+            lines.append(f'{PREFIX}{name} {Format_Value(value)}')
+        return '\n'.join(lines) + '\n'
+
+    def Export(self, summary_path: Optional[str] = None, textfile_path: Optional[str] = None) -> None:
+        # Called after every PCAP file, so long runs can be followed while they are in progress.
+        # The lock keeps other threads from adding series while they are listed
+        try:
+            with self.lock:
+                if summary_path:
+                    Write_Atomic(summary_path, json.dumps(self.Get_Summary(), indent=2))
+                if textfile_path:
+                    Write_Atomic(textfile_path, self.Get_Prometheus_Text())
+        except OSError as e:
+            logger.error(f"Error exporting metrics: {e}", exc_info=True)
+
+
+_metrics = Metrics()
+
+if hasattr(os, 'register_at_fork'):
+    # A worker process forked while another thread held the lock would wait for it forever
+    os.register_at_fork(after_in_child=lambda: setattr(_metrics, 'lock', threading.RLock()))
+
+
+def get_metrics() -> Metrics:
+    """
+    Get the metrics registry of the current process (or of the innermost Metrics_Scope).
+
+    Returns:
+        Metrics instance
+    """
+    return _metrics
+
+
+@contextmanager
+def Metrics_Scope() -> Iterator[Metrics]:
+    """
+    Record into a fresh registry for the duration of the block, e.g. one split in a worker process.
+
+    Yields:
+        The fresh Metrics instance, to be returned to the parent and merged with Metrics.Merge
+    """
+    global _metrics
+    previous, _metrics = _metrics, Metrics()
+    try:
+        yield _metrics
+    finally:
+        _metrics = previous
+
+
+def Get_Labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def Cumulative(counts: List[int]) -> List[int]:
+    total, cumulative = 0, []
+    for count in counts:
+        total += count
+        cumulative.append(total)
+    return cumulative
+
+
+def Format_Labels(labels: Labels) -> str:
+    if not labels:
+        return ''
+    # Label values escape backslash, double quote and newline
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in labels)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + '}'
+
+
+def Format_Value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def Format_Time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat()
+
+
+def Write_Atomic(path: str, text: str) -> None:
+    """
+    Replace a file in one step, so readers (e.g. the node exporter) never see a partial file.
+
+    Args:
+        path: File to write
+        text: New content
+    """
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    temporary_path = f'{path}.{os.getpid()}.tmp'
+    with open(temporary_path, 'w', encoding='utf-8') as file:
+        file.write(text)
+    os.replace(temporary_path, path)
@@ -0,0 +1,182 @@
+import array
+import io
+import os
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Any, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+import numpy as np
+from .cache import Decoded_Window, Packet_Columns
+from .flowkey import Flow_Key
+from .logger import get_logger
+from .metrics import Metrics, Metrics_Scope, get_metrics
+from .reader import Get_Compression, Is_Stream, Partition, Pcap_Reader
+
+logger = get_logger()
+
+'''
+Intra-file parallelism for large PCAP files.
+The parent walks the record headers of the memory-mapped file and cuts it into byte ranges aligned to
+records (Pcap_Reader.Iter_Partitions), worker processes dissect the ranges into the columns the
+decoded-packet cache stores, and the parent stitches the results back together in file order, cutting
+them into capture_interval windows. The windows are Decoded_Window objects like those of a cache entry,
+so the samples are the same as when the file is read in one pass.
+'''
+
+
+class Decoded_Range(NamedTuple):
+    record_timestamps: np.ndarray           # float64, every record of the range, also of other protocols
+    rows: np.ndarray                        # int64, position in the range of every stored packet
+    endpoints: List[Flow_Key]               # Distinct endpoints of the range, indexed by flows
+    flows: np.ndarray                       # Columns of the stored packets, see Packet_Columns
+    timestamps: np.ndarray
+    lengths: np.ndarray
+    offsets: np.ndarray
+    data: np.ndarray
+
+
+# A run of records of one window within a decoded range: (range, records, first row, end row)
+Piece = Tuple[Decoded_Range, int, int, int]
+
+
+def Decode_Partition(pcap_path: str, partition: Partition) -> Tuple[Decoded_Range, Metrics]:
+    """
+    Dissect the records of one byte range of a PCAP file, in a worker process.
+
+    Args:
+        pcap_path: PCAP or PCAPNG file
+        partition: Range returned by Pcap_Reader.Iter_Partitions
+
+    Returns:
+        Tuple of (decoded packets of the range, metrics recorded while decoding it, to be merged by the parent)
+    """
+    with Metrics_Scope() as metrics:
+        with metrics.Timer('stage_duration_seconds', stage='decode'):
+            data_file = io.BytesIO()
+            packets = Packet_Columns(data_file)
+            record_timestamps = array.array('d')
+            rows = array.array('q')
+            with Pcap_Reader(pcap_path) as reader:
+                for position, record in enumerate(reader.Read_Partition(partition)):
+                    record_timestamps.append(record.timestamp)
+                    if packets.Add(record):
+                        rows.append(position)
+            columns = packets.Get_Columns()
+            decoded = Decoded_Range(np.frombuffer(record_timestamps, dtype=np.float64),
+                                    np.frombuffer(rows, dtype=np.int64), list(packets.endpoint_ids),
+                                    columns['flows'], columns['timestamps'], columns['lengths'], columns['offsets'],
+                                    np.frombuffer(data_file.getvalue(), dtype=np.uint8))
+    return decoded, metrics
+
+
+def Partition_Windows(
+    pcap_path: str,
+    capture_interval: float,
+    partition_bytes: int,
+    executor: Executor,
+    max_pending: int
+) -> Iterator[Tuple[int, Decoded_Window]]:
+    """
+    Split a PCAP file into time windows, decoding byte ranges of it in a pool of worker processes.
+
+    Args:
+        pcap_path: Plain (uncompressed) PCAP or PCAPNG file
+        capture_interval: Time interval in seconds for splitting
+        partition_bytes: Size of a byte range, ranges are extended to the next record boundary
+        executor: Worker pool decoding the ranges
+        max_pending: Ranges decoded ahead of the window being stitched, bounds the memory in use
+
+    Yields:
+        Tuples of (window number, decoded packets of the window), the same windows as Split_Cap
+    """
+    from .utils import Time_Window
+
+    window = Time_Window(capture_interval)
+    pending: Deque[Future] = deque()
+    pieces: List[Piece] = []                # Of the open window, which may continue in the next range
+    number = 0
+
+    def collect() -> Iterator[Tuple[int, Decoded_Window]]:
+        nonlocal pieces, number
+        decoded, range_metrics = pending.popleft().result()
+        get_metrics().Merge(range_metrics)
+        numbers = np.array([window.Get_Number(timestamp) for timestamp in decoded.record_timestamps.tolist()],
+                           dtype=np.int64)
+        # Window numbers never decrease, every run of equal numbers is one window
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(numbers)) + 1, [len(numbers)]))
+        row_starts = np.searchsorted(decoded.rows, starts).tolist()
+        starts = starts.tolist()
+        for run in range(len(starts) - 1):
+            run_number = int(numbers[starts[run]])
+            if run_number != number:
+                if pieces:
+                    yield number, Stitch_Window(pieces)
+                pieces, number = [], run_number
+            pieces.append((decoded, starts[run + 1] - starts[run], row_starts[run], row_starts[run + 1]))
+
+    with Pcap_Reader(pcap_path) as reader:
+        for partition in reader.Iter_Partitions(partition_bytes):
+            pending.append(executor.submit(Decode_Partition, pcap_path, partition))
+            while len(pending) >= max_pending:
+                yield from collect()
+        while pending:
+            yield from collect()
+    if pieces:
+        yield number, Stitch_Window(pieces)
+
+
+def Stitch_Window(pieces: List[Piece]) -> Decoded_Window:
+    """
+    Join the parts of a window decoded in different byte ranges.
+
+    Args:
+        pieces: Runs of records of the window, in file order
+
+    Returns:
+        Decoded_Window with the endpoints renumbered for the window
+    """
+    endpoint_ids: Dict[Flow_Key, int] = {}
+    flows, timestamps, lengths, data = [], [], [], []
+    offsets = [np.zeros(1, dtype=np.int64)]
+    packets, written = 0, 0
+    for decoded, num_records, start, end in pieces:
+        packets += num_records
+        ids, inverse = np.unique(decoded.flows[start:end], return_inverse=True)
+        renumbered = np.array([endpoint_ids.setdefault(decoded.endpoints[i], len(endpoint_ids))
+                               for i in ids.tolist()], dtype=np.int32)
+        flows.append(renumbered[inverse])
+        timestamps.append(decoded.timestamps[start:end])
+        lengths.append(decoded.lengths[start:end])
+        piece_offsets = decoded.offsets[start:end + 1]
+        offsets.append(piece_offsets[1:] - piece_offsets[0] + written)
+        data.append(decoded.data[piece_offsets[0]:piece_offsets[-1]])
+        written += int(piece_offsets[-1] - piece_offsets[0])
+    return Decoded_Window(packets, list(endpoint_ids), np.concatenate(flows).astype(np.int32),
+                          np.concatenate(timestamps), np.concatenate(lengths), np.concatenate(offsets),
+                          np.concatenate(data))
+
+
+def Can_Partition(pcap_path: str, partition_bytes: int) -> bool:
+    # Only plain files can be mapped and read range by range, a file of a single range gains nothing
+    return not Is_Stream(pcap_path) and Get_Compression(pcap_path) is None \
+        and os.path.getsize(pcap_path) > partition_bytes
+
+
+def Get_Partition_Bytes(config: Dict[str, Any]) -> Optional[int]:
+    """
+    Read the byte range size of intra-file parallelism from a configuration.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        Size of a byte range in bytes, None if PCAP files are not partitioned
+
+    Raises:
+        ValueError: If partition_mb is not a positive number
+    """
+    partition_mb = config.get('partition_mb')
+    if partition_mb is None:
+        return None
+    if isinstance(partition_mb, bool) or not isinstance(partition_mb, (int, float)) or partition_mb <= 0:
+        raise ValueError(f"Invalid partition_mb: {partition_mb}. Must be a positive number of megabytes")
+    return max(1, int(partition_mb * 1024 ** 2))
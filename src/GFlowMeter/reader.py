@@ -0,0 +1,673 @@
+import bz2
+import lzma
+import mmap
+import os
+import queue
+import signal
+import stat
+import struct
+import sys
+import threading
+import zlib
+from typing import Any, BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from .logger import get_logger
+
+logger = get_logger()
+
+'''
+Native PCAP / PCAPNG reader.
+Records are parsed with struct directly over a memory-mapped file, so no Scapy objects are built.
+Live captures (stdin or a FIFO, e.g. `tcpdump -U -w -`) cannot be mapped and are read
+record by record as the bytes arrive. Compressed captures (gzip, xz, bz2) are read the same way,
+from chunks a background thread decompresses them into.
+A mapped file can also be cut into byte ranges aligned to its records (Iter_Partitions), which are
+read independently of each other, e.g. by worker processes.
+'''
+
+# pcap_path of a capture read from standard input
+STDIN = '-'
+
+# Largest record / block accepted from a stream, whose lengths cannot be checked against a file size
+MAX_STREAM_RECORD = 1 << 26
+
+# Compressed captures, recognized by their magic bytes, and a new decompressor for one gzip member / stream
+COMPRESSIONS: Dict[bytes, Callable[[], Any]] = {
+    b'\x1f\x8b': lambda: zlib.decompressobj(wbits=31),
+    b'\xfd7zXZ\x00': lzma.LZMADecompressor,
+    b'BZh': bz2.BZ2Decompressor,
+}
+
+# File names find_pcap_files picks up
+CAPTURE_EXTENSIONS = tuple(extension + compression for extension in ('.pcap', '.pcapng')
+                           for compression in ('', '.gz', '.xz', '.bz2'))
+
+# Compressed bytes decompressed at a time. Large chunks keep the GIL handovers between the decompressing
+# and the reading thread rare.
+DECOMPRESS_CHUNK = 1 << 20
+
+# Decompressed chunks waiting for the reader, bounds the memory a fast decompressor can fill
+DECOMPRESS_QUEUE = 8
+
+# PCAP global header magics (microsecond / nanosecond resolution)
+PCAP_MAGIC_USEC = 0xa1b2c3d4
+PCAP_MAGIC_NSEC = 0xa1b23c4d
+
+# PCAPNG block types (Section Header, Interface Description, obsolete Packet, Simple / Enhanced Packet)
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_PACKET_BLOCKS = (PCAPNG_PB, PCAPNG_SPB, PCAPNG_EPB)
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+# Interface Description Block options
+PCAPNG_OPT_ENDOFOPT = 0
+PCAPNG_IF_TSRESOL = 9
+PCAPNG_IF_TSOFFSET = 14
+
+
+class Record(NamedTuple):
+    timestamp: float
+    wire_length: int
+    data: bytes
+    link_type: int
+
+
+class Interface(NamedTuple):
+    link_type: int
+    snap_length: int                        # 0 if unlimited
+    resolution: int                         # Timestamp units per second (if_tsresol, default microseconds)
+    offset: int                             # Seconds added to every timestamp (if_tsoffset)
+
+
+class Partition(NamedTuple):
+    start: int                              # Offset of the first record / block of the range
+    end: int                                # Offset after its last one, the file size for the last range
+    # PCAPNG: state of the section the range starts in (byte order, interfaces, timestamp of the packet before)
+    endian: str = '<'
+    interfaces: Tuple[Interface, ...] = ()
+    timestamp: float = 0.0
+
+
+class Pcapng_Section():
+    # Byte order and interfaces of one PCAPNG section, with the block structs compiled for its byte order
+    def __init__(self, endian: str, pcap_path: str, timestamp: float = 0.0) -> None:
+        self.endian = endian
+        self.pcap_path = pcap_path
+        self.interfaces: List[Interface] = []
+        # Simple Packet Blocks carry no timestamp, they get the one of the packet before them
+        self.timestamp = timestamp
+        self.block_header = struct.Struct(endian + 'II')
+        self.idb_header = struct.Struct(endian + 'HHI')
+        self.option_header = struct.Struct(endian + 'HH')
+        self.pb_header = struct.Struct(endian + 'HHIIII')
+        self.spb_header = struct.Struct(endian + 'I')
+        self.epb_header = struct.Struct(endian + 'IIIII')
+
+    def Parse_Block(self, buffer: bytes, offset: int, block_type: int, block_length: int) -> Optional[Record]:
+        # Interprets one complete block, returns the Record of a packet block and None for any other block
+        if block_type == PCAPNG_EPB:
+            interface_id, ts_high, ts_low, captured_length, wire_length = \
+                self.epb_header.unpack_from(buffer, offset + 8)
+            data_offset = offset + 28
+        elif block_type == PCAPNG_SPB:
+            if not self.interfaces:
+                return self.Unknown_Interface(0)
+            interface = self.interfaces[0]
+            wire_length = self.spb_header.unpack_from(buffer, offset + 8)[0]
+            captured_length = min(wire_length, block_length - 16)
+            if interface.snap_length:
+                captured_length = min(captured_length, interface.snap_length)
+            return Record(self.timestamp, wire_length, buffer[offset + 12:offset + 12 + captured_length],
+                          interface.link_type)
+        elif block_type == PCAPNG_IDB:
+            self.Add_Interface(buffer, offset, block_length)
+            return None
+        elif block_type == PCAPNG_PB:
+            interface_id, _, ts_high, ts_low, captured_length, wire_length = \
+                self.pb_header.unpack_from(buffer, offset + 8)
+            data_offset = offset + 28
+        else:
+            return None
+
+        # Both carry 28 bytes before the packet data and the trailing block length after it
+        if captured_length > block_length - 32:
+            raise ValueError(f"Packet data of {captured_length} bytes overruns its block of {block_length} bytes "
+                             f"in {self.pcap_path}")
+        if interface_id >= len(self.interfaces):
+            return self.Unknown_Interface(interface_id)
+        interface = self.interfaces[interface_id]
+        # int / int division is correctly rounded, so no precision is lost before the float
+        self.timestamp = ((ts_high << 32) | ts_low) / interface.resolution + interface.offset
+        return Record(self.timestamp, wire_length, buffer[data_offset:data_offset + captured_length],
+                      interface.link_type)
+
+    def Skip_Packet(self, buffer: bytes, offset: int, block_type: int) -> None:
+        # Leaves the timestamp where Parse_Block would for an Enhanced / obsolete Packet Block, without its record
+        if block_type == PCAPNG_EPB:
+            interface_id, ts_high, ts_low = self.epb_header.unpack_from(buffer, offset + 8)[:3]
+        else:
+            interface_id, _, ts_high, ts_low = self.pb_header.unpack_from(buffer, offset + 8)[:4]
+        if interface_id < len(self.interfaces):
+            interface = self.interfaces[interface_id]
+            self.timestamp = ((ts_high << 32) | ts_low) / interface.resolution + interface.offset
+
+    def Add_Interface(self, buffer: bytes, offset: int, block_length: int) -> None:
+        link_type, _, snap_length = self.idb_header.unpack_from(buffer, offset + 8)
+        resolution, time_offset = 1000000, 0
+        option, end = offset + 16, offset + block_length - 4
+        while option + 4 <= end:
+            code, length = self.option_header.unpack_from(buffer, option)
+            if code == PCAPNG_OPT_ENDOFOPT:
+                break
+            if code == PCAPNG_IF_TSRESOL and length >= 1:
+                # The high bit selects a power of 2 instead of a power of 10
+                value = buffer[option + 4]
+                resolution = 2 ** (value & 0x7F) if value & 0x80 else 10 ** value
+            elif code == PCAPNG_IF_TSOFFSET and length >= 8:
+                time_offset = struct.unpack_from(self.endian + 'q', buffer, option + 4)[0]
+            option += 4 + length + (-length % 4)
+        self.interfaces.append(Interface(link_type, snap_length, resolution, time_offset))
+
+    def Unknown_Interface(self, interface_id: int) -> None:
+        logger.warning(f"Packet references unknown interface {interface_id} in {self.pcap_path}, skipping")
+        return None
+
+
+class Pcap_Reader():
+    def __init__(self, pcap_path: str) -> None:
+        if not os.path.exists(pcap_path):
+            raise FileNotFoundError(f"PCAP file not found: {pcap_path}")
+
+        self.pcap_path = pcap_path
+        self.file = None
+        self.buffer = None
+
+        try:
+            self.file = open(pcap_path, 'rb')
+            if os.fstat(self.file.fileno()).st_size == 0:
+                raise ValueError(f"PCAP file is empty: {pcap_path}")
+            self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.close()
+            raise
+
+        if len(self.buffer) < 4:
+            self.close()
+            raise ValueError(f"PCAP file is truncated: {pcap_path}")
+
+        magic = self.buffer[:4]
+        if struct.unpack('<I', magic)[0] == PCAPNG_SHB:
+            self.format = 'pcapng'
+        elif struct.unpack('<I', magic)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC) \
+                or struct.unpack('>I', magic)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            self.format = 'pcap'
+        else:
+            self.close()
+            raise ValueError(f"Not a PCAP or PCAPNG file (bad magic {magic.hex()}): {pcap_path}")
+
+    def __enter__(self) -> 'Pcap_Reader':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Record]:
+        if self.buffer is None:
+            raise ValueError(f"Reader is closed: {self.pcap_path}")
+        if self.format == 'pcapng':
+            return self.Read_Pcapng_Records()
+        return self.Read_Pcap_Records()
+
+    def close(self) -> None:
+        if self.buffer is not None:
+            self.buffer.close()
+            self.buffer = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+
+
+    def Read_Partition(self, partition: Partition) -> Iterator[Record]:
+        # Records of one range returned by Iter_Partitions
+        if self.format == 'pcapng':
+            section = Pcapng_Section(partition.endian, self.pcap_path, partition.timestamp)
+            section.interfaces = list(partition.interfaces)
+            return self.Read_Pcapng_Records(partition.start, partition.end, section)
+        return self.Read_Pcap_Records(partition.start, partition.end)
+
+
+
+
+    def Read_Pcap_Records(self, start: int = 24, end: Optional[int] = None) -> Iterator[Record]:
+        buffer = self.buffer
+        size = len(buffer)
+        if size < 24:
+            raise ValueError(f"PCAP global header is truncated: {self.pcap_path}")
+
+        record_header, resolution, link_type = Parse_Pcap_Header(buffer[:24])
+        offset = start
+        end = size if end is None else end
+        while offset + 16 <= end:
+            ts_sec, ts_frac, captured_length, wire_length = record_header.unpack_from(buffer, offset)
+            offset += 16
+            if offset + captured_length > size:
+                logger.warning(f"Truncated record at offset {offset - 16} in {self.pcap_path}, stopping")
+                return
+            # int / int division is correctly rounded, so no precision is lost before the float
+            yield Record((ts_sec * resolution + ts_frac) / resolution, wire_length,
+                         buffer[offset:offset + captured_length], link_type)
+            offset += captured_length
+
+
+
+
+    def Read_Pcapng_Records(
+        self,
+        start: int = 0,
+        end: Optional[int] = None,
+        section: Optional[Pcapng_Section] = None
+    ) -> Iterator[Record]:
+        buffer = self.buffer
+        size = len(buffer)
+        # The file starts with a Section Header Block, which replaces this placeholder
+        if section is None:
+            section = Pcapng_Section('<', self.pcap_path)
+
+        offset = start
+        end = size if end is None else end
+        while offset + 12 <= end:
+            block_type, block_length = section.block_header.unpack_from(buffer, offset)
+            if block_type == PCAPNG_SHB:
+                # A new section may switch the byte order and resets the interfaces
+                endian = Get_Section_Endian(buffer[offset + 8:offset + 12], f"at offset {offset}: {self.pcap_path}")
+                section = Pcapng_Section(endian, self.pcap_path, section.timestamp)
+                block_length = section.block_header.unpack_from(buffer, offset)[1]
+            if block_length < 12 or offset + block_length > size:
+                logger.warning(f"Truncated block at offset {offset} in {self.pcap_path}, stopping")
+                return
+
+            record = section.Parse_Block(buffer, offset, block_type, block_length)
+            if record is not None:
+                yield record
+            offset += block_length
+
+
+
+
+    def Iter_Partitions(self, partition_bytes: int) -> Iterator[Partition]:
+        # Cuts the file into ranges of at least partition_bytes that start and end on record / block boundaries,
+        # walking the record / block headers only. The last range runs to the end of the file, so reading it
+        # reports a truncated last record like reading the whole file does.
+        buffer = self.buffer
+        size = len(buffer)
+        if self.format == 'pcap':
+            if size < 24:
+                raise ValueError(f"PCAP global header is truncated: {self.pcap_path}")
+            endian = '<' if struct.unpack('<I', buffer[:4])[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC) else '>'
+            length = struct.Struct(endian + 'I')
+            start = offset = 24
+            while offset + 16 <= size:
+                following = offset + 16 + length.unpack_from(buffer, offset + 8)[0]
+                if following > size:
+                    break
+                offset = following
+                if offset - start >= partition_bytes:
+                    yield Partition(start, offset)
+                    start = offset
+            if start < size:
+                yield Partition(start, size)
+            return
+
+        section = Pcapng_Section('<', self.pcap_path)
+        state = Partition(0, 0)
+        start = offset = 0
+        timed = None                            # Offset and type of the last packet block carrying a timestamp
+        while offset + 12 <= size:
+            block_type, block_length = section.block_header.unpack_from(buffer, offset)
+            if block_type == PCAPNG_SHB:
+                if timed is not None:
+                    section.Skip_Packet(buffer, *timed)
+                    timed = None
+                endian = Get_Section_Endian(buffer[offset + 8:offset + 12], f"at offset {offset}: {self.pcap_path}")
+                section = Pcapng_Section(endian, self.pcap_path, section.timestamp)
+                block_length = section.block_header.unpack_from(buffer, offset)[1]
+            if block_length < 12 or offset + block_length > size:
+                break
+            if block_type == PCAPNG_IDB:
+                section.Add_Interface(buffer, offset, block_length)
+            elif block_type in (PCAPNG_EPB, PCAPNG_PB):
+                timed = (offset, block_type)
+            offset += block_length
+            if offset - start >= partition_bytes:
+                yield state._replace(start=start, end=offset)
+                if timed is not None:
+                    section.Skip_Packet(buffer, *timed)
+                    timed = None
+                state = Partition(offset, offset, section.endian, tuple(section.interfaces), section.timestamp)
+                start = offset
+        if start < size:
+            yield state._replace(start=start, end=size)
+
+
+class Stream_Interrupted(Exception):
+    pass
+
+
+class Decompressor():
+    # Decompresses a capture file on a background thread. zlib, lzma and bz2 release the GIL while they
+    # work, so decompression overlaps with the parsing and flow assembly reading the decompressed chunks.
+    # Chunks go through a queue rather than an OS pipe, whose descriptors forked worker processes would
+    # inherit and hold open.
+    def __init__(self, pcap_path: str, new_decompressor: Callable[[], Any]) -> None:
+        self.pcap_path = pcap_path
+        self.error: Optional[Exception] = None
+        self.chunks: queue.Queue = queue.Queue(maxsize=DECOMPRESS_QUEUE)
+        self.buffer = b''
+        self.position = 0
+        self.ended = False                      # The thread's end marker was read
+        self.stopped = False                    # Closed by the reader, the thread stops
+        source = open(pcap_path, 'rb')
+        self.thread = threading.Thread(target=self.Decompress, args=(source, new_decompressor),
+                                       name=f'decompress-{os.path.basename(pcap_path)}', daemon=True)
+        self.thread.start()
+
+    def Decompress(self, source: BinaryIO, new_decompressor: Callable[[], Any]) -> None:
+        try:
+            # Concatenated gzip members / xz or bz2 streams are read one after the other
+            decompressor, finished = new_decompressor(), False
+            data = source.read(DECOMPRESS_CHUNK)
+            while data and not self.stopped:
+                following = finished
+                if finished:
+                    decompressor, finished = new_decompressor(), False
+                try:
+                    decompressed = decompressor.decompress(data)
+                except (zlib.error, lzma.LZMAError, OSError):
+                    if not following:
+                        raise
+                    # Like gzip, lzma and bz2, padding or garbage right after a complete stream is ignored
+                    finished = True
+                    break
+                if decompressed:
+                    self.chunks.put(decompressed)
+                # The rest of the chunk after the end of a stream starts the next one
+                finished = decompressor.eof
+                data = decompressor.unused_data if finished else b''
+                if not data:
+                    data = source.read(DECOMPRESS_CHUNK)
+            if not finished and not self.stopped:
+                # Ends like a truncated capture file, the reader stops at the last complete record
+                logger.warning(f"Compressed stream ended early in {self.pcap_path}")
+        except Exception as e:
+            self.error = e
+        finally:
+            source.close()
+            self.chunks.put(None)
+
+    def read(self, size: int) -> bytes:
+        available = len(self.buffer) - self.position
+        while available < size and not self.ended:
+            chunk = self.chunks.get()
+            if chunk is None:
+                self.ended = True
+                break
+            self.buffer = self.buffer[self.position:] + chunk
+            self.position = 0
+            available = len(self.buffer)
+        data = self.buffer[self.position:self.position + size]
+        self.position += len(data)
+        if len(data) < size and self.error is not None:
+            raise ValueError(f"Error decompressing {self.pcap_path}: {self.error}") from self.error
+        return data
+
+    def close(self) -> None:
+        # Unblocks the thread if it waits for room in the queue
+        self.stopped = True
+        while self.thread.is_alive():
+            try:
+                self.chunks.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        self.thread.join()
+
+
+class Stream_Reader():
+    def __init__(self, pcap_path: str, file: Optional[BinaryIO] = None) -> None:
+        # Opening a FIFO blocks until its writer (e.g. tcpdump) connects
+        # file: an open stream of the capture (a Decompressor), read without the live capture handling of Ctrl+C
+        self.pcap_path = pcap_path
+        self.live = file is None
+        self.reading = False                    # Blocked in a read, Ctrl+C has to break out of it
+        self.interrupted = False
+        if file is None:
+            file = sys.stdin.buffer if pcap_path == STDIN else open(pcap_path, 'rb')
+        self.file: Optional[BinaryIO] = file
+        self.magic = self.Read(4)
+        if len(self.magic) < 4:
+            self.close()
+            raise ValueError(f"Capture stream ended before its header: {Get_Source_Name(pcap_path)}")
+
+        if struct.unpack('<I', self.magic)[0] == PCAPNG_SHB:
+            self.format = 'pcapng'
+        elif struct.unpack('<I', self.magic)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC) \
+                or struct.unpack('>I', self.magic)[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            self.format = 'pcap'
+        else:
+            self.close()
+            raise ValueError(f"Not a PCAP or PCAPNG stream (bad magic {self.magic.hex()}): "
+                             f"{Get_Source_Name(pcap_path)}")
+
+    def __enter__(self) -> 'Stream_Reader':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def __iter__(self) -> Iterator[Record]:
+        if self.file is None:
+            raise ValueError(f"Reader is closed: {self.pcap_path}")
+        records = self.Read_Pcapng_Records() if self.format == 'pcapng' else self.Read_Pcap_Records()
+        if not self.live:
+            yield from records
+            return
+        # The first Ctrl+C ends the capture like the end of the stream, so the open flows are still
+        # written, a second one aborts
+        try:
+            previous = signal.signal(signal.SIGINT, self.Interrupt)
+        except ValueError:
+            previous = None                     # Not the main thread, Ctrl+C keeps its usual behaviour
+        try:
+            yield from records
+        except Stream_Interrupted:
+            pass
+        finally:
+            if previous is not None:
+                signal.signal(signal.SIGINT, previous)
+        if self.interrupted:
+            logger.warning(f"Interrupted, closed the live capture {Get_Source_Name(self.pcap_path)}")
+
+    def close(self) -> None:
+        if self.file is not None and self.file is not sys.stdin.buffer:
+            self.file.close()
+        self.file = None
+
+
+
+
+    def Read(self, size: int) -> bytes:
+        # Blocks until size bytes have arrived, fewer only at the end of the stream
+        if self.interrupted:
+            return b''
+        self.reading = True
+        try:
+            return self.file.read(size)
+        finally:
+            self.reading = False
+
+
+
+
+    def Interrupt(self, signum: int, frame: object) -> None:
+        if self.interrupted:
+            raise KeyboardInterrupt
+        self.interrupted = True
+        if self.reading:
+            raise Stream_Interrupted
+
+
+
+
+    def Read_Pcap_Records(self) -> Iterator[Record]:
+        header = self.magic + self.Read(20)
+        if len(header) < 24:
+            raise ValueError(f"PCAP global header is truncated: {Get_Source_Name(self.pcap_path)}")
+        record_header, resolution, link_type = Parse_Pcap_Header(header)
+
+        while True:
+            header = self.Read(16)
+            if len(header) < 16:
+                if header:
+                    logger.warning(f"Truncated record header in {Get_Source_Name(self.pcap_path)}, stopping")
+                return
+            ts_sec, ts_frac, captured_length, wire_length = record_header.unpack(header)
+            if captured_length > MAX_STREAM_RECORD:
+                raise ValueError(f"Record of {captured_length} bytes in {Get_Source_Name(self.pcap_path)}, "
+                                 f"the stream is corrupted")
+            data = self.Read(captured_length)
+            if len(data) < captured_length:
+                logger.warning(f"Truncated record in {Get_Source_Name(self.pcap_path)}, stopping")
+                return
+            yield Record((ts_sec * resolution + ts_frac) / resolution, wire_length, data, link_type)
+
+
+
+
+    def Read_Pcapng_Records(self) -> Iterator[Record]:
+        section = Pcapng_Section('<', self.pcap_path)
+        block_start = self.magic
+        while True:
+            header = block_start + self.Read(8 - len(block_start))
+            block_start = b''
+            if len(header) < 8:
+                if header:
+                    logger.warning(f"Truncated block header in {Get_Source_Name(self.pcap_path)}, stopping")
+                return
+            block_type, block_length = section.block_header.unpack(header)
+            if block_type == PCAPNG_SHB:
+                # The byte order of the section, its length field included, follows the length field
+                header += self.Read(4)
+                endian = Get_Section_Endian(header[8:12], f"in {Get_Source_Name(self.pcap_path)}")
+                section = Pcapng_Section(endian, self.pcap_path, section.timestamp)
+                block_length = section.block_header.unpack_from(header)[1]
+            if block_length < len(header) or block_length > MAX_STREAM_RECORD:
+                raise ValueError(f"Invalid block length {block_length} in {Get_Source_Name(self.pcap_path)}")
+            block = header + self.Read(block_length - len(header))
+            if len(block) < block_length:
+                logger.warning(f"Truncated block in {Get_Source_Name(self.pcap_path)}, stopping")
+                return
+
+            record = section.Parse_Block(block, 0, block_type, block_length)
+            if record is not None:
+                yield record
+
+
+def Parse_Pcap_Header(header: bytes) -> Tuple[struct.Struct, int, int]:
+    """
+    Parse the 24-byte global header of a PCAP file.
+
+    Args:
+        header: Global header bytes
+
+    Returns:
+        Tuple of (record header struct in the file's byte order, timestamp fraction units per second,
+        link type)
+    """
+    endian = '<' if struct.unpack('<I', header[:4])[0] in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC) else '>'
+    magic, _, _, _, _, _, network = struct.unpack_from(endian + 'IHHiIII', header, 0)
+    resolution = 1000000000 if magic == PCAP_MAGIC_NSEC else 1000000
+    # The upper 4 bits of the link type field carry FCS information
+    return struct.Struct(endian + 'IIII'), resolution, network & 0x0FFFFFFF
+
+
+def Get_Section_Endian(byte_order_magic: bytes, where: str) -> str:
+    if struct.unpack('<I', byte_order_magic)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+        return '<'
+    if struct.unpack('>I', byte_order_magic)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+        return '>'
+    raise ValueError(f"Bad byte-order magic in Section Header Block {where}")
+
+
+def Is_Stream(pcap_path: str) -> bool:
+    """
+    Check whether a capture path is a live stream (stdin or a FIFO) rather than a file.
+
+    Args:
+        pcap_path: Capture path, '-' for standard input
+
+    Returns:
+        True if the capture has to be read as it arrives
+    """
+    if pcap_path == STDIN:
+        return True
+    try:
+        return stat.S_ISFIFO(os.stat(pcap_path).st_mode)
+    except OSError:
+        return False
+
+
+def Get_Source_Name(pcap_path: str) -> str:
+    # Name of a capture in folder names and messages
+    return 'stdin' if pcap_path == STDIN else os.path.basename(pcap_path).split('.')[0]
+
+
+def Get_Compression(pcap_path: str) -> Optional[Callable[[], Any]]:
+    """
+    Recognize a gzip, xz or bz2 compressed capture file by its magic bytes.
+
+    Args:
+        pcap_path: Path to the capture file
+
+    Returns:
+        Function creating a decompressor object for the file's format, None if the file is not compressed
+    """
+    with open(pcap_path, 'rb') as file:
+        magic = file.read(6)
+    for compression_magic, new_decompressor in COMPRESSIONS.items():
+        if magic.startswith(compression_magic):
+            return new_decompressor
+    return None
+
+
+def Open_Reader(pcap_path: str) -> Union[Pcap_Reader, Stream_Reader]:
+    # Plain files are memory-mapped, streams and compressed files are read as they arrive
+    if Is_Stream(pcap_path):
+        return Stream_Reader(pcap_path)
+    if not os.path.exists(pcap_path):
+        raise FileNotFoundError(f"PCAP file not found: {pcap_path}")
+    new_decompressor = Get_Compression(pcap_path)
+    if new_decompressor is not None:
+        return Stream_Reader(pcap_path, Decompressor(pcap_path, new_decompressor))
+    return Pcap_Reader(pcap_path)
+
+
+def Read_Records(pcap_path: str) -> Iterator[Record]:
+    """
+    Lazily iterate over the records of a PCAP or PCAPNG file, or of a live capture stream.
+
+    Args:
+        pcap_path: Path to the capture file or FIFO, '-' for standard input. Files may be
+            gzip, xz or bz2 compressed
+
+    Yields:
+        Record tuples of (timestamp, wire_length, data, link_type)
+
+    Raises:
+        FileNotFoundError: If the capture file doesn't exist
+        ValueError: If the file is not a valid PCAP/PCAPNG capture
+    """
+    with Open_Reader(pcap_path) as reader:
+        yield from reader
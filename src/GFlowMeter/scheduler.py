@@ -0,0 +1,197 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from tqdm import tqdm
+from .logger import get_logger
+from .manifest import Manifest
+from .metrics import get_metrics
+from .reader import Get_Source_Name
+from .utils import (Get_Windows, Ignore_Interrupts, Materialize, Record_Split, Remove_Incomplete_Samples, build_split,
+                    write_split)
+from .writers import CSV_Writer, Dataset_Writer, Write_Error
+
+logger = get_logger()
+
+'''
+Multi-PCAP scheduler.
+The time windows of all PCAP files go to one shared process pool, largest file first, so a big
+file dispatched last does not leave the other workers idle while its windows are built.
+Finished windows wait in the buffer of their file and are written file after file in path order,
+their samples numbered then, so indices are contiguous and the same as in a single-process run.
+'''
+
+
+class Pcap_Job():
+    def __init__(self, pcap: str, save_folder: str) -> None:
+        self.pcap = pcap
+        self.sub_save_folder = os.path.join(save_folder, Get_Source_Name(pcap))
+        self.start_index: Optional[int] = None  # Known once the files before it are written
+        self.next_index = 0
+        self.num_splits = 0
+        self.splits_done = 0                # Completed by an interrupted run, skipped
+        self.done = False                   # Finished by an interrupted run, not dispatched
+        self.started = 0.0
+        self.windows: Deque[Tuple[int, Future]] = deque()  # Submitted windows not yet written, in split order
+        self.dispatched = False             # All its windows are submitted
+
+    @property
+    def num_samples(self) -> int:
+        return self.next_index - self.start_index if self.start_index is not None else 0
+
+
+def Schedule_Pcaps(
+    pcap_files: List[str],
+    config: Dict[str, Any],
+    writer: Optional[Dataset_Writer],
+    workers: int,
+    manifest: Optional[Manifest] = None
+) -> int:
+    """
+    Process many PCAP files on one shared pool of worker processes.
+
+    Files are dispatched largest first, at most 2 x workers windows running at a time. Finished windows
+    are buffered per file and written in path order. A failing file or window is logged and skipped, a
+    failed write stops the run (Write_Error).
+
+    Args:
+        pcap_files: PCAP files to process, in the order their samples are numbered
+        config: Configuration dictionary
+        writer: Output backend shared by all PCAP files, None writes per-sample CSV files in place
+        workers: Number of worker processes
+        manifest: Run manifest, finished files are skipped and partial ones resume after their last completed split
+
+    Returns:
+        Total number of samples generated
+    """
+    if writer is None:
+        writer = CSV_Writer(config['save_folder'], per_pcap=True)
+    jobs = [Pcap_Job(pcap, config['save_folder']) for pcap in pcap_files]
+    logger.debug(f"Scheduling {len(jobs)} PCAP files on {workers} workers")
+    if manifest is not None:
+        for job in jobs:
+            entry = manifest.Get_Entry(job.pcap)
+            # Only the sample indices of a finished file are needed, to number the files after it
+            job.done = job.dispatched = entry['status'] == 'done'
+            job.splits_done = entry['splits_done']
+
+    running: Set[Future] = set()
+    # File sizes say little about the number of windows, so the bar counts them without a total
+    progress = tqdm(desc='\033[97mProcess PCAPs\033[0m', colour='green', unit=' windows')
+    files_done = 0
+    next_index = 0                          # First sample index of the next file
+    head = 0                                # First file in path order that is not completely written
+
+    def collect(block: bool) -> None:
+        # Write the buffered windows in path order as far as they are finished, or all of them when blocking
+        nonlocal files_done, next_index, head
+        while head < len(jobs):
+            job = jobs[head]
+            if job.windows and (block or job.windows[0][1].done()):
+                if job.start_index is None:
+                    Start_Job(job, next_index, manifest, writer)
+                Write_Window(job, *job.windows.popleft(), writer, manifest)
+                progress.update(1)
+                continue
+            if job.windows or not job.dispatched:
+                return
+            if job.start_index is None:
+                Start_Job(job, next_index, manifest, writer)
+            next_index = job.next_index
+            files_done += 1
+            head += 1
+            progress.set_postfix_str(f'{files_done}/{len(jobs)} files')
+            if job.done:
+                continue
+            Finish_Job(job)
+            if manifest is not None:
+                writer.Then(lambda job=job: manifest.Complete_Pcap(job.pcap, job.next_index))
+            writer.Then(lambda: get_metrics().Export(config.get('metrics_summary'), config.get('metrics_textfile')))
+
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=Ignore_Interrupts) as executor:
+            # Stable sort, files of the same size keep their path order
+            for job in sorted(jobs, key=lambda job: os.path.getsize(job.pcap), reverse=True):
+                if job.done:
+                    continue
+                logger.debug(f"Dispatching {os.path.basename(job.pcap)}")
+                job.started = time.perf_counter()
+                try:
+                    for split_number, records in Get_Windows(job.pcap, config, executor, workers):
+                        job.num_splits += 1
+                        if split_number <= job.splits_done:
+                            continue
+                        future = executor.submit(
+                            build_split, job.pcap, split_number, Materialize(records), job.sub_save_folder, config)
+                        job.windows.append((split_number, future))
+                        running.add(future)
+                        while len(running) >= 2 * workers:
+                            _, running = wait(running, return_when=FIRST_COMPLETED)
+                            collect(block=False)
+                except Write_Error:
+                    raise
+                except Exception as e:
+                    logger.error(f"Error splitting PCAP file {job.pcap}: {e}", exc_info=True)
+                job.dispatched = True
+                collect(block=False)
+            collect(block=True)
+    finally:
+        progress.close()
+
+    total_samples = sum(job.num_samples for job in jobs if not job.done)
+    print(f"\n📦 Processed \033[94m{len(jobs)}\033[0m PCAP files, "
+          f"\033[94m{sum(job.num_splits for job in jobs)}\033[0m time windows, "
+          f"\033[94m{total_samples}\033[0m samples")
+    return next_index
+
+
+def Start_Job(job: Pcap_Job, start_index: int, manifest: Optional[Manifest], writer: Dataset_Writer) -> None:
+    """
+    Give a job its first sample index, once every file before it is written.
+
+    Args:
+        job: Job whose first window is being written, or that ended without one
+        start_index: Sample index after the samples of the files before it
+        manifest: Run manifest, a partial file continues after the samples its completed splits wrote
+        writer: Output backend shared by all PCAP files
+    """
+    job.start_index = job.next_index = start_index
+    if manifest is None:
+        return
+    if job.done:
+        job.next_index = manifest.Get_Entry(job.pcap)['next_index']
+        return
+    entry = manifest.Start_Pcap(job.pcap, start_index)
+    job.next_index = entry['next_index']
+    if writer.output_format == 'csv':
+        Remove_Incomplete_Samples(job.sub_save_folder, job.next_index)
+    if entry['splits_done']:
+        logger.debug(f"Resuming {os.path.basename(job.pcap)} after split_{entry['splits_done']}")
+
+
+def Write_Window(
+    job: Pcap_Job,
+    split_number: int,
+    future: Future,
+    writer: Dataset_Writer,
+    manifest: Optional[Manifest]
+) -> None:
+    # Samples of the window get the next indices of its file, a failed window is logged and counts as written
+    try:
+        dataset, split_save_folder, split_metrics = future.result()
+        get_metrics().Merge(split_metrics)
+        job.next_index += write_split(dataset, split_save_folder, job.next_index, writer)
+    except Write_Error:
+        raise
+    except Exception as e:
+        logger.error(f"Error processing split split_{split_number} of {job.pcap}: {e}", exc_info=True)
+    if manifest is not None:
+        Record_Split(manifest, writer, job.pcap, split_number, job.next_index)
+
+
+def Finish_Job(job: Pcap_Job) -> None:
+    logger.debug(f"Split '{os.path.basename(job.pcap)}' into {job.num_splits} time windows, "
+                 f"{job.num_samples} samples (indices {job.start_index}..{job.next_index - 1})")
+    # Jobs overlap on the shared pool, so this is the time from dispatch to the last window handed to the writer
+    get_metrics().Observe('pcap_duration_seconds', time.perf_counter() - job.started)
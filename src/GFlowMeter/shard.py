@@ -0,0 +1,338 @@
+import multiprocessing
+import os
+import queue
+import signal
+import struct
+import time
+from multiprocessing import shared_memory
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional
+import numpy as np
+from .dissect import Get_Network_Layer, Get_Transport_Layer
+from .flowkey import SAMPLED_PROTOCOLS
+from .flowtable import Flow_Table
+from .logger import get_logger
+from .metrics import Metrics, Metrics_Scope, get_metrics
+from .reader import Read_Records, Record
+from .writers import Concat_Datasets, Split_Dataset
+
+logger = get_logger()
+
+'''
+Flow-sharded assembly of one capture in several processes.
+The reading process hashes the address and port bytes of every packet without building its key, and
+sends the packets of the sampled protocols to one of N assembler processes, chosen by a hash that is the
+same for both directions of a session, through shared-memory rings. Every assembler keys the packets of
+its hash slice and owns their flows in its own Flow_Table. Every EPOCH_PACKETS packets all assemblers
+return the flows finished so far, and the reading process numbers them in order of first appearance
+over the whole capture, like one Flow_Table reading the capture alone would.
+'''
+
+# Packets of the sampled protocols between two batches of finished flows
+EPOCH_PACKETS = 1 << 18
+
+# Shared memory of one ring, the reading process blocks when an assembler is RING_SLOTS slots behind
+RING_SLOTS = 8
+SLOT_BYTES = 1 << 20
+
+# Slot: used bytes, then a segment of the stream of messages. A message may span several slots
+SLOT_HEADER = struct.Struct('<I')
+# Message: kind, link type, sequence number, timestamp, clock, wire length, frame length, then the frame bytes
+MESSAGE_HEADER = struct.Struct('<BHQddII')
+PACKET, EPOCH, END = 0, 1, 2
+
+
+class Shard_Result(NamedTuple):
+    shard: int
+    epoch: int
+    created: np.ndarray                     # int64, sequence number of the first packet of every new flow
+    dataset: Split_Dataset                  # Flows finished in the epoch, sample indices local to the shard
+    metrics: Optional[Metrics]              # Recorded by the assembler, sent with its last epoch
+
+
+class Packet_Ring():
+    # Single-producer single-consumer ring of fixed-size slots in shared memory. The semaphores count
+    # the filled and free slots, so neither side polls, and order the slot contents between the processes
+    def __init__(self, context: Any, slots: int = RING_SLOTS, slot_bytes: int = SLOT_BYTES) -> None:
+        self.memory = shared_memory.SharedMemory(create=True, size=slots * slot_bytes)
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.capacity = slot_bytes - SLOT_HEADER.size
+        self.filled = context.Semaphore(0)
+        self.free = context.Semaphore(slots)
+        self.position = 0                   # Next slot, each side counts its own
+        self.pending = bytearray()          # Producer: messages not yet in a slot
+        self.process: Optional[multiprocessing.Process] = None
+
+    def Put(self, kind: int, link_type: int = 0, sequence: int = 0, timestamp: float = 0.0, clock: float = 0.0,
+            wire_length: int = 0, frame: bytes = b'') -> None:
+        pending = self.pending
+        pending += MESSAGE_HEADER.pack(kind, link_type, sequence, timestamp, clock, wire_length, len(frame))
+        pending += frame
+        if len(pending) >= self.capacity:
+            self.Send()
+
+    def Send(self, flush: bool = False) -> None:
+        # Whole slots only, unless flush sends the rest too
+        pending = self.pending
+        while len(pending) >= self.capacity or (flush and pending):
+            # An assembler that died would never free a slot
+            while not self.free.acquire(timeout=1):
+                if self.process is not None and not self.process.is_alive():
+                    raise RuntimeError(f"Flow assembler {self.process.name} exited with code {self.process.exitcode}")
+            size = min(len(pending), self.capacity)
+            offset = self.position * self.slot_bytes
+            SLOT_HEADER.pack_into(self.memory.buf, offset, size)
+            with memoryview(pending) as view:
+                self.memory.buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + size] = view[:size]
+            del pending[:size]
+            self.filled.release()
+            self.position = (self.position + 1) % self.slots
+
+    def Get(self) -> bytes:
+        self.filled.acquire()
+        offset = self.position * self.slot_bytes
+        size = SLOT_HEADER.unpack_from(self.memory.buf, offset)[0]
+        data = bytes(self.memory.buf[offset + SLOT_HEADER.size:offset + SLOT_HEADER.size + size])
+        self.free.release()
+        self.position = (self.position + 1) % self.slots
+        return data
+
+    def close(self) -> None:
+        self.memory.close()
+        self.memory.unlink()
+
+
+def Get_Shard(frame: bytes, link_type: int, shards: int) -> int:
+    """
+    Pick the assembler of a packet from its raw address and port bytes, the same one for both directions of
+    a session.
+
+    Args:
+        frame: Captured frame bytes
+        link_type: PCAP link type of the frame
+        shards: Number of assemblers
+
+    Returns:
+        Assembler number in [0, shards), -1 for packets a Flow_Table does not sample
+    """
+    offset, version = Get_Network_Layer(frame, link_type)
+    if version == 0:
+        return -1
+    protocol, transport_offset = Get_Transport_Layer(frame, offset, version)
+    # Get_Endpoints keys these packets by their ports, every other packet is left out of the samples
+    if protocol not in SAMPLED_PROTOCOLS or transport_offset == -1 or len(frame) < transport_offset + 4:
+        return -1
+    # XOR is symmetric in the two endpoints, and the hash of a tuple of ints does not change between runs
+    if version == 4:
+        addresses = int.from_bytes(frame[offset + 12:offset + 16], 'big') ^ \
+            int.from_bytes(frame[offset + 16:offset + 20], 'big')
+    else:
+        addresses = int.from_bytes(frame[offset + 8:offset + 24], 'big') ^ \
+            int.from_bytes(frame[offset + 24:offset + 40], 'big')
+    ports = ((frame[transport_offset] ^ frame[transport_offset + 2]) << 8) | \
+        (frame[transport_offset + 1] ^ frame[transport_offset + 3])
+    return hash((protocol, addresses, ports)) % shards
+
+
+def Assemble_Shard(
+    shard: int,
+    ring: Packet_Ring,
+    results: Any,
+    pcap_path: str,
+    config: Dict[str, Any]
+) -> None:
+    """
+    Assemble the flows of one hash slice, in an assembler process.
+
+    Args:
+        shard: Assembler number
+        ring: Ring the reading process sends the packets of the slice through
+        results: Queue the finished flows of every epoch are put on, as Shard_Result
+        pcap_path: Source PCAP file
+        config: Configuration dictionary
+    """
+    from . import gflow
+
+    # Ctrl+C reaches the whole process group, only the reading process handles it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    try:
+        with Metrics_Scope() as metrics:
+            tic = time.perf_counter()
+            tool = gflow.GFlow_Meter(pcap_path, None, config['sample_type'], config['target_sample_length'],
+                                     config['dataset_type'], config['padding_per_packet'], show_progress=False,
+                                     idle_timeout=config.get('idle_timeout'),
+                                     active_timeout=config.get('active_timeout'))
+            tool.feature_seconds = 0.0      # Added to by Get_Dataset
+            capture = Flow_Table(tool.sample_type, tool.target_sample_length, tool.padding_per_packet, 0,
+                                 tool.idle_timeout, tool.active_timeout, tool.Check_For_Tabular(),
+                                 tool.Check_For_Statistical())
+            created: List[int] = []
+            epoch = 0
+            buffer, offset = b'', 0
+            while True:
+                buffer = buffer[offset:] + ring.Get()
+                offset = 0
+                while offset + MESSAGE_HEADER.size <= len(buffer):
+                    kind, link_type, sequence, timestamp, clock, wire_length, length = \
+                        MESSAGE_HEADER.unpack_from(buffer, offset)
+                    end = offset + MESSAGE_HEADER.size + length
+                    if end > len(buffer):
+                        break
+                    # The clock of the whole capture, so flows expire when they would in a single table
+                    capture.Advance(clock)
+                    if kind == PACKET:
+                        next_index = capture.next_index
+                        capture.Add(Record(timestamp, wire_length, buffer[end - length:end], link_type))
+                        if capture.next_index != next_index:
+                            created.append(sequence)
+                        offset = end
+                        continue
+                    if kind == END:
+                        capture.Flush()
+                    dataset = tool.Get_Dataset(capture, capture.Pop_Expired())
+                    if kind == END:
+                        metrics.Observe('stage_duration_seconds', time.perf_counter() - tic - tool.feature_seconds,
+                                        stage='capture')
+                    results.put(Shard_Result(shard, epoch, np.array(created, dtype=np.int64), dataset,
+                                             metrics if kind == END else None))
+                    if kind == END:
+                        return
+                    created = []
+                    epoch += 1
+                    offset = end
+    except Exception as e:
+        logger.error(f"Error assembling flows of shard {shard} of {pcap_path}: {e}", exc_info=True)
+        raise
+
+
+def Shard_Flows(pcap_path: str, config: Dict[str, Any], shards: int) -> Iterator[Split_Dataset]:
+    """
+    Assemble the flows of a whole PCAP file in several processes, split by a symmetric hash of their keys.
+
+    Args:
+        pcap_path: Path to the PCAP file
+        config: Configuration dictionary, with idle_timeout and / or active_timeout set
+        shards: Number of assembler processes
+
+    Yields:
+        Datasets of the flows finished in every epoch, ordered by sample index. Sample indices start at 0
+        for the file and are the ones a single Flow_Table gives the flows
+
+    Raises:
+        RuntimeError: If an assembler process fails
+    """
+    metrics = get_metrics()
+    pcap_name = os.path.basename(pcap_path)
+    # Time spent by the consumer of a yielded dataset is not counted
+    tic = time.perf_counter()
+    elapsed = 0.0
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    rings: List[Packet_Ring] = []
+    processes: List[multiprocessing.Process] = []
+    # Sample index of every local sample index of every shard, buffers grow by doubling
+    sample_indices = [np.empty(1024, dtype=np.int64) for _ in range(shards)]
+    num_flows = [0] * shards
+    next_index = 0
+    replies: Dict[int, List[Shard_Result]] = {}
+    merged = 0                              # Epochs yielded so far
+
+    def collect() -> Optional[Split_Dataset]:
+        # Finished flows of the next epoch, once every shard has returned them
+        nonlocal next_index, merged
+        while len(replies.get(merged, ())) < shards:
+            try:
+                reply = results.get(timeout=1)
+            except queue.Empty:
+                for process in processes:
+                    if not process.is_alive() and process.exitcode != 0:
+                        raise RuntimeError(f"Flow assembler {process.name} exited with code {process.exitcode}")
+                continue
+            replies.setdefault(reply.epoch, []).append(reply)
+        epoch_replies = sorted(replies.pop(merged), key=lambda reply: reply.shard)
+        merged += 1
+
+        # Flows are numbered by the packet that opened them, as they would be in a single table
+        sequences = np.concatenate([reply.created for reply in epoch_replies])
+        owners = np.repeat(np.arange(shards), [len(reply.created) for reply in epoch_replies])
+        numbers = np.empty(len(sequences), dtype=np.int64)
+        numbers[np.argsort(sequences, kind='stable')] = np.arange(next_index, next_index + len(sequences))
+        next_index += len(sequences)
+        datasets = []
+        for reply in epoch_replies:
+            shard = reply.shard
+            new = numbers[owners == shard]
+            if num_flows[shard] + len(new) > len(sample_indices[shard]):
+                grown = np.empty(2 * (num_flows[shard] + len(new)), dtype=np.int64)
+                grown[:num_flows[shard]] = sample_indices[shard][:num_flows[shard]]
+                sample_indices[shard] = grown
+            sample_indices[shard][num_flows[shard]:num_flows[shard] + len(new)] = new
+            num_flows[shard] += len(new)
+            if reply.metrics is not None:
+                metrics.Merge(reply.metrics)
+            if reply.dataset.num_samples:
+                datasets.append(reply.dataset._replace(
+                    sample_indices=sample_indices[shard][reply.dataset.sample_indices]))
+        if not datasets:
+            return None
+        dataset = Concat_Datasets(datasets)
+        return dataset.Take(np.argsort(dataset.sample_indices, kind='stable'))
+
+    def drain(epochs: int) -> Iterator[Split_Dataset]:
+        nonlocal tic, elapsed
+        while merged < epochs:
+            dataset = collect()
+            if dataset is not None:
+                elapsed += time.perf_counter() - tic
+                yield dataset
+                tic = time.perf_counter()
+
+    try:
+        for shard in range(shards):
+            ring = Packet_Ring(context)
+            rings.append(ring)
+            ring.process = context.Process(target=Assemble_Shard, args=(shard, ring, results, pcap_path, config),
+                                           name=f'shard-{shard}', daemon=True)
+            processes.append(ring.process)
+            ring.process.start()
+
+        packets, sequence, epochs = 0, 0, 0
+        clock = float('-inf')
+        for record in Read_Records(pcap_path):
+            packets += 1
+            frame, link_type = record.data, record.link_type
+            shard = Get_Shard(frame, link_type, shards)
+            if shard == -1:
+                continue
+            # Only the packets a Flow_Table keys move its clock
+            if record.timestamp > clock:
+                clock = record.timestamp
+            rings[shard].Put(PACKET, link_type, sequence, record.timestamp, clock, record.wire_length, frame)
+            sequence += 1
+            if sequence % EPOCH_PACKETS == 0:
+                for ring in rings:
+                    ring.Put(EPOCH, clock=clock)
+                    ring.Send(flush=True)
+                epochs += 1
+                # Assemblers run at most one epoch ahead of the merge
+                yield from drain(epochs - 1)
+        for ring in rings:
+            ring.Put(END, clock=clock)
+            ring.Send(flush=True)
+        epochs += 1
+        yield from drain(epochs)
+        for process in processes:
+            process.join()
+
+        logger.debug(f"Organized {packets} packets into {next_index} flows in {shards} shards")
+        metrics.Increment('packets_read_total', packets, pcap=pcap_name)
+        metrics.Increment('flows_built_total', next_index, pcap=pcap_name)
+        metrics.Observe('split_duration_seconds', elapsed + time.perf_counter() - tic, pcap=pcap_name)
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        for ring in rings:
+            ring.close()
+        results.close()
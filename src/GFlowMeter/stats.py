@@ -0,0 +1,237 @@
+import itertools
+from operator import attrgetter
+from typing import Dict, List, NamedTuple, Sequence
+import numpy as np
+
+'''
+Streaming statistical feature engine.
+Every flow direction keeps O(1) running accumulators (count, sum, min, max, Welford mean / M2,
+first / last timestamp and inter-arrival moments) that are updated as packets arrive, so no
+packet has to be buffered. The "Flow" size features are the exact parallel merge of the
+Fwd and Bwd accumulators. Features are computed for all flows of a dataset at once, on columns
+gathered from their accumulators.
+'''
+
+FWD, BWD = 0, 1
+
+TEMPORAL_FEATURES = ('Duration', 'Bytes/s', 'Packets/s', 'IAT Total', 'IAT Min', 'IAT Max', 'IAT Avg',
+                     'IAT Variance')
+
+
+class Running_Moments():
+    __slots__ = ('count', 'total', 'minimum', 'maximum', 'mean', 'm2')
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.minimum = float('inf')
+        self.maximum = float('-inf')
+        self.mean = 0.0
+        self.m2 = 0.0                           # Sum of squared deviations from the mean
+
+    def Add(self, value: float) -> None:
+        # Welford's update
+        self.count += 1
+        self.total += value
+        if value < self.minimum:
+            self.minimum = value
+        if value > self.maximum:
+            self.maximum = value
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def Merge(self, other: 'Running_Moments') -> 'Running_Moments':
+        # Chan et al. parallel combination, the between-group term is the delta ** 2 part
+        merged = Running_Moments()
+        merged.count = self.count + other.count
+        if merged.count == 0:
+            return merged
+        merged.total = self.total + other.total
+        merged.minimum = min(self.minimum, other.minimum)
+        merged.maximum = max(self.maximum, other.maximum)
+        delta = other.mean - self.mean
+        merged.mean = self.mean + delta * other.count / merged.count
+        merged.m2 = self.m2 + other.m2 + delta * delta * self.count * other.count / merged.count
+        return merged
+
+    def Variance(self) -> float:
+        # Population variance, as np.var
+        return self.m2 / self.count if self.count else 0.0
+
+
+class Timeline():
+    __slots__ = ('first', 'last', 'iat')
+
+    def __init__(self) -> None:
+        self.first = float('inf')
+        self.last = float('-inf')
+        self.iat = Running_Moments()            # Inter-arrival times, in arrival order
+
+    def Add(self, timestamp: float) -> None:
+        # The gap is taken to the latest timestamp so far, so a packet that arrives out of order has a gap of 0
+        # instead of a negative one. first <= last once a packet was added
+        if self.first <= self.last:
+            self.iat.Add(max(0.0, timestamp - self.last))
+        if timestamp < self.first:
+            self.first = timestamp
+        if timestamp > self.last:
+            self.last = timestamp
+
+
+class Direction_Stats():
+    __slots__ = ('packet_bytes', 'payload_bytes', 'timeline')
+
+    def __init__(self) -> None:
+        self.packet_bytes = Running_Moments()
+        self.payload_bytes = Running_Moments()
+        self.timeline = Timeline()
+
+    def Add(self, timestamp: float, total_bytes: int, payload_bytes: int) -> None:
+        self.packet_bytes.Add(total_bytes)
+        self.payload_bytes.Add(payload_bytes)
+        self.timeline.Add(timestamp)
+
+
+class Flow_Stats():
+    __slots__ = ('fwd', 'bwd', 'timeline')
+
+    def __init__(self, bidirectional: bool) -> None:
+        self.fwd = Direction_Stats()
+        # Unidirectional flows only use fwd (reported as "Flow")
+        self.bwd = Direction_Stats() if bidirectional else None
+        # Both directions interleaved, inter-arrival times cannot be merged from the per-direction ones
+        self.timeline = Timeline() if bidirectional else None
+
+    def Add(self, direction: int, timestamp: float, total_bytes: int, payload_bytes: int) -> None:
+        if self.bwd is None or direction == FWD:
+            self.fwd.Add(timestamp, total_bytes, payload_bytes)
+        else:
+            self.bwd.Add(timestamp, total_bytes, payload_bytes)
+        if self.timeline is not None:
+            self.timeline.Add(timestamp)
+
+
+class Moment_Columns(NamedTuple):
+    # The fields of the Running_Moments of many flows, one array per field
+    count: np.ndarray
+    total: np.ndarray
+    minimum: np.ndarray
+    maximum: np.ndarray
+    mean: np.ndarray
+    m2: np.ndarray
+
+    @classmethod
+    def Gather(cls, flows: List[Flow_Stats], path: str) -> 'Moment_Columns':
+        # path: attribute path of the accumulators in a Flow_Stats, e.g. 'fwd.packet_bytes'
+        return cls(*Gather_Fields(flows, path, cls._fields))
+
+    def Merge(self, other: 'Moment_Columns') -> 'Moment_Columns':
+        # Running_Moments.Merge of every flow at once, the deltas are 0 where both are empty
+        count = self.count + other.count
+        denominator = np.maximum(count, 1)
+        delta = other.mean - self.mean
+        return Moment_Columns(count, self.total + other.total, np.minimum(self.minimum, other.minimum),
+                              np.maximum(self.maximum, other.maximum),
+                              self.mean + delta * other.count / denominator,
+                              self.m2 + other.m2 + delta * delta * self.count * other.count / denominator)
+
+    def Variance(self) -> np.ndarray:
+        return np.divide(self.m2, self.count, out=np.zeros(len(self.count)), where=self.count > 0)
+
+
+class Timeline_Columns(NamedTuple):
+    first: np.ndarray
+    last: np.ndarray
+    iat: Moment_Columns
+
+    @classmethod
+    def Gather(cls, flows: List[Flow_Stats], path: str) -> 'Timeline_Columns':
+        first, last = Gather_Fields(flows, path, ('first', 'last'))
+        return cls(first, last, Moment_Columns.Gather(flows, f'{path}.iat'))
+
+
+def Gather_Fields(flows: List[Flow_Stats], path: str, fields: Sequence[str]) -> np.ndarray:
+    # One float64 row per field of the accumulators at path, read without a Python-level loop over the flows
+    accumulators = map(attrgetter(path), flows)
+    values = itertools.chain.from_iterable(map(attrgetter(*fields), accumulators))
+    return np.fromiter(values, dtype=np.float64, count=len(flows) * len(fields)).reshape(-1, len(fields)).T
+
+
+def Get_Statistical_Matrix(flows: List[Flow_Stats], feature_names: List[str]) -> np.ndarray:
+    """
+    Compute the statistical features of a list of flows.
+
+    The accumulator fields of all flows are gathered into columns first, every feature is then
+    computed for all flows at once.
+
+    Args:
+        flows: Accumulators of every flow, one matrix row each
+        feature_names: Feature names, in the column order of the returned matrix
+
+    Returns:
+        float64 matrix of shape (len(flows), len(feature_names))
+    """
+    matrix = np.empty((len(flows), len(feature_names)), dtype=np.float64)
+    if not flows:
+        return matrix
+    features: Dict[str, np.ndarray] = {}
+    if flows[0].bwd is None:
+        Size_Features(Moment_Columns.Gather(flows, 'fwd.packet_bytes'),
+                      Moment_Columns.Gather(flows, 'fwd.payload_bytes'), 'Flow ', features)
+        Temporal_Features(Timeline_Columns.Gather(flows, 'fwd.timeline'), features['Flow Total Bytes'], 'Flow ',
+                          features)
+    else:
+        sizes = {}
+        for direction, description in (('fwd', 'Fwd '), ('bwd', 'Bwd ')):
+            sizes[direction] = (Moment_Columns.Gather(flows, f'{direction}.packet_bytes'),
+                                Moment_Columns.Gather(flows, f'{direction}.payload_bytes'))
+            Size_Features(*sizes[direction], description, features)
+            Temporal_Features(Timeline_Columns.Gather(flows, f'{direction}.timeline'),
+                              features[f'{description}Total Bytes'], description, features)
+        (fwd_packet, fwd_payload), (bwd_packet, bwd_payload) = sizes['fwd'], sizes['bwd']
+        Size_Features(fwd_packet.Merge(bwd_packet), fwd_payload.Merge(bwd_payload), 'Flow ', features)
+        Temporal_Features(Timeline_Columns.Gather(flows, 'timeline'), features['Flow Total Bytes'], 'Flow ',
+                          features)
+    for column, name in enumerate(feature_names):
+        matrix[:, column] = features[name]
+    return matrix
+
+
+def Size_Features(
+    packet_bytes: Moment_Columns,
+    payload_bytes: Moment_Columns,
+    description: str,
+    features: Dict[str, np.ndarray]
+) -> None:
+    features[f'{description}Total Packets'] = packet_bytes.count
+    features[f'{description}Total Bytes'] = packet_bytes.total
+    for moments, name in ((packet_bytes, 'Packet Bytes'), (payload_bytes, 'Payload Bytes')):
+        # A direction without packets has all-zero features
+        empty = moments.count == 0
+        features[f'{description}{name} Min'] = np.where(empty, 0.0, moments.minimum)
+        features[f'{description}{name} Max'] = np.where(empty, 0.0, moments.maximum)
+        features[f'{description}{name} Avg'] = moments.mean
+        features[f'{description}{name} Variance'] = moments.Variance()
+    features[f'{description}Header Bytes'] = packet_bytes.total - payload_bytes.total
+
+
+def Temporal_Features(
+    timeline: Timeline_Columns,
+    total_bytes: np.ndarray,
+    description: str,
+    features: Dict[str, np.ndarray]
+) -> None:
+    # Flows with a single packet, or all packets at the same time, have no temporal features
+    duration = timeline.last - timeline.first
+    iat = timeline.iat
+    valid = (iat.count > 0) & (duration > 0)
+    features[f'{description}Duration'] = np.where(valid, duration, 0.0)
+    features[f'{description}Bytes/s'] = np.divide(total_bytes, duration, out=np.zeros(len(duration)), where=valid)
+    features[f'{description}Packets/s'] = np.divide(iat.count + 1, duration, out=np.zeros(len(duration)),
+                                                    where=valid)
+    features[f'{description}IAT Total'] = np.where(valid, iat.total, 0.0)
+    features[f'{description}IAT Min'] = np.where(valid, iat.minimum, 0.0)
+    features[f'{description}IAT Max'] = np.where(valid, iat.maximum, 0.0)
+    features[f'{description}IAT Avg'] = np.where(valid, iat.mean, 0.0)
+    features[f'{description}IAT Variance'] = np.where(valid, iat.Variance(), 0.0)
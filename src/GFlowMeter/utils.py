@@ -1,12 +1,25 @@
 import os
-import subprocess
-import shutil
-from typing import Dict, List, Any
-from tqdm import tqdm
+import math
+import signal
+import time
+import itertools
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from typing import Deque, Dict, Iterable, Iterator, List, Any, Optional, Tuple, Union
+from .cache import Decoded_Window, Get_Cache_Settings, Load_Capture
 from .logger import get_logger
+from .manifest import Manifest
+from .metrics import Metrics, Metrics_Scope, get_metrics
+from .partition import Can_Partition, Get_Partition_Bytes, Partition_Windows
+from .reader import CAPTURE_EXTENSIONS, Get_Source_Name, Is_Stream, Read_Records, Record
+from .shard import Shard_Flows
+from .writers import Dataset_Writer, CSV_Writer, Split_Dataset, Write_Error
 
 logger = get_logger()
 
+# Seconds between metrics exports while a live capture is running
+METRICS_EXPORT_INTERVAL = 10.0
+
 
 def load_config(file_path: str) -> Dict[str, Any]:
     """
@@ -46,13 +59,13 @@ def load_config(file_path: str) -> Dict[str, Any]:
 
 def find_pcap_files(folder_path: str) -> List[str]:
     """
-    Find all PCAP files in a directory tree.
+    Find all PCAP / PCAPNG files in a directory tree, also gzip, xz or bz2 compressed ones.
     
     Args:
         folder_path: Path to the directory to search
         
     Returns:
-        List of paths to PCAP files
+        Sorted list of paths to PCAP files
         
     Raises:
         FileNotFoundError: If folder doesn't exist
@@ -68,11 +81,12 @@ def find_pcap_files(folder_path: str) -> List[str]:
         pcap_files = []
         for root, dirs, files in os.walk(folder_path):
             for file in files:
-                if file.endswith('.pcap') or file.endswith('.pcapng'):
+                if file.endswith(CAPTURE_EXTENSIONS):
                     pcap_files.append(os.path.join(root, file))
         
         logger.debug(f"Found {len(pcap_files)} PCAP files in {folder_path}")
-        return pcap_files
+        # Sorted, so sample numbering does not depend on the directory listing order
+        return sorted(pcap_files)
     except FileNotFoundError:
         logger.error(f"Directory not found: {folder_path}")
         raise
@@ -86,70 +100,62 @@ def find_pcap_files(folder_path: str) -> List[str]:
 
 
 
-def Split_Cap(capture_interval: int, pcap_path: str, save_folder: str) -> None:
+class Time_Window():
+    """
+    Stateful key that numbers consecutive capture_interval windows of a record stream.
+
+    Windows start at the first packet and cover (end - capture_interval, end]. A packet later than
+    the current window end opens the next non-empty window; out-of-order packets stay in the
+    current one. Windows are numbered from 1 without gaps.
+    """
+
+    def __init__(self, capture_interval: float) -> None:
+        if capture_interval <= 0:
+            raise ValueError(f"capture_interval must be positive, got {capture_interval}")
+        self.capture_interval = capture_interval
+        self.end = None
+        self.number = 0
+
+    def __call__(self, record: Record) -> int:
+        return self.Get_Number(record.timestamp)
+
+    def Get_Number(self, timestamp: float) -> int:
+        if self.end is None:
+            self.end = timestamp + self.capture_interval
+            self.number = 1
+        elif timestamp > self.end:
+            self.end += math.ceil((timestamp - self.end) / self.capture_interval) * self.capture_interval
+            if timestamp > self.end:
+                self.end += self.capture_interval
+            self.number += 1
+        return self.number
+
+
+def Split_Cap(capture_interval: float, pcap_path: str) -> Iterator[Tuple[int, Iterator[Record]]]:
     """
-    Split a PCAP file into smaller files based on time intervals.
+    Split a PCAP file into time windows while streaming it.
     
     Args:
         capture_interval: Time interval in seconds for splitting
         pcap_path: Path to the input PCAP file
-        save_folder: Directory where split files will be saved
+        
+    Yields:
+        Tuples of (window number, records of the window). Each window's records must be
+        consumed before moving to the next window.
         
     Raises:
-        FileNotFoundError: If PCAP file or editcap command not found
-        subprocess.CalledProcessError: If editcap command fails
-        OSError: If file operations fail
+        FileNotFoundError: If PCAP file not found
+        ValueError: If the file is not a valid capture or capture_interval is not positive
     """
     try:
-        if not os.path.exists(pcap_path):
+        if not os.path.exists(pcap_path) and not Is_Stream(pcap_path):
             raise FileNotFoundError(f"PCAP file not found: {pcap_path}")
         
-        if not os.path.exists(save_folder):
-            os.makedirs(save_folder)
-            logger.debug(f"Created save folder: {save_folder}")
-        
         logger.debug(f"Splitting PCAP file {pcap_path} with interval {capture_interval}s")
-        
-        # Split The Pcap File Into Smaller Parts
-        output_path = os.path.join(save_folder, 'Split.pcap')
-        result = subprocess.run(
-            ["editcap", "-i", str(capture_interval), pcap_path, output_path],
-            capture_output=True,
-            text=True,
-            check=True
-        )
-        
-        # Rename the split files based on a naming convention
-        split_files = os.listdir(save_folder)
-        pcap_files = [f for f in split_files if f.endswith(('.pcap', '.pcapng'))]
-        
-        for i, file_name in enumerate(pcap_files, 1):
-            try:
-                file_base, file_extension = os.path.splitext(file_name)
-                new_name = f"split_{i}{file_extension}"
-                old_path = os.path.join(save_folder, file_name)
-                new_path = os.path.join(save_folder, new_name)
-                os.rename(old_path, new_path)
-                logger.debug(f"Renamed {file_name} to {new_name}")
-            except OSError as e:
-                logger.warning(f"Failed to rename {file_name}: {e}")
-                continue
-        
-        logger.debug(f"Successfully split PCAP file into {len(pcap_files)} parts")
+        yield from itertools.groupby(Read_Records(pcap_path), key=Time_Window(capture_interval))
         
     except FileNotFoundError as e:
-        if 'editcap' in str(e) or not os.path.exists(pcap_path):
-            logger.error(f"File or command not found: {e}")
-        else:
-            logger.error(f"File not found: {e}")
-        raise
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error executing editcap command: {e}")
-        logger.error(f"Command output: {e.stdout}")
-        logger.error(f"Command error: {e.stderr}")
-        raise
-    except OSError as e:
-        logger.error(f"OS error during PCAP splitting: {e}", exc_info=True)
+        logger.error(f"File not found: {e}")
         raise
     except Exception as e:
         logger.error(f"Unexpected error splitting PCAP file: {e}", exc_info=True)
@@ -158,111 +164,91 @@ def Split_Cap(capture_interval: int, pcap_path: str, save_folder: str) -> None:
 
 
 
-def ReOrganize_Files(main_folder_path: str) -> None:
+def Get_Windows(
+    pcap_path: str,
+    config: Dict[str, Any],
+    executor: Optional[Executor] = None,
+    workers: int = 1
+) -> Iterator[Tuple[int, Union[Iterator[Record], Decoded_Window, None]]]:
     """
-    Reorganize files from split folders into Statistical and Tabular folders.
+    Split a PCAP file the way the configuration asks for.
     
     Args:
-        main_folder_path: Path to the main folder containing split folders
-        
-    Raises:
-        FileNotFoundError: If main folder doesn't exist
-        OSError: If file operations fail
+        pcap_path: Path to the input PCAP file
+        config: Configuration dictionary
+        executor: Worker pool of the caller, used to decode byte ranges of the file when partition_mb is set
+        workers: Number of worker processes of the executor
+        
+    Yields:
+        Tuples of (window number, records of the window). With flow timeouts (idle_timeout /
+        active_timeout) the whole file is a single window whose records are None, i.e. read
+        by GFlow_Meter itself, and capture_interval is not used. With cache_folder set, windows
+        are Decoded_Window objects from the decoded-packet cache instead of records, and so they
+        are when the file is decoded by byte ranges in the executor.
     """
-    try:
-        if not os.path.exists(main_folder_path):
-            raise FileNotFoundError(f"Main folder not found: {main_folder_path}")
-        
-        logger.debug("Reorganizing files")
-        
-        # Define the names of the new folders
-        statistical_folder = os.path.join(main_folder_path, 'Statistical')
-        tabular_folder = os.path.join(main_folder_path, 'Tabular')
-        
-        # Create the new folders
-        os.makedirs(statistical_folder, exist_ok=True)
-        os.makedirs(tabular_folder, exist_ok=True)
-        logger.debug(f"Created Statistical and Tabular folders in {main_folder_path}")
+    timeouts = config.get('idle_timeout') is not None or config.get('active_timeout') is not None
+    cache = Get_Cache_Settings(config)
+    capture = None
+    if cache is not None and not Is_Stream(pcap_path):
+        try:
+            capture = Load_Capture(pcap_path, cache[0], None if timeouts else config['capture_interval'], cache[1])
+        except OSError as e:
+            logger.error(f"Decoded-packet cache unavailable for {pcap_path}, reading it directly: {e}")
+    
+    if capture is not None:
+        if timeouts:
+            yield 1, capture.Get_All()
+        else:
+            for split_number in range(1, len(capture) + 1):
+                yield split_number, capture.Get_Window(split_number)
+    elif timeouts:
+        yield 1, None
+    else:
+        partition_bytes = Get_Partition_Bytes(config)
+        if executor is not None and partition_bytes is not None and Can_Partition(pcap_path, partition_bytes):
+            yield from Partition_Windows(pcap_path, config['capture_interval'], partition_bytes, executor, 2 * workers)
+        else:
+            yield from Split_Cap(config['capture_interval'], pcap_path)
 
-        # Get a list of split folders
-        split_folders = [item for item in os.scandir(main_folder_path) 
-                        if item.name.startswith('split_') and item.is_dir()]
-        
-        if not split_folders:
-            logger.warning(f"No split folders found in {main_folder_path}")
-            return
 
-        logger.debug(f"Found {len(split_folders)} split folders to process")
+def Materialize(
+    records: Union[Iterable[Record], Decoded_Window, None]
+) -> Union[List[Record], Decoded_Window, None]:
+    # Windows are sent to worker processes as lists (decoded windows as they are), a whole file (None)
+    # is read by the worker
+    if records is None or isinstance(records, Decoded_Window):
+        return records
+    return list(records)
 
-        # Iterate through the sorted split folders with tqdm progress bar
-        for split_folder in tqdm(split_folders, desc="Processing subfolders", disable=len(split_folders) == 0):
-            split_folder_path = split_folder.path
-            logger.debug(f"Processing folder: {split_folder.name}")
-            
-            try:
-                if len(os.listdir(split_folder_path)) == 0:
-                    shutil.rmtree(split_folder_path)
-                    logger.debug(f"Removed empty folder: {split_folder_path}")
-                    continue
 
-                # Paths to the statistical and tabular data within the split folder
-                split_statistical_path = os.path.join(split_folder_path, 'Statistical')
-                split_tabular_path = os.path.join(split_folder_path, 'Tabular')
-
-                # Move Statistical files using os.scandir (no need to load all files into memory)
-                if os.path.exists(split_statistical_path):
-                    moved_count = 0
-                    with os.scandir(split_statistical_path) as it:
-                        for entry in it:
-                            if entry.is_file() and entry.name.endswith('.csv'):
-                                try:
-                                    src_path = entry.path
-                                    dest_path = os.path.join(statistical_folder, entry.name)
-                                    shutil.move(src_path, dest_path)
-                                    moved_count += 1
-                                except OSError as e:
-                                    logger.warning(f"Failed to move statistical file {entry.name}: {e}")
-                                    continue
-                    logger.debug(f"Moved {moved_count} statistical files from {split_folder.name}")
-
-                # Move Tabular files using os.scandir
-                if os.path.exists(split_tabular_path):
-                    moved_count = 0
-                    with os.scandir(split_tabular_path) as it:
-                        for entry in it:
-                            if entry.is_file() and entry.name.endswith('.csv'):
-                                try:
-                                    src_path = entry.path
-                                    dest_path = os.path.join(tabular_folder, entry.name)
-                                    shutil.move(src_path, dest_path)
-                                    moved_count += 1
-                                except OSError as e:
-                                    logger.warning(f"Failed to move tabular file {entry.name}: {e}")
-                                    continue
-                    logger.debug(f"Moved {moved_count} tabular files from {split_folder.name}")
-
-                # Delete the now empty split folder
-                try:
-                    shutil.rmtree(split_folder_path)
-                    logger.debug(f"Deleted split folder: {split_folder_path}")
-                except OSError as e:
-                    logger.warning(f"Failed to delete {split_folder_path}: {e}")
-                    
-            except Exception as e:
-                logger.error(f"Error processing split folder {split_folder_path}: {e}", exc_info=True)
-                continue
 
-        logger.debug("Files have been reorganized successfully")
-        
-    except FileNotFoundError as e:
-        logger.error(f"Folder not found: {e}")
-        raise
-    except OSError as e:
-        logger.error(f"OS error during file reorganization: {e}", exc_info=True)
-        raise
-    except Exception as e:
-        logger.error(f"Unexpected error reorganizing files: {e}", exc_info=True)
-        raise
+
+def Remove_Incomplete_Samples(main_folder_path: str, next_index: int) -> None:
+    """
+    Delete the per-sample CSV files an interrupted run wrote after its last completed split.
+    
+    Args:
+        main_folder_path: Output folder of one PCAP file, holding its Tabular and Statistical folders
+        next_index: First sample index that was not recorded as written, it and the ones after are removed
+    """
+    for dataset_folder in ('Tabular', 'Statistical'):
+        folder_path = os.path.join(main_folder_path, dataset_folder)
+        if not os.path.exists(folder_path):
+            continue
+        removed = 0
+        with os.scandir(folder_path) as it:
+            for entry in it:
+                # Partially written samples were never renamed into place
+                if entry.name.endswith('.tmp'):
+                    os.remove(entry.path)
+                    removed += 1
+                    continue
+                number = entry.name[len('Sample_'):-len('.csv')]
+                if entry.name.startswith('Sample_') and entry.name.endswith('.csv') and number.isdigit() \
+                        and int(number) >= next_index:
+                    os.remove(entry.path)
+                    removed += 1
+        logger.debug(f"Removed {removed} incomplete samples from {folder_path}")
 
 
 def load_config_with_fallback(config_name: str = 'config.yaml') -> Dict[str, Any]:
@@ -329,13 +315,13 @@ def validate_config(config: Dict[str, Any], required_keys: List[str]) -> None:
 
 def get_pcap_files_list(pcap_path: str) -> List[str]:
     """
-    Get list of PCAP files from a path (single file or directory).
+    Get list of PCAP files from a path (single file, directory or live capture).
     
     Args:
-        pcap_path: Path to a PCAP file or directory containing PCAP files
+        pcap_path: Path to a PCAP file, a directory containing PCAP files, a FIFO or '-' for stdin
         
     Returns:
-        List of PCAP file paths
+        List of PCAP file paths, the stream alone for a live capture
         
     Raises:
         SystemExit: If path doesn't exist or no files found
@@ -344,7 +330,10 @@ def get_pcap_files_list(pcap_path: str) -> List[str]:
     
     try:
         pcap_files = []
-        if os.path.isfile(pcap_path):
+        if Is_Stream(pcap_path):
+            pcap_files.append(pcap_path)
+            logger.debug(f"Processing live capture: {pcap_path}")
+        elif os.path.isfile(pcap_path):
             pcap_files.append(pcap_path)
             logger.debug(f"Processing single PCAP file: {pcap_path}")
         else:
@@ -361,22 +350,26 @@ def get_pcap_files_list(pcap_path: str) -> List[str]:
         sys.exit(1)
 
 
-def process_split_file(
-    file_path: str,
-    file_name: str,
+def process_split(
+    pcap: str,
+    split_number: int,
+    records: Optional[Iterable[Record]],
     sub_save_folder: str,
     config: Dict[str, Any],
-    start_index: int
+    start_index: int,
+    writer: Optional[Dataset_Writer] = None
 ) -> int:
     """
-    Process a single split PCAP file and generate dataset.
+    Process the packets of a single time window and generate its dataset.
     
     Args:
-        file_path: Full path to the split PCAP file
-        file_name: Name of the split file
+        pcap: Path to the source PCAP file
+        split_number: Number of the time window (1-based)
+        records: Records of the time window, None to read the whole PCAP file
         sub_save_folder: Folder where results will be saved
         config: Configuration dictionary
         start_index: Starting index for sample numbering
+        writer: Output backend shared by all splits, None for per-split CSV folders
         
     Returns:
         Number of samples generated
@@ -386,35 +379,279 @@ def process_split_file(
     """
     from . import gflow
     
-    logger.debug(f"Processing split file: {file_name}")
+    logger.debug(f"Processing split: split_{split_number}")
     
     tool = gflow.GFlow_Meter(
-        file_path,
+        pcap,
         sub_save_folder,
         config['sample_type'],
         config['target_sample_length'],
         config['dataset_type'],
-        config['padding_per_packet']
+        config['padding_per_packet'],
+        records=records,
+        split=split_number,
+        writer=writer,
+        idle_timeout=config.get('idle_timeout'),
+        active_timeout=config.get('active_timeout')
     )
     
     num_samples = tool.Generate_Dataset(start_index=start_index)
-    logger.debug(f"Generated {num_samples} samples from {file_name}")
-    
-    os.remove(file_path)
-    logger.debug(f"Removed processed file: {file_path}")
+    logger.debug(f"Generated {num_samples} samples from split_{split_number}")
     
     return num_samples
 
 
+def build_split(
+    pcap: str,
+    split_number: int,
+    records: Optional[List[Record]],
+    sub_save_folder: str,
+    config: Dict[str, Any]
+) -> Tuple[Split_Dataset, str, Metrics]:
+    """
+    Build the dataset of a single time window in a worker process, without writing it.
+    
+    Args:
+        pcap: Path to the source PCAP file
+        split_number: Number of the time window (1-based)
+        records: Records of the time window, None to read the whole PCAP file
+        sub_save_folder: Folder where results will be saved
+        config: Configuration dictionary
+        
+    Returns:
+        Tuple of (dataset with sample indices starting at 0, the split's CSV output folder,
+        metrics recorded while building it, to be merged by the parent process)
+    """
+    from . import gflow
+    
+    with Metrics_Scope() as metrics:
+        tool = gflow.GFlow_Meter(
+            pcap,
+            sub_save_folder,
+            config['sample_type'],
+            config['target_sample_length'],
+            config['dataset_type'],
+            config['padding_per_packet'],
+            records=records,
+            split=split_number,
+            show_progress=False,
+            idle_timeout=config.get('idle_timeout'),
+            active_timeout=config.get('active_timeout')
+        )
+        dataset = tool.Build_Dataset(start_index=0)
+    return dataset, tool.save_folder, metrics
+
+
+def write_split(
+    dataset: Split_Dataset,
+    save_folder: str,
+    start_index: int,
+    writer: Optional[Dataset_Writer] = None
+) -> int:
+    """
+    Number the samples of a dataset built by build_split and write them.
+    
+    Args:
+        dataset: Dataset returned by build_split
+        save_folder: The split's CSV output folder, used when no writer is given
+        start_index: Sample index of the first sample
+        writer: Output backend shared by all splits, None for per-split CSV folders
+        
+    Returns:
+        Number of samples written
+    """
+    if dataset.num_samples == 0:
+        logger.warning(f"No flows of the sampled protocols found in split_{dataset.split}")
+        return 0
+    dataset = dataset._replace(sample_indices=dataset.sample_indices + start_index)
+    (writer if writer is not None else CSV_Writer(save_folder)).Write(dataset)
+    return dataset.num_samples
+
+
+def Record_Split(manifest: Manifest, writer: Dataset_Writer, pcap: str, split_number: int, next_index: int) -> None:
+    # Recorded by the writer once the samples of the split are written, rows is read at that point
+    writer.Then(lambda: manifest.Complete_Split(pcap, split_number, next_index, writer.rows))
+
+
+def Ignore_Interrupts() -> None:
+    # Pool initializer: Ctrl+C reaches the whole process group, only the parent handles it and stops the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def get_workers(config: Dict[str, Any]) -> int:
+    """
+    Number of worker processes from the optional 'workers' config key.
+    
+    Args:
+        config: Configuration dictionary
+        
+    Returns:
+        Number of worker processes, 0 in the config means one per CPU
+        
+    Raises:
+        ValueError: If workers is not a non-negative integer
+    """
+    workers = config.get('workers', 1)
+    if isinstance(workers, bool) or not isinstance(workers, int) or workers < 0:
+        raise ValueError(f"Invalid workers: {workers}. Must be a non-negative integer")
+    return workers or os.cpu_count() or 1
+
+
+def process_splits_serial(
+    pcap: str,
+    sub_save_folder: str,
+    config: Dict[str, Any],
+    start_index: int,
+    writer: Dataset_Writer,
+    manifest: Optional[Manifest] = None
+) -> Tuple[int, int]:
+    """
+    Process the time windows of a PCAP file one after the other, as they are read.
+    
+    Args:
+        pcap: Path to the PCAP file
+        sub_save_folder: Folder where results will be saved
+        config: Configuration dictionary
+        start_index: Starting index for sample numbering (of the first split not yet completed)
+        writer: Output backend shared by all splits
+        manifest: Run manifest, splits it records as completed are skipped and new ones are recorded
+        
+    Returns:
+        Tuple of (next free sample index, number of time windows)
+    """
+    global_index = start_index
+    num_splits = 0
+    splits_done = manifest.Get_Entry(pcap)['splits_done'] if manifest is not None else 0
+    try:
+        for split_number, records in Get_Windows(pcap, config):
+            num_splits += 1
+            if split_number <= splits_done:
+                continue
+            try:
+                num_samples = process_split(
+                    pcap,
+                    split_number,
+                    records,
+                    sub_save_folder,
+                    config,
+                    global_index,
+                    writer
+                )
+                global_index += num_samples
+            except Write_Error:
+                raise
+            except Exception as e:
+                logger.error(f"Error processing split split_{split_number}: {e}", exc_info=True)
+            # A failed split is not retried on resume either, like in an uninterrupted run
+            if manifest is not None:
+                Record_Split(manifest, writer, pcap, split_number, global_index)
+    except Write_Error:
+        raise
+    except Exception as e:
+        logger.error(f"Error splitting PCAP file {pcap}: {e}", exc_info=True)
+    return global_index, num_splits
+
+
+def process_splits_parallel(
+    pcap: str,
+    sub_save_folder: str,
+    config: Dict[str, Any],
+    start_index: int,
+    writer: Dataset_Writer,
+    workers: int,
+    manifest: Optional[Manifest] = None
+) -> Tuple[int, int]:
+    """
+    Process the time windows of a PCAP file in a pool of worker processes.
+    
+    Windows are built in parallel and written in window order, so sample indices and
+    output are the same as with process_splits_serial. With flow timeouts the file is a single
+    window, whose flows are assembled by all the workers when shard_flows is set (see Shard_Flows).
+    
+    Args:
+        pcap: Path to the PCAP file
+        sub_save_folder: Folder where results will be saved
+        config: Configuration dictionary
+        start_index: Starting index for sample numbering
+        writer: Output backend shared by all splits
+        workers: Number of worker processes
+        manifest: Run manifest, splits it records as completed are skipped and new ones are recorded
+        
+    Returns:
+        Tuple of (next free sample index, number of time windows)
+    """
+    global_index = start_index
+    num_splits = 0
+    splits_done = manifest.Get_Entry(pcap)['splits_done'] if manifest is not None else 0
+    # Windows read ahead of the one being written, bounds the records held in memory
+    max_pending = 2 * workers
+    pending: Deque[Tuple[int, Future]] = deque()
+
+    def collect() -> None:
+        nonlocal global_index
+        split_number, future = pending.popleft()
+        try:
+            dataset, save_folder, split_metrics = future.result()
+            get_metrics().Merge(split_metrics)
+            global_index += write_split(dataset, save_folder, global_index, writer)
+            logger.debug(f"Generated {dataset.num_samples} samples from split_{split_number}")
+        except Write_Error:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing split split_{split_number}: {e}", exc_info=True)
+        if manifest is not None:
+            Record_Split(manifest, writer, pcap, split_number, global_index)
+
+    def process_flows_sharded(split_number: int) -> None:
+        # The whole file in one window, written batch by batch as the shards finish flows
+        nonlocal global_index
+        num_samples = 0
+        try:
+            for dataset in Shard_Flows(pcap, config, workers):
+                num_samples += write_split(dataset, sub_save_folder, global_index, writer)
+            logger.debug(f"Generated {num_samples} samples from split_{split_number} in {workers} shards")
+        except Write_Error:
+            raise
+        except Exception as e:
+            logger.error(f"Error processing split split_{split_number}: {e}", exc_info=True)
+        global_index += num_samples
+        if manifest is not None:
+            Record_Split(manifest, writer, pcap, split_number, global_index)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=Ignore_Interrupts) as executor:
+        try:
+            for split_number, records in Get_Windows(pcap, config, executor, workers):
+                num_splits += 1
+                if split_number <= splits_done:
+                    continue
+                if records is None and config.get('shard_flows'):
+                    process_flows_sharded(split_number)
+                    continue
+                logger.debug(f"Processing split: split_{split_number}")
+                pending.append((split_number, executor.submit(
+                    build_split, pcap, split_number, Materialize(records), sub_save_folder, config)))
+                while len(pending) >= max_pending:
+                    collect()
+        except Write_Error:
+            raise
+        except Exception as e:
+            logger.error(f"Error splitting PCAP file {pcap}: {e}", exc_info=True)
+        while pending:
+            collect()
+    return global_index, num_splits
+
+
 def process_pcap_file(
     pcap: str,
     pcap_idx: int,
     total_pcaps: int,
     config: Dict[str, Any],
-    start_index: int
+    start_index: int,
+    writer: Optional[Dataset_Writer] = None,
+    manifest: Optional[Manifest] = None
 ) -> int:
     """
-    Process a single PCAP file: split, process splits, and reorganize.
+    Process a single PCAP file: split into time windows and process the windows.
     
     Args:
         pcap: Path to the PCAP file
@@ -422,56 +659,111 @@ def process_pcap_file(
         total_pcaps: Total number of PCAP files to process
         config: Configuration dictionary
         start_index: Starting index for sample numbering
+        writer: Output backend shared by all PCAP files, None writes per-sample CSV files in place
+        manifest: Run manifest, a partially processed file resumes after its last completed split
         
     Returns:
         Number of samples generated from this PCAP file
     """
     logger.debug(f"Processing PCAP file {pcap_idx}/{total_pcaps}: {os.path.basename(pcap)}")
     
-    # Create save folder for this PCAP
-    sub_save_folder = os.path.join(config['save_folder'], os.path.basename(pcap).split('.')[0])
-    if not os.path.exists(sub_save_folder):
-        os.makedirs(sub_save_folder)
-        logger.debug(f"Created save folder: {sub_save_folder}")
+    # Per-sample CSVs go straight to the Tabular and Statistical folders of this PCAP
+    sub_save_folder = os.path.join(config['save_folder'], Get_Source_Name(pcap))
+    if writer is None:
+        writer = CSV_Writer(config['save_folder'], per_pcap=True)
     
-    # Split the PCAP file
-    try:
-        Split_Cap(config['capture_interval'], pcap, sub_save_folder)
-        logger.debug(f"Split PCAP file into sub-files")
-    except Exception as e:
-        logger.error(f"Error splitting PCAP file {pcap}: {e}", exc_info=True)
-        return 0
+    # Continue after the splits an interrupted run completed
+    resume_index = start_index
+    if manifest is not None:
+        entry = manifest.Start_Pcap(pcap, start_index)
+        resume_index = entry['next_index']
+        if writer.output_format == 'csv':
+            Remove_Incomplete_Samples(sub_save_folder, resume_index)
+        if entry['splits_done']:
+            logger.debug(f"Resuming {os.path.basename(pcap)} after split_{entry['splits_done']}")
     
-    # Get list of split files
-    split_files = [f for f in os.listdir(sub_save_folder)
-                   if f.endswith('.pcap') or f.endswith('.pcapng')]
+    # Process each time window as it is read
+    metrics = get_metrics()
+    workers = get_workers(config)
+    with metrics.Timer('pcap_duration_seconds'):
+        if workers > 1:
+            global_index, num_splits = process_splits_parallel(pcap, sub_save_folder, config, resume_index, writer,
+                                                               workers, manifest)
+        else:
+            global_index, num_splits = process_splits_serial(pcap, sub_save_folder, config, resume_index, writer,
+                                                             manifest)
     
-    # Print to console how many sub-pcaps were created
-    print(f"\n📦 Split '{os.path.basename(pcap)}' into \033[94m{len(split_files)}\033[0m sub-PCAP files")
+    # Print to console how many time windows were processed
+    if config.get('idle_timeout') is not None or config.get('active_timeout') is not None:
+        print(f"\n📦 Processed '{os.path.basename(pcap)}' with flow timeouts")
+    else:
+        print(f"\n📦 Split '{os.path.basename(pcap)}' into \033[94m{num_splits}\033[0m time windows")
     
-    # Process each split file
-    global_index = start_index
-    for file_name in split_files:
-        try:
-            file_path = os.path.join(sub_save_folder, file_name)
-            num_samples = process_split_file(
-                file_path,
-                file_name,
+    if manifest is not None:
+        writer.Then(lambda: manifest.Complete_Pcap(pcap, global_index))
+    return global_index - start_index
+
+
+def process_stream(
+    pcap: str,
+    config: Dict[str, Any],
+    writer: Optional[Dataset_Writer] = None
+) -> int:
+    """
+    Process a live capture as it arrives, writing samples as soon as their flows end.
+    
+    Flows end with their time window, or with idle_timeout / active_timeout when set, in which
+    case expired flows are written right after the packet that expired them. Memory is bounded
+    by the flows of one window, or by the flows still open within the timeouts.
+    
+    Args:
+        pcap: FIFO path, or '-' for standard input
+        config: Configuration dictionary
+        writer: Output backend, None for per-sample CSV files
+        
+    Returns:
+        Number of samples generated
+    """
+    from . import gflow
+    
+    name = Get_Source_Name(pcap)
+    sub_save_folder = os.path.join(config['save_folder'], name)
+    # Per-sample CSVs go straight to the final folders of the capture
+    if writer is None:
+        writer = CSV_Writer(sub_save_folder)
+    if get_workers(config) > 1:
+        logger.warning("Live captures are processed in a single process, workers is ignored")
+    timeouts = config.get('idle_timeout') is not None or config.get('active_timeout') is not None
+    
+    metrics = get_metrics()
+    exported = time.monotonic()
+    global_index = 0
+    print(f"📡 Reading live capture from {name}")
+    with metrics.Timer('pcap_duration_seconds'):
+        for split_number, records in Get_Windows(pcap, config):
+            tool = gflow.GFlow_Meter(
+                pcap,
                 sub_save_folder,
-                config,
-                global_index
+                config['sample_type'],
+                config['target_sample_length'],
+                config['dataset_type'],
+                config['padding_per_packet'],
+                records=records,
+                split=split_number,
+                writer=writer,
+                show_progress=False,
+                idle_timeout=config.get('idle_timeout'),
+                active_timeout=config.get('active_timeout')
             )
-            global_index += num_samples
-        except Exception as e:
-            logger.error(f"Error processing split file {file_name}: {e}", exc_info=True)
-            continue
-    
-    # Reorganize files
-    try:
-        ReOrganize_Files(sub_save_folder)
-        logger.debug(f"Reorganized files for {os.path.basename(pcap)}")
-    except Exception as e:
-        logger.error(f"Error reorganizing files for {pcap}: {e}", exc_info=True)
+            for dataset in tool.Iter_Datasets(global_index, 1 if timeouts else None):
+                if dataset.num_samples == 0:
+                    continue
+                writer.Write(dataset)
+                metrics.Observe('emit_latency_seconds', time.perf_counter() - tool.batch_closed)
+                global_index += dataset.num_samples
+                if time.monotonic() - exported >= METRICS_EXPORT_INTERVAL:
+                    metrics.Export(config.get('metrics_summary'), config.get('metrics_textfile'))
+                    exported = time.monotonic()
     
-    return global_index - start_index
-    
\ No newline at end of file
+    print(f"\n📦 Live capture '{name}' ended, \033[94m{global_index}\033[0m samples written")
+    return global_index
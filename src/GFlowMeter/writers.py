@@ -0,0 +1,702 @@
+import abc
+import io
+import json
+import os
+import queue
+import struct
+import tarfile
+import threading
+from typing import Any, BinaryIO, Callable, Dict, List, NamedTuple, Optional, TextIO, Tuple
+import numpy as np
+from .flowkey import Flow_Key, Protocol, Format_Address
+from .logger import get_logger
+from .metrics import get_metrics
+from .reader import Get_Source_Name
+
+logger = get_logger()
+
+'''
+Dataset output backends.
+csv:     one CSV file per sample in Tabular/ and Statistical/ (legacy layout), each renamed into place once written
+parquet: one Tabular.parquet and one Statistical.parquet per run, one row group per split
+npy:     one Tabular.npy (uint8) and one Statistical.npy (float64) per run, rows appended split by split,
+         with Index.csv mapping every row to its Sample_Index, PCAP, split and flow key
+tar:     WebDataset-style shards shard-000000.tar, shard-000001.tar, ... written sequentially, every sample as
+         Sample_<index>.tabular.bin, Sample_<index>.statistical.npy and Sample_<index>.json (its metadata)
+Background_Writer runs any of them on a writer thread, so the next split is built while the previous one is written.
+'''
+
+OUTPUT_FORMATS = ('csv', 'parquet', 'npy', 'tar')
+
+# Default shard limits of the tar format, a shard is closed when the next sample would exceed either
+SHARD_MAX_SAMPLES = 10000
+SHARD_MAX_MB = 1024
+
+TAR_BLOCK = 512
+
+# USTAR header: name, mode, uid, gid, size, mtime, checksum, type, link name, magic, version, user, group,
+# device major / minor, name prefix
+TAR_HEADER = struct.Struct('100s8s8s8s12s12s8sc100s6s2s32s32s8s8s155s12x')
+
+# Datasets and callbacks waiting for the writer thread of a Background_Writer. A full queue blocks the producer,
+# which bounds the splits held in memory
+WRITE_QUEUE = 4
+
+# Fixed .npy header size, so the shape can be rewritten in place as rows are appended
+NPY_HEADER_LENGTH = 128
+
+
+class Split_Dataset(NamedTuple):
+    pcap: str                               # Source PCAP file
+    split: int                              # Split (time window) number, 1-based
+    sample_indices: np.ndarray              # int64, one per sample
+    flow_keys: List[Flow_Key]               # Flow key of every sample, in sample order
+    tabular: Optional[np.ndarray]           # uint8 (samples, target_sample_length), None if not generated
+    statistical: Optional[np.ndarray]       # float64 (samples, features), None if not generated
+    feature_names: List[str]
+
+    @property
+    def num_samples(self) -> int:
+        return len(self.sample_indices)
+
+    def Slice(self, start: int, stop: int) -> 'Split_Dataset':
+        # Samples start..stop-1, the arrays are views of this dataset's arrays
+        return self._replace(
+            sample_indices=self.sample_indices[start:stop], flow_keys=self.flow_keys[start:stop],
+            tabular=self.tabular[start:stop] if self.tabular is not None else None,
+            statistical=self.statistical[start:stop] if self.statistical is not None else None)
+
+    def Take(self, rows: np.ndarray) -> 'Split_Dataset':
+        # Samples at the given rows, in that order
+        return self._replace(
+            sample_indices=self.sample_indices[rows], flow_keys=[self.flow_keys[row] for row in rows.tolist()],
+            tabular=self.tabular[rows] if self.tabular is not None else None,
+            statistical=self.statistical[rows] if self.statistical is not None else None)
+
+
+class Dataset_Writer(abc.ABC):
+    output_format = ''
+    rows = 0                                # Samples written so far
+
+    def Write(self, dataset: Split_Dataset) -> None:
+        if dataset.num_samples == 0:
+            return
+        metrics = get_metrics()
+        with metrics.Timer('stage_duration_seconds', stage='write'):
+            num_bytes = self.Write_Dataset(dataset)
+        self.rows += dataset.num_samples
+        metrics.Increment('samples_emitted_total', dataset.num_samples, pcap=os.path.basename(dataset.pcap))
+        metrics.Increment('bytes_written_total', num_bytes, format=self.output_format)
+
+    @abc.abstractmethod
+    def Write_Dataset(self, dataset: Split_Dataset) -> int:
+        # Writes a non-empty dataset, returns the number of bytes written
+        raise NotImplementedError
+
+    def Resume(self, rows: int) -> None:
+        # Continue the output of an interrupted run, keeping its first rows samples
+        self.rows = rows
+
+    def Then(self, callback: Callable[[], None]) -> None:
+        # Run callback once every dataset passed to Write so far is written, right away for a synchronous writer
+        callback()
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self) -> 'Dataset_Writer':
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+class CSV_Writer(Dataset_Writer):
+    output_format = 'csv'
+
+    def __init__(self, save_folder: str, per_pcap: bool = False) -> None:
+        # per_pcap: every dataset goes to the subfolder named after its PCAP file, like the gflow command writes
+        self.save_folder = save_folder
+        self.per_pcap = per_pcap
+
+    def Write_Dataset(self, dataset: Split_Dataset) -> int:
+        num_bytes = 0
+        save_folder = os.path.join(self.save_folder, Get_Source_Name(dataset.pcap)) if self.per_pcap \
+            else self.save_folder
+        if dataset.tabular is not None:
+            header = ','.join(str(column) for column in range(dataset.tabular.shape[1]))
+            num_bytes += self.Write_Samples(os.path.join(save_folder, 'Tabular'), header, dataset.sample_indices,
+                                            [','.join(map(str, row)) for row in dataset.tabular.tolist()])
+        if dataset.statistical is not None:
+            header = ','.join(dataset.feature_names)
+            num_bytes += self.Write_Samples(os.path.join(save_folder, 'Statistical'), header,
+                                            dataset.sample_indices,
+                                            [','.join(map(Format_Float, row)) for row in dataset.statistical.tolist()])
+        return num_bytes
+
+    def Write_Samples(self, folder: str, header: str, sample_indices: np.ndarray, lines: List[str]) -> int:
+        if not os.path.exists(folder): os.makedirs(folder)
+        # Same layout as DataFrame.to_csv(index=False): header line, one value line, os.linesep terminated.
+        # Files are renamed into place once complete, a killed run leaves .tmp files instead of truncated samples
+        num_bytes = 0
+        for sample_index, line in zip(sample_indices.tolist(), lines):
+            path = os.path.join(folder, f"Sample_{sample_index}.csv")
+            with open(path + '.tmp', 'w', newline='') as file:
+                num_bytes += file.write(header + os.linesep + line + os.linesep)
+            os.replace(path + '.tmp', path)
+        return num_bytes
+
+
+class Parquet_Writer(Dataset_Writer):
+    output_format = 'parquet'
+
+    def __init__(self, save_folder: str) -> None:
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError as e:
+            raise ImportError("output_format 'parquet' requires pyarrow (pip install 'GFlowMeter[parquet]')") from e
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.save_folder = save_folder
+        self.tabular_writer = None
+        self.statistical_writer = None
+        # Files are opened here so their positions count the bytes written
+        self.sinks: Dict[str, object] = {}
+        self.flushed = 0
+        if not os.path.exists(save_folder): os.makedirs(save_folder)
+
+    def Write_Dataset(self, dataset: Split_Dataset) -> int:
+        if dataset.tabular is not None:
+            names = [str(column) for column in range(dataset.tabular.shape[1])]
+            table = self.Build_Table(dataset, names, dataset.tabular, self.pa.uint8())
+            if self.tabular_writer is None:
+                self.tabular_writer = self.pq.ParquetWriter(self.Open_Sink('Tabular.parquet'), table.schema)
+            self.tabular_writer.write_table(table, row_group_size=len(table))
+        if dataset.statistical is not None:
+            table = self.Build_Table(dataset, dataset.feature_names, dataset.statistical, self.pa.float64())
+            if self.statistical_writer is None:
+                self.statistical_writer = self.pq.ParquetWriter(self.Open_Sink('Statistical.parquet'), table.schema)
+            self.statistical_writer.write_table(table, row_group_size=len(table))
+        return self.Count_Flushed()
+
+    def Resume(self, rows: int) -> None:
+        self.rows = rows
+        if rows == 0:
+            return
+        # The files cannot be appended to, their first row groups are copied into new ones
+        for file_name in ('Tabular.parquet', 'Statistical.parquet'):
+            path = os.path.join(self.save_folder, file_name)
+            if not os.path.exists(path):
+                continue
+            previous_path = path + '.resume'
+            os.replace(path, previous_path)
+            try:
+                writer = self.Copy_Row_Groups(previous_path, file_name, rows)
+            except Exception:
+                self.close()
+                os.replace(previous_path, path)
+                raise
+            os.remove(previous_path)
+            if file_name == 'Tabular.parquet':
+                self.tabular_writer = writer
+            else:
+                self.statistical_writer = writer
+        # Copied bytes were written by the interrupted run
+        self.Count_Flushed()
+
+    def Copy_Row_Groups(self, source_path: str, file_name: str, rows: int) -> object:
+        try:
+            source = self.pq.ParquetFile(source_path)
+        except self.pa.ArrowException as e:
+            raise ValueError(f"Cannot resume {file_name}, the interrupted run did not close it ({e}). "
+                             f"Run again with --fresh") from e
+        writer = self.pq.ParquetWriter(self.Open_Sink(file_name), source.schema_arrow)
+        copied = 0
+        for row_group in range(source.num_row_groups):
+            if copied >= rows:
+                break
+            table = source.read_row_group(row_group)
+            writer.write_table(table, row_group_size=len(table))
+            copied += len(table)
+        source.close()
+        if copied != rows:
+            writer.close()
+            raise ValueError(f"Cannot resume {file_name}: {copied} rows found where the manifest expects {rows}")
+        return writer
+
+    def Open_Sink(self, file_name: str) -> object:
+        sink = self.pa.OSFile(os.path.join(self.save_folder, file_name), 'wb')
+        self.sinks[file_name] = sink
+        return sink
+
+    def Count_Flushed(self) -> int:
+        flushed = sum(sink.tell() for sink in self.sinks.values())
+        num_bytes, self.flushed = flushed - self.flushed, flushed
+        return num_bytes
+
+    def Build_Table(self, dataset: Split_Dataset, names: List[str], matrix: np.ndarray, dtype: object) -> object:
+        pa = self.pa
+        num_samples = dataset.num_samples
+        columns = [
+            pa.array(dataset.sample_indices, type=pa.int64()),
+            pa.DictionaryArray.from_arrays(pa.array(np.zeros(num_samples, dtype=np.int32)), pa.array([dataset.pcap])),
+            pa.array(np.full(num_samples, dataset.split, dtype=np.int32)),
+        ]
+        columns += [pa.array(matrix[:, column], type=dtype) for column in range(matrix.shape[1])]
+        return pa.Table.from_arrays(columns, names=['Sample_Index', 'Pcap', 'Split'] + names)
+
+    def close(self) -> None:
+        for writer in (self.tabular_writer, self.statistical_writer):
+            if writer is not None:
+                writer.close()
+        self.tabular_writer = None
+        self.statistical_writer = None
+        # The footers are written on close
+        get_metrics().Increment('bytes_written_total', self.Count_Flushed(), format=self.output_format)
+        for sink in self.sinks.values():
+            sink.close()
+        self.sinks = {}
+        self.flushed = 0
+
+
+class NPY_Array():
+    def __init__(self, path: str, dtype: type, columns: int, rows: int = 0) -> None:
+        # rows > 0 reopens an existing file, keeping its first rows rows
+        self.dtype = np.dtype(dtype)
+        self.columns = columns
+        self.rows = rows
+        if rows == 0:
+            self.file = open(path, 'w+b')
+        else:
+            self.file = open(path, 'r+b')
+            self.file.truncate(NPY_HEADER_LENGTH + rows * columns * self.dtype.itemsize)
+        Write_Npy_Header(self.file, self.dtype, (rows, columns))
+
+    def Append(self, matrix: np.ndarray) -> int:
+        self.file.seek(0, os.SEEK_END)
+        num_bytes = self.file.write(np.ascontiguousarray(matrix, dtype=self.dtype).tobytes())
+        self.rows += len(matrix)
+        # Keep the file loadable after every split
+        Write_Npy_Header(self.file, self.dtype, (self.rows, self.columns))
+        self.file.flush()
+        return num_bytes
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class NPY_Writer(Dataset_Writer):
+    output_format = 'npy'
+
+    def __init__(self, save_folder: str) -> None:
+        self.save_folder = save_folder
+        self.tabular: Optional[NPY_Array] = None
+        self.statistical: Optional[NPY_Array] = None
+        self.index_file: Optional[TextIO] = None
+        self.rows = 0
+        if not os.path.exists(save_folder): os.makedirs(save_folder)
+
+    def Write_Dataset(self, dataset: Split_Dataset) -> int:
+        # Only the current split is held in memory, its rows go straight to the end of the files
+        num_bytes = 0
+        if dataset.tabular is not None:
+            if self.tabular is None:
+                self.tabular = NPY_Array(os.path.join(self.save_folder, 'Tabular.npy'), np.uint8,
+                                         dataset.tabular.shape[1])
+                num_bytes += NPY_HEADER_LENGTH
+            num_bytes += self.tabular.Append(dataset.tabular)
+        if dataset.statistical is not None:
+            if self.statistical is None:
+                self.statistical = NPY_Array(os.path.join(self.save_folder, 'Statistical.npy'), np.float64,
+                                             dataset.statistical.shape[1])
+                num_bytes += NPY_HEADER_LENGTH
+            num_bytes += self.statistical.Append(dataset.statistical)
+        num_bytes += self.Write_Index(dataset)
+        return num_bytes
+
+    def Resume(self, rows: int) -> None:
+        self.rows = rows
+        if rows == 0:
+            return
+        for name, dtype in (('Tabular', np.uint8), ('Statistical', np.float64)):
+            path = os.path.join(self.save_folder, f'{name}.npy')
+            if not os.path.exists(path):
+                continue
+            shape = Read_Npy_Shape(path)
+            if shape[0] < rows:
+                raise ValueError(f"Cannot resume {path}: {shape[0]} rows found where the manifest expects {rows}")
+            array = NPY_Array(path, dtype, shape[1], rows)
+            if name == 'Tabular':
+                self.tabular = array
+            else:
+                self.statistical = array
+        # Header line plus one line per row
+        index_path = os.path.join(self.save_folder, 'Index.csv')
+        Truncate_Lines(index_path, rows + 1)
+        self.index_file = open(index_path, 'a', newline='')
+
+    def Write_Index(self, dataset: Split_Dataset) -> int:
+        num_bytes = 0
+        if self.index_file is None:
+            self.index_file = open(os.path.join(self.save_folder, 'Index.csv'), 'w', newline='')
+            num_bytes += self.index_file.write('Row,Sample_Index,Pcap,Split,Protocol,Address_A,Port_A,Address_B,Port_B'
+                                               + os.linesep)
+        pcap = Quote_CSV(dataset.pcap)
+        lines = []
+        for row, (sample_index, key) in enumerate(zip(dataset.sample_indices.tolist(), dataset.flow_keys), self.rows):
+            lines.append(f"{row},{sample_index},{pcap},{dataset.split},{Protocol(key.protocol).name},"
+                         f"{Format_Address(key.address_a)},{key.port_a},{Format_Address(key.address_b)},{key.port_b}")
+        num_bytes += self.index_file.write(os.linesep.join(lines) + os.linesep)
+        self.index_file.flush()
+        return num_bytes
+
+    def close(self) -> None:
+        for array in (self.tabular, self.statistical):
+            if array is not None:
+                array.close()
+        self.tabular = None
+        self.statistical = None
+        if self.index_file is not None:
+            self.index_file.close()
+            self.index_file = None
+
+
+class Tar_Writer(Dataset_Writer):
+    output_format = 'tar'
+
+    def __init__(self, save_folder: str, max_samples: int = SHARD_MAX_SAMPLES,
+                 max_bytes: int = SHARD_MAX_MB * 1024 ** 2) -> None:
+        self.save_folder = save_folder
+        self.max_samples = max_samples
+        self.max_bytes = max_bytes
+        self.file: Optional[BinaryIO] = None
+        self.shard = -1                         # Number of the open shard
+        self.shard_samples = 0
+        self.shard_bytes = 0
+        self.npy_header = b''                   # .npy header of one statistical vector, the same for all samples
+        self.rows = 0
+        if not os.path.exists(save_folder): os.makedirs(save_folder)
+
+    def Write_Dataset(self, dataset: Split_Dataset) -> int:
+        num_bytes = 0
+        if dataset.statistical is not None and not self.npy_header:
+            self.npy_header = Get_Npy_Header(np.dtype(np.float64), (dataset.statistical.shape[1],))
+        tabular, pcap = dataset.tabular, dataset.pcap
+        for row, (sample_index, key) in enumerate(zip(dataset.sample_indices.tolist(), dataset.flow_keys)):
+            name = f'Sample_{sample_index}'
+            metadata = {'Sample_Index': sample_index, 'Pcap': pcap, 'Split': dataset.split,
+                        'Protocol': Protocol(key.protocol).name, 'Address_A': Format_Address(key.address_a),
+                        'Port_A': key.port_a, 'Address_B': Format_Address(key.address_b), 'Port_B': key.port_b}
+            members = []
+            if tabular is not None:
+                members.append(Tar_Member(f'{name}.tabular.bin', tabular[row].tobytes()))
+            if dataset.statistical is not None:
+                members.append(Tar_Member(f'{name}.statistical.npy',
+                                          self.npy_header + dataset.statistical[row].astype('<f8').tobytes()))
+            # The metadata closes every sample, Resume counts samples by it
+            members.append(Tar_Member(f'{name}.json', json.dumps(metadata).encode()))
+            sample = b''.join(members)
+            if self.file is None or self.shard_samples >= self.max_samples \
+                    or (self.shard_samples > 0 and self.shard_bytes + len(sample) > self.max_bytes):
+                num_bytes += self.Next_Shard()
+            self.file.write(sample)
+            self.shard_samples += 1
+            self.shard_bytes += len(sample)
+            num_bytes += len(sample)
+        self.file.flush()
+        return num_bytes
+
+    def Next_Shard(self) -> int:
+        num_bytes = self.Close_Shard()
+        self.shard += 1
+        self.file = open(self.Get_Shard_Path(self.shard), 'wb')
+        self.shard_samples = 0
+        self.shard_bytes = 0
+        return num_bytes
+
+    def Close_Shard(self) -> int:
+        # Two zero blocks end the archive
+        if self.file is None:
+            return 0
+        self.file.write(bytes(2 * TAR_BLOCK))
+        self.file.close()
+        self.file = None
+        return 2 * TAR_BLOCK
+
+    def Get_Shard_Path(self, shard: int) -> str:
+        return os.path.join(self.save_folder, f'shard-{shard:06d}.tar')
+
+    def Resume(self, rows: int) -> None:
+        # Keeps the first rows samples: the shard holding the last of them is cut after it and reopened,
+        # the shards after it are deleted
+        self.rows = rows
+        shard, remaining = 0, rows
+        while remaining > 0:
+            path = self.Get_Shard_Path(shard)
+            if not os.path.exists(path):
+                raise ValueError(f"Cannot resume {self.save_folder}: {rows - remaining} samples found in the "
+                                 f"shards where the manifest expects {rows}")
+            samples, end = Count_Tar_Samples(path, remaining)
+            remaining -= samples
+            if remaining == 0:
+                self.file = open(path, 'r+b')
+                self.file.truncate(end)
+                self.file.seek(end)
+                self.shard, self.shard_samples, self.shard_bytes = shard, samples, end
+            shard += 1
+        while os.path.exists(self.Get_Shard_Path(shard)):
+            os.remove(self.Get_Shard_Path(shard))
+            shard += 1
+
+    def close(self) -> None:
+        self.Close_Shard()
+
+
+class Write_Error(RuntimeError):
+    # A Background_Writer failed: the run stops instead of skipping the split like other errors
+    pass
+
+
+class Background_Writer(Dataset_Writer):
+    def __init__(self, writer: Dataset_Writer, max_pending: int = WRITE_QUEUE) -> None:
+        # Datasets are written by one thread in the order they were passed, the output is the same as writer's
+        self.writer = writer
+        self.output_format = writer.output_format
+        self.queue: queue.Queue = queue.Queue(max_pending)
+        self.error: Optional[Exception] = None  # First failed write or callback, nothing after it runs
+        self.thread = threading.Thread(target=self.Run, name='writer', daemon=True)
+        self.thread.start()
+
+    @property
+    def rows(self) -> int:
+        # Samples written so far, up to date on the writer thread (in Then callbacks)
+        return self.writer.rows
+
+    def Write(self, dataset: Split_Dataset) -> None:
+        self.Check_Error()
+        if dataset.num_samples == 0:
+            return
+        self.Write_Dataset(dataset)
+
+    def Write_Dataset(self, dataset: Split_Dataset) -> int:
+        # Queues the dataset, blocking while the queue is full. Its bytes are counted by the wrapped writer
+        self.queue.put((dataset, None))
+        return 0
+
+    def Then(self, callback: Callable[[], None]) -> None:
+        self.Check_Error()
+        self.queue.put((None, callback))
+
+    def Check_Error(self) -> None:
+        if self.error is not None:
+            raise Write_Error(f"Writing the datasets failed: {self.error}") from self.error
+
+    def Resume(self, rows: int) -> None:
+        self.writer.Resume(rows)
+
+    def Run(self) -> None:
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            dataset, callback = item
+            if self.error is not None:
+                # The callbacks after a failed write would record its split as done in the manifest, so a
+                # resumed run would skip it. Everything queued is dropped, the queue is still emptied
+                continue
+            try:
+                if dataset is not None:
+                    self.writer.Write(dataset)
+                else:
+                    callback()
+            except Exception as e:
+                self.error = e
+                if dataset is not None:
+                    logger.error(f"Error writing split_{dataset.split} of {dataset.pcap}: {e}", exc_info=True)
+                else:
+                    logger.error(f"Error after writing: {e}", exc_info=True)
+
+    def close(self) -> None:
+        # Writes everything still queued, then closes the writer. Raises if a write or callback failed
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+        self.writer.close()
+        self.Check_Error()
+
+
+def Tar_Member(name: str, data: bytes) -> bytes:
+    """
+    Build a regular file member of a tar archive.
+
+    Args:
+        name: Member name, at most 100 bytes
+        data: File content
+
+    Returns:
+        USTAR header (the one tarfile writes for mode 0644, mtime 0 and no owner, so the shards of
+        a run are reproducible), data and zero padding to the next 512-byte block
+    """
+    header = TAR_HEADER.pack(name.encode(), b'0000644\0', b'0000000\0', b'0000000\0', b'%011o\0' % len(data),
+                             b'00000000000\0', b' ' * 8, b'0', b'', b'ustar\0', b'00', b'', b'', b'', b'', b'')
+    # The checksum is the byte sum of the header with its own field read as spaces
+    header = header[:148] + b'%06o\0 ' % sum(header) + header[156:]
+    return header + data + bytes(-len(data) % TAR_BLOCK)
+
+
+def Count_Tar_Samples(path: str, limit: int) -> Tuple[int, int]:
+    """
+    Count the complete samples at the start of a shard.
+
+    Args:
+        path: Shard written by Tar_Writer, possibly cut short by a killed run
+        limit: Stop after this many samples
+
+    Returns:
+        Tuple of (samples found, at most limit, and the byte offset right after the last of them)
+    """
+    samples, end = 0, 0
+    try:
+        with tarfile.open(path, 'r:') as archive:
+            for member in archive:
+                if member.name.endswith('.json'):
+                    samples += 1
+                    end = member.offset_data + member.size + (-member.size % TAR_BLOCK)
+                    if samples == limit:
+                        break
+    except tarfile.ReadError as e:
+        # A truncated member ends the shard, the samples before it are kept
+        logger.warning(f"Shard {path} ends in a truncated member, keeping its first {samples} samples: {e}")
+    return samples, end
+
+
+def Write_Npy_Header(file: BinaryIO, dtype: np.dtype, shape: Tuple[int, int]) -> None:
+    """
+    Write a version 1.0 .npy header padded to NPY_HEADER_LENGTH bytes at the start of a file.
+
+    Args:
+        file: File opened for binary writing
+        dtype: Array dtype
+        shape: Array shape (rows, columns)
+    """
+    header = repr({'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': False, 'shape': shape})
+    # Magic (6) + version (2) + header length (2), then the header ending in a newline
+    header = header.ljust(NPY_HEADER_LENGTH - 10 - 1) + '\n'
+    file.seek(0)
+    file.write(b'\x93NUMPY\x01\x00' + struct.pack('<H', len(header)) + header.encode('latin1'))
+
+
+def Get_Npy_Header(dtype: np.dtype, shape: Tuple[int, ...]) -> bytes:
+    # Header of a .npy file holding one array of this dtype and shape
+    buffer = io.BytesIO()
+    np.lib.format.write_array_header_1_0(buffer, {'descr': np.lib.format.dtype_to_descr(dtype),
+                                                  'fortran_order': False, 'shape': shape})
+    return buffer.getvalue()
+
+
+def Read_Npy_Shape(path: str) -> Tuple[int, ...]:
+    with open(path, 'rb') as file:
+        # Written by Write_Npy_Header, always version 1.0
+        np.lib.format.read_magic(file)
+        shape, _, _ = np.lib.format.read_array_header_1_0(file)
+    return shape
+
+
+def Truncate_Lines(path: str, lines: int) -> None:
+    """
+    Cut a text file after its first lines lines.
+
+    Args:
+        path: File to truncate
+        lines: Number of lines to keep
+
+    Raises:
+        ValueError: If the file has fewer lines
+    """
+    with open(path, 'r+b') as file:
+        for line_number in range(lines):
+            if not file.readline():
+                raise ValueError(f"Cannot resume {path}: {line_number} lines found where {lines} are expected")
+        file.truncate(file.tell())
+
+
+def Quote_CSV(value: str) -> str:
+    if any(character in value for character in ',"\r\n'):
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def Format_Float(value: float) -> str:
+    # Same text as pandas writes for float64 (NaN as an empty field)
+    return '' if value != value else repr(value)
+
+
+def Concat_Datasets(datasets: List[Split_Dataset]) -> Split_Dataset:
+    """
+    Join datasets of the same PCAP file and split, in order.
+
+    Args:
+        datasets: Non-empty list of datasets with the same pcap, split and generated datasets
+
+    Returns:
+        One dataset holding the samples of all of them
+    """
+    if len(datasets) == 1:
+        return datasets[0]
+    first = datasets[0]
+    return first._replace(
+        sample_indices=np.concatenate([dataset.sample_indices for dataset in datasets]),
+        flow_keys=[key for dataset in datasets for key in dataset.flow_keys],
+        tabular=np.concatenate([dataset.tabular for dataset in datasets]) if first.tabular is not None else None,
+        statistical=np.concatenate([dataset.statistical for dataset in datasets])
+        if first.statistical is not None else None)
+
+
+def Get_Shard_Limits(config: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Read the shard limits of the tar output format from a configuration.
+
+    Args:
+        config: Configuration dictionary
+
+    Returns:
+        Tuple of (samples per shard, bytes per shard)
+
+    Raises:
+        ValueError: If shard_max_samples or shard_max_mb is not a positive number
+    """
+    max_samples = config.get('shard_max_samples', SHARD_MAX_SAMPLES)
+    if isinstance(max_samples, bool) or not isinstance(max_samples, int) or max_samples <= 0:
+        raise ValueError(f"Invalid shard_max_samples: {max_samples}. Must be a positive integer")
+    max_mb = config.get('shard_max_mb', SHARD_MAX_MB)
+    if isinstance(max_mb, bool) or not isinstance(max_mb, (int, float)) or max_mb <= 0:
+        raise ValueError(f"Invalid shard_max_mb: {max_mb}. Must be a positive number of megabytes")
+    return max_samples, int(max_mb * 1024 ** 2)
+
+
+def Get_Writer(output_format: str, save_folder: str, shard_limits: Optional[Tuple[int, int]] = None) -> Dataset_Writer:
+    """
+    Create the dataset writer for an output format.
+
+    Args:
+        output_format: 'csv', 'parquet', 'npy' or 'tar'
+        save_folder: Folder the datasets are written to
+        shard_limits: Samples and bytes per shard of the tar format, see Get_Shard_Limits
+
+    Returns:
+        Dataset_Writer instance
+
+    Raises:
+        ValueError: If the output format is unknown
+        ImportError: If the output format needs a package that is not installed
+    """
+    if output_format == 'csv':
+        return CSV_Writer(save_folder)
+    if output_format == 'parquet':
+        return Parquet_Writer(save_folder)
+    if output_format == 'npy':
+        return NPY_Writer(save_folder)
+    if output_format == 'tar':
+        return Tar_Writer(save_folder, *shard_limits) if shard_limits is not None else Tar_Writer(save_folder)
+    raise ValueError(f"Invalid output format: {output_format}. Must be one of {', '.join(OUTPUT_FORMATS)}")
@@ -0,0 +1,167 @@
+import csv
+import glob
+import io
+import os
+import struct
+import subprocess
+import sys
+import tarfile
+from typing import Any, Dict, Iterable, List, Optional
+import numpy as np
+import yaml
+from GFlowMeter.reader import Read_Records, Record
+from GFlowMeter.writers import Format_Float
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+from synthetic_pcap import Build_Frame, Generate_Pcap, Synthetic_Flow, Traffic_Profile  # noqa: E402
+
+'''
+Small captures for the tests, written with struct only, and helpers to run the gflow command on them.
+Converted captures keep the timestamps of their source in whole microseconds, so every format
+yields the same float timestamps and the same samples.
+'''
+
+# Settings of every run, tests override single keys
+CONFIG = {
+    'capture_interval': 2,
+    'sample_type': 'bidirectional',
+    'target_sample_length': 64,
+    'dataset_type': 'C',
+    'padding_per_packet': False,
+    'workers': 1,
+}
+
+
+def Make_Capture(path: str, **profile: Any) -> str:
+    # Synthetic mix of TCP / UDP / SCTP / ICMP flows over IPv4 and IPv6
+    settings = dict(flows=40, packets_per_flow=8, max_payload=300, duration=6.0, seed=1)
+    settings.update(profile)
+    Generate_Pcap(path, Traffic_Profile(**settings))
+    return path
+
+
+def Write_Pcap(path: str, records: Iterable[Record], nanoseconds: bool = False) -> str:
+    records = list(records)
+    resolution = 10 ** 9 if nanoseconds else 10 ** 6
+    with open(path, 'wb') as file:
+        file.write(struct.pack('<IHHiIII', 0xA1B23C4D if nanoseconds else 0xA1B2C3D4, 2, 4, 0, 0, 65535,
+                               records[0].link_type if records else 1))
+        for record in records:
+            seconds, fraction = divmod(round(record.timestamp * 10 ** 6) * (resolution // 10 ** 6), resolution)
+            file.write(struct.pack('<IIII', seconds, fraction, len(record.data), record.wire_length))
+            file.write(record.data)
+    return path
+
+
+def Pcapng_Section(records: List[Record], big_endian: bool = False) -> bytes:
+    # Section Header, one Interface Description with nanosecond timestamps, then Enhanced Packet Blocks
+    endian = '>' if big_endian else '<'
+    link_type = records[0].link_type if records else 1
+    blocks = [struct.pack(endian + 'IIIHHqI', 0x0A0D0D0A, 28, 0x1A2B3C4D, 1, 0, -1, 28),
+              struct.pack(endian + 'IIHHIHHBxxxHHI', 1, 32, link_type, 0, 65535, 9, 1, 9, 0, 0, 32)]
+    for record in records:
+        ticks = round(record.timestamp * 10 ** 6) * 1000
+        padding = -len(record.data) % 4
+        length = 32 + len(record.data) + padding
+        blocks.append(struct.pack(endian + 'IIIIIII', 6, length, 0, ticks >> 32, ticks & 0xFFFFFFFF,
+                                  len(record.data), record.wire_length))
+        blocks.append(record.data + bytes(padding) + struct.pack(endian + 'I', length))
+    return b''.join(blocks)
+
+
+def Write_Pcapng(path: str, records: Iterable[Record], sections: int = 1) -> str:
+    # Records are spread over sections, every other one big-endian
+    records = list(records)
+    size = -(-len(records) // sections)
+    with open(path, 'wb') as file:
+        for section in range(sections):
+            file.write(Pcapng_Section(records[section * size:(section + 1) * size], big_endian=section % 2 == 1))
+    return path
+
+
+def Read_All(path: str) -> List[Record]:
+    return list(Read_Records(path))
+
+
+def Run_Gflow(
+    folder: str,
+    pcap_path: str,
+    *args: str,
+    stdin: Optional[str] = None,
+    **config: Any
+) -> subprocess.CompletedProcess:
+    # Runs the gflow command with config.yaml written to folder, like a user would. Output goes to folder/out,
+    # stdin is a file fed to its standard input
+    os.makedirs(folder, exist_ok=True)
+    config = {**CONFIG, 'pcap_path': pcap_path, 'save_folder': os.path.join(folder, 'out'), **config}
+    with open(os.path.join(folder, 'config.yaml'), 'w', encoding='utf-8') as file:
+        yaml.safe_dump(config, file)
+    env = dict(os.environ, PYTHONPATH=os.path.join(ROOT, 'src'))
+    with open(stdin if stdin is not None else os.devnull, 'rb') as input_file:
+        return subprocess.run([sys.executable, '-m', 'GFlowMeter.main', *args], cwd=folder, env=env,
+                              stdin=input_file, capture_output=True, text=True, timeout=300)
+
+
+def Read_Output(save_folder: str, exclude: Optional[Iterable[str]] = ('manifest.json',)) -> Dict[str, bytes]:
+    # Every output file by its path relative to save_folder
+    output = {}
+    for folder, _, names in os.walk(save_folder):
+        for name in names:
+            if exclude and name in exclude:
+                continue
+            path = os.path.join(folder, name)
+            with open(path, 'rb') as file:
+                output[os.path.relpath(path, save_folder)] = file.read()
+    return output
+
+
+def Read_Samples(save_folder: str, output_format: str = 'csv') -> Dict[str, Dict[int, tuple]]:
+    """
+    Read the samples a run wrote, in the same form for every output format.
+
+    Args:
+        save_folder: save_folder of the run
+        output_format: output_format of the run
+
+    Returns:
+        {'Tabular' / 'Statistical': {sample index: values as the CSV output writes them}}
+    """
+    samples: Dict[str, Dict[int, tuple]] = {'Tabular': {}, 'Statistical': {}}
+    if output_format == 'csv':
+        for name, rows in samples.items():
+            for path in glob.glob(os.path.join(save_folder, '*', name, 'Sample_*.csv')):
+                with open(path, newline='') as file:
+                    rows[int(os.path.basename(path)[7:-4])] = tuple(list(csv.reader(file))[1])
+    elif output_format == 'parquet':
+        import pyarrow.parquet as pq
+        for name, rows in samples.items():
+            path = os.path.join(save_folder, f'{name}.parquet')
+            if os.path.exists(path):
+                for row in pq.read_table(path).to_pylist():
+                    # Sample_Index, Pcap and Split come before the values
+                    rows[row['Sample_Index']] = Format_Row(list(row.values())[3:])
+    elif output_format == 'npy':
+        with open(os.path.join(save_folder, 'Index.csv'), newline='') as file:
+            indices = [int(row['Sample_Index']) for row in csv.DictReader(file)]
+        for name, rows in samples.items():
+            path = os.path.join(save_folder, f'{name}.npy')
+            if os.path.exists(path):
+                for index, row in zip(indices, np.load(path).tolist()):
+                    rows[index] = Format_Row(row)
+    elif output_format == 'tar':
+        for path in sorted(glob.glob(os.path.join(save_folder, 'shard-*.tar'))):
+            with tarfile.open(path) as shard:
+                for member in shard.getmembers():
+                    name, kind = member.name.split('.')[:2]
+                    data = shard.extractfile(member).read()
+                    if kind == 'tabular':
+                        samples['Tabular'][int(name[7:])] = Format_Row(list(data))
+                    elif kind == 'statistical':
+                        samples['Statistical'][int(name[7:])] = Format_Row(np.load(io.BytesIO(data)).tolist())
+    return samples
+
+
+def Format_Row(values: List[Any]) -> tuple:
+    return tuple(Format_Float(value) if isinstance(value, float) else str(value) for value in values)
@@ -0,0 +1,8 @@
+import pytest
+from captures import Make_Capture
+
+
+@pytest.fixture(scope='session')
+def capture(tmp_path_factory: pytest.TempPathFactory) -> str:
+    # One synthetic PCAP for the whole session, tests must not modify it
+    return Make_Capture(str(tmp_path_factory.mktemp('captures') / 'capture.pcap'))
@@ -0,0 +1,64 @@
+import json
+import os
+import pytest
+from captures import Read_Output, Run_Gflow
+from GFlowMeter.cache import Evict, Get_Cache_Settings
+
+
+def Cache_Lookups(summary_path: str) -> dict:
+    with open(summary_path, encoding='utf-8') as file:
+        counters = json.load(file)['counters'].get('cache_lookups_total', [])
+    return {counter['labels']['result']: counter['value'] for counter in counters}
+
+
+@pytest.mark.parametrize('settings', [{}, {'workers': 2}, {'idle_timeout': 1.5}])
+def test_cached_runs_give_the_uncached_output(capture: str, tmp_path, settings: dict) -> None:
+    cache_folder = str(tmp_path / 'cache')
+    result = Run_Gflow(str(tmp_path / 'plain'), capture, **settings)
+    assert result.returncode == 0, result.stderr
+    expected = Read_Output(str(tmp_path / 'plain' / 'out'))
+    assert expected
+    for run, lookups in (('first', {'miss': 1}), ('second', {'hit': 1})):
+        summary = str(tmp_path / f'{run}.json')
+        result = Run_Gflow(str(tmp_path / run), capture, cache_folder=cache_folder, metrics_summary=summary,
+                           **settings)
+        assert result.returncode == 0, result.stderr
+        assert Read_Output(str(tmp_path / run / 'out')) == expected
+        assert Cache_Lookups(summary) == lookups
+    assert len(os.listdir(cache_folder)) == 1
+
+
+def test_output_settings_reuse_the_entry(capture: str, tmp_path) -> None:
+    cache_folder = str(tmp_path / 'cache')
+    for run, output_format in (('csv', 'csv'), ('npy', 'npy')):
+        summary = str(tmp_path / f'{run}.json')
+        result = Run_Gflow(str(tmp_path / run), capture, cache_folder=cache_folder, metrics_summary=summary,
+                           output_format=output_format, target_sample_length=32 if run == 'npy' else 64)
+        assert result.returncode == 0, result.stderr
+    assert Cache_Lookups(summary) == {'hit': 1}
+    # A different capture_interval decodes a new entry
+    result = Run_Gflow(str(tmp_path / 'interval'), capture, cache_folder=cache_folder, capture_interval=3)
+    assert result.returncode == 0, result.stderr
+    assert len(os.listdir(cache_folder)) == 2
+
+
+def test_evict_removes_least_recently_used(tmp_path) -> None:
+    for age, name in enumerate(['newest', 'middle', 'oldest']):
+        entry = tmp_path / name
+        entry.mkdir()
+        (entry / 'data.bin').write_bytes(bytes(100))
+        os.utime(entry, (1000 - age, 1000 - age))
+    (tmp_path / 'partial.tmp').mkdir()
+    Evict(str(tmp_path), 250)
+    assert sorted(os.listdir(tmp_path)) == ['middle', 'newest', 'partial.tmp']
+    # The entry just stored stays even when it alone is over the bound
+    Evict(str(tmp_path), 50, keep=str(tmp_path / 'middle'))
+    assert sorted(os.listdir(tmp_path)) == ['middle', 'partial.tmp']
+
+
+def test_cache_settings(tmp_path) -> None:
+    assert Get_Cache_Settings({}) is None
+    assert Get_Cache_Settings({'cache_folder': str(tmp_path), 'cache_max_gb': 0.5}) == (str(tmp_path), 2 ** 29)
+    for max_gb in (0, -1, True, '1'):
+        with pytest.raises(ValueError, match='cache_max_gb'):
+            Get_Cache_Settings({'cache_folder': str(tmp_path), 'cache_max_gb': max_gb})
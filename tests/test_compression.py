@@ -0,0 +1,66 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import pytest
+from captures import Read_All, Read_Samples, Run_Gflow, Write_Pcapng
+
+COMPRESS = {'gz': gzip.compress, 'xz': lzma.compress, 'bz2': bz2.compress}
+
+
+def Compress(path: str, suffix: str, members: int = 1) -> str:
+    # Concatenated members / streams, like `cat a.gz b.gz`
+    with open(path, 'rb') as file:
+        content = file.read()
+    size = -(-len(content) // members)
+    compressed = f'{path}.{suffix}'
+    with open(compressed, 'wb') as file:
+        for start in range(0, len(content), size):
+            file.write(COMPRESS[suffix](content[start:start + size]))
+    return compressed
+
+
+@pytest.mark.parametrize('suffix', ['gz', 'xz', 'bz2'])
+def test_compressed_files_give_the_same_records(capture: str, tmp_path, suffix: str) -> None:
+    pcap = shutil.copy(capture, tmp_path / 'capture.pcap')
+    pcapng = Write_Pcapng(str(tmp_path / 'capture.pcapng'), Read_All(capture), sections=2)
+    records = Read_All(capture)
+    for path in (pcap, pcapng):
+        assert Read_All(Compress(str(path), suffix)) == records
+    assert Read_All(Compress(str(pcap), suffix, members=3)) == records
+
+
+def test_truncated_stream_stops_at_the_last_record(capture: str, tmp_path) -> None:
+    compressed = Compress(str(shutil.copy(capture, tmp_path / 'capture.pcap')), 'gz')
+    with open(compressed, 'rb') as file:
+        content = file.read()
+    path = tmp_path / 'truncated.pcap.gz'
+    path.write_bytes(content[:len(content) // 2])
+    records = Read_All(str(path))
+    assert records and records == Read_All(capture)[:len(records)]
+
+
+def test_corrupt_stream(capture: str, tmp_path) -> None:
+    path = tmp_path / 'corrupt.pcap.xz'
+    path.write_bytes(lzma.compress(b'x' * 100)[:12] + bytes(200))
+    with pytest.raises(ValueError, match='decompressing'):
+        Read_All(str(path))
+
+
+@pytest.mark.parametrize('settings', [{}, {'output_format': 'npy', 'workers': 2}])
+def test_compressed_folder_gives_the_plain_output(capture: str, tmp_path, settings: dict) -> None:
+    # A folder of one gzip and one bz2 compressed file, next to the same files uncompressed
+    plain, compressed = tmp_path / 'plain', tmp_path / 'compressed'
+    for folder in (plain, compressed):
+        os.makedirs(folder / 'pcaps')
+        for name in ('a', 'b'):
+            shutil.copy(capture, folder / 'pcaps' / f'{name}.pcap')
+    for name, suffix in (('a', 'gz'), ('b', 'bz2')):
+        os.remove(Compress(str(compressed / 'pcaps' / f'{name}.pcap'), suffix)[:-len(suffix) - 1])
+    outputs = []
+    for folder in (plain, compressed):
+        result = Run_Gflow(str(folder), str(folder / 'pcaps'), **settings)
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Samples(str(folder / 'out'), settings.get('output_format', 'csv')))
+    assert outputs[0]['Tabular'] and outputs[0] == outputs[1]
@@ -0,0 +1,56 @@
+import struct
+import numpy as np
+from captures import Build_Frame, Synthetic_Flow
+from GFlowMeter.dissect import (LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL, LINKTYPE_RAW, Get_Header_Length,
+                                Get_Network_Layer, Get_Transport_Layer, Strip_Addresses)
+
+TCP4 = Synthetic_Flow('tcp', 4, bytes((10, 0, 0, 1)), bytes((172, 16, 0, 1)), 40000, 443)
+UDP6 = Synthetic_Flow('udp', 6, bytes(15) + b'\x01', bytes(15) + b'\x02', 40000, 53)
+
+
+def test_ethernet_ipv4() -> None:
+    frame = Build_Frame('ether', TCP4, True, 0, b'payload')
+    assert Get_Network_Layer(frame, LINKTYPE_ETHERNET) == (14, 4)
+    assert Get_Transport_Layer(frame, 14, 4) == (6, 34)
+    assert Get_Header_Length(frame, LINKTYPE_ETHERNET, 14, 4) == 14
+
+
+def test_linux_cooked_ipv6() -> None:
+    frame = Build_Frame('sll', UDP6, True, 0, b'payload')
+    assert Get_Network_Layer(frame, LINKTYPE_LINUX_SLL) == (16, 6)
+    assert Get_Transport_Layer(frame, 16, 6) == (17, 56)
+
+
+def test_vlan_tags_are_skipped() -> None:
+    frame = Build_Frame('ether', TCP4, True, 0, b'payload')
+    tagged = frame[:12] + struct.pack('>HH', 0x8100, 7) + frame[12:]
+    assert Get_Network_Layer(tagged, LINKTYPE_ETHERNET) == (18, 4)
+
+
+def test_raw_ip() -> None:
+    packet = Build_Frame('ether', TCP4, True, 0, b'payload')[14:]
+    assert Get_Network_Layer(packet, LINKTYPE_RAW) == (0, 4)
+    assert Get_Header_Length(packet, LINKTYPE_RAW, 0, 4) == 20
+
+
+def test_non_ip_frame() -> None:
+    arp = bytes(12) + b'\x08\x06' + bytes(28)
+    assert Get_Network_Layer(arp, LINKTYPE_ETHERNET) == (-1, 0)
+    assert np.array_equal(Strip_Addresses(arp, LINKTYPE_ETHERNET), np.frombuffer(arp, dtype=np.uint8))
+    assert Get_Network_Layer(b'\x00' * 5, LINKTYPE_ETHERNET) == (-1, 0)
+
+
+def test_strip_addresses_and_ports() -> None:
+    frame = Build_Frame('ether', TCP4, True, 0, b'payload')
+    ip = frame[14:]
+    assert Strip_Addresses(frame, LINKTYPE_ETHERNET).tobytes() == ip[:12] + ip[24:]
+    frame = Build_Frame('sll', UDP6, True, 0, b'payload')
+    ip = frame[16:]
+    assert Strip_Addresses(frame, LINKTYPE_LINUX_SLL).tobytes() == ip[:12] + ip[48:]
+
+
+def test_fragments_carry_no_transport_header() -> None:
+    frame = bytearray(Build_Frame('ether', TCP4, True, 0, b'payload'))
+    struct.pack_into('>H', frame, 14 + 6, 0x2000 | 3)
+    assert Get_Transport_Layer(bytes(frame), 14, 4) == (6, -1)
+    assert Get_Transport_Layer(bytes(frame[:30]), 14, 4) == (-1, -1)
@@ -0,0 +1,42 @@
+from captures import Build_Frame, Synthetic_Flow
+from GFlowMeter.dissect import LINKTYPE_ETHERNET
+from GFlowMeter.flowkey import Flow_Key, Format_Address, Get_Flow_Key, Protocol
+
+TCP4 = Synthetic_Flow('tcp', 4, bytes((10, 0, 0, 1)), bytes((172, 16, 0, 1)), 40000, 443)
+SCTP6 = Synthetic_Flow('sctp', 6, bytes(15) + b'\x01', bytes(15) + b'\x02', 40000, 9899)
+ICMP4 = Synthetic_Flow('icmp', 4, bytes((10, 0, 0, 1)), bytes((172, 16, 0, 1)), 7, 0)
+
+
+def Keys(flow: Synthetic_Flow, bidirectional: bool) -> tuple:
+    return tuple(Get_Flow_Key(Build_Frame('ether', flow, forward, 0, b''), LINKTYPE_ETHERNET, bidirectional)
+                 for forward in (True, False))
+
+
+def test_directional_keys() -> None:
+    request, reply = Keys(TCP4, False)
+    assert request.protocol == Protocol.TCP and (request.port_a, request.port_b) == (40000, 443)
+    assert Format_Address(request.address_a) == '10.0.0.1' and Format_Address(request.address_b) == '172.16.0.1'
+    assert reply == Flow_Key(request.protocol, request.address_b, request.port_b, request.address_a, request.port_a)
+
+
+def test_both_directions_share_a_session_key() -> None:
+    for flow in (TCP4, SCTP6):
+        request, reply = Keys(flow, True)
+        assert request == reply
+
+
+def test_ipv6_addresses() -> None:
+    request, _ = Keys(SCTP6, False)
+    assert request.protocol == Protocol.SCTP
+    assert Format_Address(request.address_a) == '::1' and Format_Address(request.address_b) == '::2'
+
+
+def test_other_ip_traffic_is_keyed_by_addresses() -> None:
+    request, reply = Keys(ICMP4, False)
+    assert request.protocol == Protocol.IP_OTHER and request.port_a == request.port_b == 0
+    assert request != reply
+
+
+def test_non_ip_frames_are_keyed_by_link_type() -> None:
+    arp = bytes(12) + b'\x08\x06' + bytes(28)
+    assert Get_Flow_Key(arp, LINKTYPE_ETHERNET, True) == Flow_Key(Protocol.NON_IP, LINKTYPE_ETHERNET, 0, 0, 0)
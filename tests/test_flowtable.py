@@ -0,0 +1,63 @@
+import numpy as np
+from captures import Build_Frame, Read_All, Synthetic_Flow
+from GFlowMeter.dissect import LINKTYPE_ETHERNET, Strip_Addresses
+from GFlowMeter.flowkey import SAMPLED_PROTOCOLS, Get_Flow_Key
+from GFlowMeter.flowtable import Flow_Table
+from GFlowMeter.reader import Record
+
+UDP4 = Synthetic_Flow('udp', 4, bytes((10, 0, 0, 1)), bytes((172, 16, 0, 1)), 40000, 53)
+
+
+def Records(payloads: list) -> list:
+    # Request / reply of one flow, 10 ms apart
+    return [Record(index * 0.01, 0, Build_Frame('ether', UDP4, index % 2 == 0, index, payload), LINKTYPE_ETHERNET)
+            for index, payload in enumerate(payloads)]
+
+
+def test_flows_are_numbered_by_first_appearance(capture: str) -> None:
+    records = Read_All(capture)
+    order = {}
+    for record in records:
+        key = Get_Flow_Key(record.data, record.link_type, True)
+        if key.protocol in SAMPLED_PROTOCOLS:
+            order.setdefault(key, len(order))
+    table = Flow_Table(start_index=5).Add_Records(records)
+    assert len(table) == len(order)
+    assert {key: flow.sample_index - 5 for key, flow in table.flows.items()} == order
+    assert table.packets == len(records)
+
+
+def test_unidirectional_flows_split_the_directions(capture: str) -> None:
+    records = Read_All(capture)
+    bidirectional = Flow_Table('bidirectional').Add_Records(records)
+    unidirectional = Flow_Table('unidirectional').Add_Records(records)
+    assert len(unidirectional) == 2 * len(bidirectional)
+
+
+def test_sample_is_the_stripped_packets_cut_to_length() -> None:
+    records = Records([b'a' * 30, b'b' * 30, b'c' * 30])
+    stripped = np.concatenate([Strip_Addresses(record.data, LINKTYPE_ETHERNET) for record in records])
+    for length in (16, len(stripped), len(stripped) + 20):
+        table = Flow_Table(target_sample_length=length).Add_Records(records)
+        (flow,) = table.flows.values()
+        sample = table.Get_Sample(flow)
+        assert len(sample) == length
+        assert sample[:len(stripped)].tobytes() == stripped[:length].tobytes()
+        assert not sample[len(stripped):].any()
+
+
+def test_padding_per_packet() -> None:
+    records = Records([b'a' * 2, b'b' * 200, b'c' * 2])
+    table = Flow_Table(target_sample_length=120, padding_per_packet=True).Add_Records(records)
+    (flow,) = table.flows.values()
+    sample = table.Get_Sample(flow)
+    # Every packet gets 120 // 3 bytes, short ones are zero-padded
+    for index, record in enumerate(records):
+        expected = Strip_Addresses(record.data, LINKTYPE_ETHERNET)[:40].tobytes()
+        assert sample[index * 40:(index + 1) * 40].tobytes() == expected.ljust(40, b'\x00')
+
+
+def test_statistics_only_table_keeps_no_bytes() -> None:
+    table = Flow_Table(tabular=False).Add_Records(Records([b'a' * 30, b'b' * 30]))
+    (flow,) = table.flows.values()
+    assert flow.chunks == [] and flow.stats is not None
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from GFlowMeter.gflow import GFlow_Meter
+
+
+@pytest.mark.parametrize('sample_type', ['bidirectional', 'unidirectional'])
+def test_dataset_types_run_only_their_stages(capture: str, sample_type: str) -> None:
+    datasets = {dataset_type: GFlow_Meter(capture, sample_type=sample_type, target_sample_length=64,
+                                          dataset_type=dataset_type, show_progress=False).Build_Dataset(3)
+                for dataset_type in 'ABC'}
+    both = datasets['C']
+    assert both.num_samples > 0 and both.sample_indices[0] == 3
+    assert datasets['A'].statistical is None and np.array_equal(datasets['A'].tabular, both.tabular)
+    assert datasets['B'].tabular is None and np.array_equal(datasets['B'].statistical, both.statistical)
+    assert datasets['A'].flow_keys == datasets['B'].flow_keys == both.flow_keys
+
+
+def test_invalid_settings(capture: str) -> None:
+    for settings in ({'dataset_type': 'D'}, {'sample_type': 'both'}, {'idle_timeout': 0}):
+        with pytest.raises(ValueError):
+            GFlow_Meter(capture, **settings)
+    with pytest.raises(FileNotFoundError):
+        GFlow_Meter(capture + '.missing')
+
+
+@pytest.mark.parametrize('timeouts', [{}, {'idle_timeout': 1.5, 'active_timeout': 4}])
+def test_batches_hold_the_samples_in_order(capture: str, timeouts: dict) -> None:
+    meter = GFlow_Meter(capture, sample_type='bidirectional', target_sample_length=64, dataset_type='C',
+                        show_progress=False, **timeouts)
+    samples = list(meter.Iter_Samples(5))
+    # With timeouts, samples come in the order their flows end
+    assert sorted(sample.sample_index for sample in samples) == list(range(5, 5 + len(samples)))
+    batches = list(meter.Iter_Batches(7, 5))
+    sizes = [batch.num_samples for batch in batches]
+    assert set(sizes[:-1]) == {7} and 0 < sizes[-1] <= 7 and sum(sizes) == len(samples)
+    rows = [row for batch in batches for row in zip(batch.sample_indices.tolist(), batch.tabular.tolist(),
+                                                       batch.statistical.tolist(), batch.flow_keys)]
+    assert rows == [(sample.sample_index, sample.tabular.tolist(), sample.statistical.tolist(), sample.flow_key)
+                    for sample in samples]
+
+
+def test_samples_match_the_dataset(capture: str) -> None:
+    meter = GFlow_Meter(capture, target_sample_length=64, dataset_type='A', show_progress=False)
+    dataset = meter.Build_Dataset()
+    samples = list(meter.Iter_Samples())
+    assert all(sample.statistical is None for sample in samples)
+    assert np.array_equal(np.stack([sample.tabular for sample in samples]), dataset.tabular)
+    assert [sample.flow_key for sample in samples] == dataset.flow_keys
+
+
+def test_invalid_batch_size(capture: str) -> None:
+    meter = GFlow_Meter(capture, show_progress=False)
+    for batch_size in (0, -3, 2.5, True):
+        with pytest.raises(ValueError, match='batch size'):
+            next(meter.Iter_Batches(batch_size))
@@ -0,0 +1,38 @@
+import os
+import threading
+import pytest
+from captures import Read_Output, Run_Gflow
+
+
+def Samples(save_folder: str) -> dict:
+    # Output of the single capture of a run, without the folder named after it
+    return {name.split(os.sep, 1)[1]: data for name, data in Read_Output(save_folder).items()}
+
+
+@pytest.mark.parametrize('config', [{}, {'idle_timeout': 0.5}], ids=['windows', 'timeouts'])
+def test_stdin_gives_the_file_samples(capture: str, tmp_path, config: dict) -> None:
+    result = Run_Gflow(str(tmp_path / 'file'), capture, **config)
+    assert result.returncode == 0, result.stderr
+    result = Run_Gflow(str(tmp_path / 'live'), '-', stdin=capture, **config)
+    assert result.returncode == 0, result.stderr
+    assert os.listdir(tmp_path / 'live' / 'out') == ['stdin']
+    samples = Samples(str(tmp_path / 'file' / 'out'))
+    assert samples and Samples(str(tmp_path / 'live' / 'out')) == samples
+
+
+@pytest.mark.skipif(not hasattr(os, 'mkfifo'), reason='needs FIFOs')
+def test_fifo(capture: str, tmp_path) -> None:
+    fifo = str(tmp_path / 'capture.fifo')
+    os.mkfifo(fifo)
+
+    def feed() -> None:
+        with open(capture, 'rb') as source, open(fifo, 'wb') as sink:
+            sink.write(source.read())
+
+    feeder = threading.Thread(target=feed)
+    feeder.start()
+    result = Run_Gflow(str(tmp_path / 'live'), fifo)
+    feeder.join()
+    assert result.returncode == 0, result.stderr
+    assert Run_Gflow(str(tmp_path / 'file'), capture).returncode == 0
+    assert Samples(str(tmp_path / 'live' / 'out')) == Samples(str(tmp_path / 'file' / 'out'))
@@ -0,0 +1,52 @@
+import json
+import pickle
+import pytest
+from captures import Read_All, Run_Gflow
+from GFlowMeter.metrics import Metrics
+
+
+def test_counters_and_histograms() -> None:
+    metrics = Metrics()
+    metrics.Increment('samples_emitted_total', 3, pcap='a.pcap')
+    metrics.Increment('samples_emitted_total', 2, pcap='b.pcap')
+    metrics.Observe('stage_duration_seconds', 0.002, stage='read')
+    metrics.Observe('stage_duration_seconds', 2.0, stage='read')
+    assert metrics.Total('samples_emitted_total') == 5
+    (histogram,) = metrics.Get_Summary()['histograms']['stage_duration_seconds']
+    assert histogram['count'] == 2 and histogram['min'] == 0.002 and histogram['max'] == 2.0
+    buckets = histogram['buckets']
+    assert (buckets['0.001'], buckets['0.005'], buckets['+Inf']) == (0, 1, 2)
+
+
+def test_worker_metrics_merge_into_the_parent() -> None:
+    parent, worker = Metrics(), Metrics()
+    parent.Increment('packets_read_total', 10)
+    worker.Increment('packets_read_total', 5)
+    worker.Observe('split_duration_seconds', 0.5)
+    parent.Merge(pickle.loads(pickle.dumps(worker)))
+    assert parent.Total('packets_read_total') == 15
+    assert parent.Get_Summary()['histograms']['split_duration_seconds'][0]['count'] == 1
+
+
+def test_prometheus_text() -> None:
+    metrics = Metrics()
+    metrics.Increment('bytes_written_total', 100, format='csv')
+    metrics.Observe('pcap_duration_seconds', 0.7)
+    lines = metrics.Get_Prometheus_Text().splitlines()
+    assert 'gflowmeter_bytes_written_total{format="csv"} 100' in lines
+    assert 'gflowmeter_pcap_duration_seconds_bucket{le="1"} 1' in lines
+    assert 'gflowmeter_pcap_duration_seconds_count 1' in lines
+    assert '# TYPE gflowmeter_pcap_duration_seconds histogram' in lines
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_run_exports_the_metrics(capture: str, tmp_path, workers: int) -> None:
+    result = Run_Gflow(str(tmp_path), capture, '--workers', str(workers), metrics_summary=str(tmp_path / 'run.json'),
+                       metrics_textfile=str(tmp_path / 'run.prom'))
+    assert result.returncode == 0, result.stderr
+    with open(tmp_path / 'run.json', encoding='utf-8') as file:
+        totals = json.load(file)['totals']
+    assert totals['packets_read_total'] == len(Read_All(capture))
+    samples = len(list((tmp_path / 'out').glob('*/Tabular/*.csv')))
+    assert totals['samples_emitted_total'] == totals['flows_built_total'] == samples
+    assert f'gflowmeter_samples_emitted_total{{pcap="capture.pcap"}} {samples}' in (tmp_path / 'run.prom').read_text()
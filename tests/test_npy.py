@@ -0,0 +1,27 @@
+import csv
+import numpy as np
+from captures import Read_Samples, Run_Gflow
+from GFlowMeter.writers import Get_Npy_Header, NPY_HEADER_LENGTH, Read_Npy_Shape
+
+
+def test_npy_has_the_csv_samples(capture: str, tmp_path) -> None:
+    outputs = []
+    for output_format in ('csv', 'npy'):
+        result = Run_Gflow(str(tmp_path / output_format), capture, output_format=output_format)
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Samples(str(tmp_path / output_format / 'out'), output_format))
+    assert outputs[0]['Tabular'] and outputs[0] == outputs[1]
+
+    save_folder = tmp_path / 'npy' / 'out'
+    tabular = np.load(save_folder / 'Tabular.npy', mmap_mode='r')
+    assert tabular.dtype == np.uint8 and tabular.shape == (len(outputs[0]['Tabular']), 64)
+    assert Read_Npy_Shape(str(save_folder / 'Statistical.npy'))[0] == tabular.shape[0]
+    with open(save_folder / 'Index.csv', newline='') as file:
+        rows = list(csv.DictReader(file))
+    assert [int(row['Row']) for row in rows] == list(range(tabular.shape[0]))
+    assert {row['Protocol'] for row in rows} <= {'TCP', 'UDP', 'SCTP'}
+
+
+def test_npy_header_length() -> None:
+    # Fixed, so the row count can be rewritten in place as rows are appended
+    assert len(Get_Npy_Header(np.dtype(np.float64), (10 ** 12, 55))) == NPY_HEADER_LENGTH
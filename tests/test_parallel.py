@@ -0,0 +1,19 @@
+from captures import Read_Output, Run_Gflow
+
+
+def test_workers_give_the_serial_output(capture: str, tmp_path) -> None:
+    outputs = []
+    for workers in (1, 2):
+        result = Run_Gflow(str(tmp_path / str(workers)), capture, '--workers', str(workers))
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Output(str(tmp_path / str(workers) / 'out')))
+    assert outputs[0] and outputs[0] == outputs[1]
+
+
+def test_workers_give_the_serial_output_in_one_file(capture: str, tmp_path) -> None:
+    outputs = []
+    for workers in (1, 2):
+        result = Run_Gflow(str(tmp_path / str(workers)), capture, '--workers', str(workers), output_format='npy')
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Output(str(tmp_path / str(workers) / 'out')))
+    assert outputs[0] and outputs[0] == outputs[1]
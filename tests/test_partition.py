@@ -0,0 +1,79 @@
+import gzip
+import os
+import struct
+import pytest
+from captures import Pcapng_Section, Read_All, Read_Output, Run_Gflow, Write_Pcapng
+from GFlowMeter.partition import Can_Partition, Get_Partition_Bytes
+from GFlowMeter.reader import Pcap_Reader
+
+
+def Read_Partitions(path: str, partition_bytes: int) -> list:
+    # Records of every range, one list per range
+    with Pcap_Reader(path) as reader:
+        return [list(reader.Read_Partition(partition)) for partition in reader.Iter_Partitions(partition_bytes)]
+
+
+def Write_Simple_Blocks(path: str, records: list) -> str:
+    # One section where every third packet is a Simple Packet Block, which takes the timestamp of the one before
+    section = Pcapng_Section(records[:1])
+    blocks = [section]
+    for number, record in enumerate(records[1:], 1):
+        if number % 3:
+            blocks.append(Pcapng_Section([record])[28 + 32:])
+            continue
+        padding = -len(record.data) % 4
+        length = 16 + len(record.data) + padding
+        blocks.append(struct.pack('<III', 3, length, record.wire_length) + record.data + bytes(padding)
+                      + struct.pack('<I', length))
+    with open(path, 'wb') as file:
+        file.write(b''.join(blocks))
+    return path
+
+
+@pytest.mark.parametrize('partition_bytes', [1, 1000, 5000])
+def test_ranges_hold_every_record_once(capture: str, tmp_path, partition_bytes: int) -> None:
+    records = Read_All(capture)
+    pcapng = Write_Pcapng(str(tmp_path / 'capture.pcapng'), records, sections=3)
+    simple = Write_Simple_Blocks(str(tmp_path / 'simple.pcapng'), records)
+    for path in (capture, pcapng, simple):
+        ranges = Read_Partitions(path, partition_bytes)
+        assert len(ranges) > 1
+        assert [record for part in ranges for record in part] == Read_All(path)
+    if partition_bytes == 1:
+        # Every range is a single record
+        assert all(len(part) == 1 for part in Read_Partitions(capture, partition_bytes))
+
+
+def test_truncated_file_ends_like_one_pass(capture: str, tmp_path) -> None:
+    with open(capture, 'rb') as file:
+        content = file.read()
+    path = tmp_path / 'truncated.pcap'
+    path.write_bytes(content[:-5])
+    ranges = Read_Partitions(str(path), 4000)
+    assert [record for part in ranges for record in part] == Read_All(str(path))
+
+
+def test_only_plain_files_are_partitioned(capture: str, tmp_path) -> None:
+    compressed = tmp_path / 'capture.pcap.gz'
+    with open(capture, 'rb') as file:
+        compressed.write_bytes(gzip.compress(file.read()))
+    assert Can_Partition(capture, 1000)
+    assert not Can_Partition(capture, os.path.getsize(capture))
+    assert not Can_Partition(str(compressed), 1000)
+    assert Get_Partition_Bytes({}) is None and Get_Partition_Bytes({'partition_mb': 0.5}) == 2 ** 19
+    for partition_mb in (0, -1, True, '8'):
+        with pytest.raises(ValueError, match='partition_mb'):
+            Get_Partition_Bytes({'partition_mb': partition_mb})
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'npy'])
+def test_partitioned_run_gives_the_serial_output(capture: str, tmp_path, output_format: str) -> None:
+    pcapng = Write_Pcapng(str(tmp_path / 'capture.pcapng'), Read_All(capture), sections=2)
+    for path in (capture, pcapng):
+        outputs = []
+        for run, settings in (('serial', {}), ('partitioned', {'workers': 2, 'partition_mb': 0.01})):
+            folder = str(tmp_path / f'{os.path.basename(path)}_{run}')
+            result = Run_Gflow(folder, path, output_format=output_format, **settings)
+            assert result.returncode == 0, result.stderr
+            outputs.append(Read_Output(os.path.join(folder, 'out')))
+        assert outputs[0] and outputs[0] == outputs[1]
@@ -0,0 +1,82 @@
+import gzip
+import os
+import struct
+from typing import List
+import pytest
+from captures import Read_All, Read_Samples, Run_Gflow, Write_Pcapng
+from GFlowMeter.reader import Record
+
+
+def Block(endian: str, block_type: int, body: bytes) -> bytes:
+    # Pads the body to 32 bits and wraps it in the block type and both block lengths
+    body += bytes(-len(body) % 4)
+    length = 12 + len(body)
+    return struct.pack(endian + 'II', block_type, length) + body + struct.pack(endian + 'I', length)
+
+
+def Interface_Block(endian: str, tsresol: int, tsoffset: int = 0) -> bytes:
+    options = struct.pack(endian + 'HHB3x', 9, 1, tsresol)
+    if tsoffset:
+        options += struct.pack(endian + 'HHq', 14, 8, tsoffset)
+    return Block(endian, 1, struct.pack(endian + 'HHI', 1, 0, 0) + options + bytes(4))
+
+
+def Section_Block(endian: str) -> bytes:
+    return Block(endian, 0x0A0D0D0A, struct.pack(endian + 'IHHq', 0x1A2B3C4D, 1, 0, -1))
+
+
+def Packet_Body(endian: str, record: Record, ticks: int, interface: int = 0, obsolete: bool = False) -> bytes:
+    # Enhanced Packet Block, or the obsolete Packet Block with its 16-bit interface and drop count
+    header = struct.pack(endian + 'HH', interface, 0) if obsolete else struct.pack(endian + 'I', interface)
+    return header + struct.pack(endian + 'IIII', ticks >> 32, ticks & 0xFFFFFFFF, len(record.data),
+                                record.wire_length) + record.data
+
+
+@pytest.fixture(scope='module')
+def records(capture: str) -> List[Record]:
+    return Read_All(capture)[:6]
+
+
+@pytest.mark.parametrize('endian', ['<', '>'])
+def test_timestamp_resolutions_and_offset(records: List[Record], tmp_path, endian: str) -> None:
+    # Power-of-2 resolution (0x80 | 20: 2^-20 s) with a 100 s offset, then milliseconds on a second interface
+    first, second = records[:3], records[3:]
+    blocks = [Section_Block(endian), Interface_Block(endian, 0x80 | 20, tsoffset=100), Interface_Block(endian, 3)]
+    for record in first:
+        blocks.append(Block(endian, 6, Packet_Body(endian, record, round(record.timestamp * 2 ** 20))))
+    for record in second:
+        blocks.append(Block(endian, 6, Packet_Body(endian, record, round(record.timestamp * 1000), interface=1)))
+    path = tmp_path / 'resolutions.pcapng'
+    path.write_bytes(b''.join(blocks))
+    parsed = Read_All(str(path))
+    assert [record.data for record in parsed] == [record.data for record in records]
+    assert [record.timestamp for record in parsed[:3]] == pytest.approx([r.timestamp + 100 for r in first], abs=1e-6)
+    assert [record.timestamp for record in parsed[3:]] == pytest.approx([r.timestamp for r in second], abs=1e-3)
+
+
+def test_simple_and_obsolete_packet_blocks(records: List[Record], tmp_path) -> None:
+    endian = '<'
+    first, simple, obsolete = records[0], records[1], records[2]
+    blocks = [Section_Block(endian), Interface_Block(endian, 6),
+              Block(endian, 6, Packet_Body(endian, first, round(first.timestamp * 10 ** 6))),
+              Block(endian, 3, struct.pack(endian + 'I', simple.wire_length) + simple.data),
+              Block(endian, 2, Packet_Body(endian, obsolete, round(obsolete.timestamp * 10 ** 6), obsolete=True))]
+    content = b''.join(blocks)
+    path, compressed = tmp_path / 'blocks.pcapng', tmp_path / 'blocks.pcapng.gz'
+    path.write_bytes(content)
+    compressed.write_bytes(gzip.compress(content))
+    # Simple Packet Blocks carry no timestamp, they keep the one of the packet before
+    expected = [first, simple._replace(timestamp=first.timestamp), obsolete]
+    assert Read_All(str(path)) == Read_All(str(compressed)) == expected
+
+
+@pytest.mark.parametrize('sections', [2, 3])
+def test_sections_give_the_pcap_samples(capture: str, tmp_path, sections: int) -> None:
+    pcapng = Write_Pcapng(str(tmp_path / 'capture.pcapng'), Read_All(capture), sections=sections)
+    assert Read_All(pcapng) == Read_All(capture)
+    outputs = []
+    for name, path in (('pcap', capture), ('pcapng', pcapng)):
+        result = Run_Gflow(str(tmp_path / name), path)
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Samples(os.path.join(tmp_path, name, 'out')))
+    assert outputs[0]['Tabular'] and outputs[0] == outputs[1]
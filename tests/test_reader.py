@@ -0,0 +1,59 @@
+import os
+import struct
+import pytest
+from captures import Pcapng_Section, Read_All, Read_Output, Run_Gflow, Write_Pcap, Write_Pcapng
+from GFlowMeter.reader import Record
+
+
+def test_pcap_records(capture: str) -> None:
+    records = Read_All(capture)
+    assert len(records) == 40 * 8
+    assert all(isinstance(record, Record) for record in records)
+    assert all(len(record.data) <= record.wire_length for record in records)
+
+
+def test_nanosecond_pcap_keeps_timestamps(capture: str, tmp_path) -> None:
+    records = Read_All(capture)
+    assert Read_All(Write_Pcap(str(tmp_path / 'nsec.pcap'), records, nanoseconds=True)) == records
+
+
+def test_pcapng_yields_pcap_records(capture: str, tmp_path) -> None:
+    records = Read_All(capture)
+    assert Read_All(Write_Pcapng(str(tmp_path / 'capture.pcapng'), records)) == records
+
+
+def test_truncated_record_stops_reading(capture: str, tmp_path) -> None:
+    with open(capture, 'rb') as file:
+        content = file.read()
+    path = tmp_path / 'truncated.pcap'
+    path.write_bytes(content[:-5])
+    records = Read_All(capture)
+    assert Read_All(str(path)) == records[:-1]
+
+
+def test_not_a_capture(tmp_path) -> None:
+    path = tmp_path / 'text.pcap'
+    path.write_bytes(b'not a capture at all, just some text')
+    with pytest.raises(ValueError):
+        Read_All(str(path))
+
+
+def test_pcapng_packet_overrunning_its_block(capture: str, tmp_path) -> None:
+    record = Read_All(capture)[0]
+    section = bytearray(Pcapng_Section([record]))
+    # The captured length of the only Enhanced Packet Block, after the 28-byte SHB and 32-byte IDB
+    struct.pack_into('<I', section, 28 + 32 + 20, len(record.data) + 64)
+    path = tmp_path / 'overrun.pcapng'
+    path.write_bytes(bytes(section))
+    with pytest.raises(ValueError, match='overruns'):
+        Read_All(str(path))
+
+
+def test_pcap_and_pcapng_give_the_same_samples(capture: str, tmp_path) -> None:
+    pcapng = Write_Pcapng(str(tmp_path / 'capture.pcapng'), Read_All(capture))
+    outputs = []
+    for name, path in (('pcap', capture), ('pcapng', pcapng)):
+        result = Run_Gflow(str(tmp_path / name), path)
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Output(os.path.join(tmp_path, name, 'out')))
+    assert outputs[0] and outputs[0] == outputs[1]
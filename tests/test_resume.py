@@ -0,0 +1,121 @@
+import csv
+import json
+import os
+import tarfile
+import pytest
+from captures import Make_Capture, Read_Output, Run_Gflow
+
+
+@pytest.fixture(scope='module')
+def folder(tmp_path_factory: pytest.TempPathFactory) -> str:
+    folder = tmp_path_factory.mktemp('pcaps')
+    for seed in range(3):
+        Make_Capture(str(folder / f'capture_{seed}.pcap'), flows=20, seed=seed)
+    return str(folder)
+
+
+def Interrupt(save_folder: str, position: int, splits_done: int = 0, next_index: int = None) -> dict:
+    # Rewrites the manifest of a finished run as if it stopped in the file at position (in path order)
+    path = os.path.join(save_folder, 'manifest.json')
+    with open(path, encoding='utf-8') as file:
+        manifest = json.load(file)
+    entries = [entry for _, entry in sorted(manifest['pcaps'].items())]
+    entry = entries[position]
+    next_index = entry['start_index'] if next_index is None else next_index
+    entry.update(status='partial', splits_done=splits_done, next_index=next_index)
+    for entry in entries[position + 1:]:
+        entry.update(status='pending', start_index=None, next_index=None, splits_done=0)
+    manifest['rows'] = next_index
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file)
+    return entries[position]
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_resume_csv(folder: str, tmp_path, workers: int) -> None:
+    result = Run_Gflow(str(tmp_path), folder, '--workers', str(workers))
+    assert result.returncode == 0, result.stderr
+    finished = Read_Output(str(tmp_path / 'out'))
+    entry = Interrupt(str(tmp_path / 'out'), 1)
+    # Samples written after the last recorded window, and one that was never renamed into place
+    tabular = tmp_path / 'out' / 'capture_1' / 'Tabular'
+    (tabular / f"Sample_{entry['start_index']}.csv").write_text('garbage')
+    (tabular / 'Sample_100000.csv').write_text('garbage')
+    (tabular / 'Sample_100001.csv.tmp').write_text('garbage')
+
+    result = Run_Gflow(str(tmp_path), folder, '--workers', str(workers))
+    assert result.returncode == 0, result.stderr
+    assert 'Resuming: 1/3' in result.stdout
+    assert Read_Output(str(tmp_path / 'out')) == finished
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_resume_npy_after_a_window(folder: str, tmp_path, workers: int) -> None:
+    result = Run_Gflow(str(tmp_path), folder, '--workers', str(workers), output_format='npy')
+    assert result.returncode == 0, result.stderr
+    finished = Read_Output(str(tmp_path / 'out'))
+    with open(tmp_path / 'out' / 'Index.csv', newline='') as file:
+        rows = list(csv.DictReader(file))
+    first_window = [row for row in rows if os.path.basename(row['Pcap']) == 'capture_1.pcap' and row['Split'] == '1']
+    assert first_window
+    Interrupt(str(tmp_path / 'out'), 1, 1, int(first_window[-1]['Sample_Index']) + 1)
+
+    result = Run_Gflow(str(tmp_path), folder, '--workers', str(workers), output_format='npy')
+    assert result.returncode == 0, result.stderr
+    assert Read_Output(str(tmp_path / 'out')) == finished
+
+
+def test_changed_configuration_is_not_resumed(folder: str, tmp_path) -> None:
+    assert Run_Gflow(str(tmp_path), folder).returncode == 0
+    Interrupt(str(tmp_path / 'out'), 1)
+    result = Run_Gflow(str(tmp_path), folder, target_sample_length=32)
+    assert result.returncode != 0 and 'configuration differs' in result.stderr
+    result = Run_Gflow(str(tmp_path), folder, '--fresh', target_sample_length=32)
+    assert result.returncode == 0, result.stderr
+
+
+def test_resume_tar_across_shards(folder: str, tmp_path) -> None:
+    settings = dict(output_format='tar', shard_max_samples=7)
+    result = Run_Gflow(str(tmp_path), folder, **settings)
+    assert result.returncode == 0, result.stderr
+    finished = Read_Output(str(tmp_path / 'out'))
+    assert len(finished) > 3
+    metadata = []
+    for name in sorted(finished):
+        with tarfile.open(tmp_path / 'out' / name) as shard:
+            metadata += [json.load(shard.extractfile(member)) for member in shard if member.name.endswith('.json')]
+    first_window = [sample['Sample_Index'] for sample in metadata
+                    if os.path.basename(sample['Pcap']) == 'capture_1.pcap' and sample['Split'] == 1]
+    # Stopped in the middle of a shard, the shards after it are written again
+    assert first_window and (first_window[-1] + 1) % 7
+    Interrupt(str(tmp_path / 'out'), 1, 1, first_window[-1] + 1)
+
+    result = Run_Gflow(str(tmp_path), folder, **settings)
+    assert result.returncode == 0, result.stderr
+    assert 'Resuming: 1/3' in result.stdout
+    assert Read_Output(str(tmp_path / 'out')) == finished
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_failed_write_is_not_recorded(folder: str, tmp_path, workers: int) -> None:
+    settings = dict(output_format='tar', shard_max_samples=7)
+    result = Run_Gflow(str(tmp_path / 'clean'), folder, '--workers', str(workers), **settings)
+    assert result.returncode == 0, result.stderr
+    with open(tmp_path / 'clean' / 'out' / 'manifest.json', encoding='utf-8') as file:
+        entries = [entry for _, entry in sorted(json.load(file)['pcaps'].items())]
+    # The writer thread cannot open the first shard that only holds samples of the second file
+    shard = entries[1]['start_index'] // 7 + 1
+    assert shard * 7 < entries[2]['start_index']
+    blocked = tmp_path / 'out' / f'shard-{shard:06d}.tar'
+    os.makedirs(blocked)
+    result = Run_Gflow(str(tmp_path), folder, '--workers', str(workers), **settings)
+    assert result.returncode != 0 and 'Writing the datasets failed' in result.stderr
+    with open(tmp_path / 'out' / 'manifest.json', encoding='utf-8') as file:
+        manifest = json.load(file)
+    assert manifest['rows'] <= shard * 7
+    assert [entry['status'] for _, entry in sorted(manifest['pcaps'].items())][:2] == ['done', 'partial']
+
+    os.rmdir(blocked)
+    result = Run_Gflow(str(tmp_path), folder, '--workers', str(workers), **settings)
+    assert result.returncode == 0, result.stderr
+    assert Read_Output(str(tmp_path / 'out')) == Read_Output(str(tmp_path / 'clean' / 'out'))
@@ -0,0 +1,60 @@
+import json
+import logging
+import os
+import pytest
+from captures import CONFIG, Make_Capture, Read_Output, Run_Gflow
+from GFlowMeter.scheduler import Schedule_Pcaps
+from GFlowMeter.writers import CSV_Writer
+
+
+@pytest.fixture(scope='module')
+def folder(tmp_path_factory: pytest.TempPathFactory) -> str:
+    # Files of different sizes, so their windows finish out of order on the pool
+    folder = tmp_path_factory.mktemp('pcaps')
+    for seed, flows in enumerate((60, 5, 30)):
+        Make_Capture(str(folder / f'capture_{seed}.pcap'), flows=flows, seed=seed)
+    return str(folder)
+
+
+@pytest.mark.parametrize('config', [{}, {'output_format': 'npy'}, {'idle_timeout': 0.5}],
+                         ids=['csv', 'npy', 'timeouts'])
+def test_shared_pool_gives_the_serial_output(folder: str, tmp_path, config: dict) -> None:
+    outputs = []
+    for workers in (1, 2):
+        result = Run_Gflow(str(tmp_path / str(workers)), folder, '--workers', str(workers), **config)
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Output(str(tmp_path / str(workers) / 'out')))
+    assert outputs[0] and outputs[0] == outputs[1]
+
+
+def test_indices_are_contiguous_across_files(folder: str, tmp_path) -> None:
+    result = Run_Gflow(str(tmp_path), folder, '--workers', '2')
+    assert result.returncode == 0, result.stderr
+    with open(tmp_path / 'out' / 'manifest.json', encoding='utf-8') as file:
+        entries = sorted(json.load(file)['pcaps'].items())
+    next_index = 0
+    for _, entry in entries:
+        assert entry['status'] == 'done' and entry['start_index'] == next_index
+        next_index = entry['next_index']
+    samples = [name for name in Read_Output(str(tmp_path / 'out')) if os.sep + 'Tabular' + os.sep in name]
+    assert sorted(int(name.split('_')[-1][:-4]) for name in samples) == list(range(next_index))
+
+
+def test_largest_file_is_dispatched_first(tmp_path, caplog: pytest.LogCaptureFixture) -> None:
+    pcaps = tmp_path / 'pcaps'
+    os.makedirs(pcaps)
+    small = Make_Capture(str(pcaps / 'a_small.pcap'), flows=5, seed=1)
+    large = Make_Capture(str(pcaps / 'b_large.pcap'), flows=60, seed=2)
+    result = Run_Gflow(str(tmp_path / 'serial'), str(pcaps))
+    assert result.returncode == 0, result.stderr
+    config = {**CONFIG, 'pcap_path': str(pcaps), 'save_folder': str(tmp_path / 'scheduled')}
+    caplog.set_level(logging.DEBUG, logger='GFlowMeter')
+    with CSV_Writer(config['save_folder'], per_pcap=True) as writer:
+        total = Schedule_Pcaps([small, large], config, writer, workers=2)
+    dispatched = [record.getMessage().split()[-1] for record in caplog.records
+                  if record.getMessage().startswith('Dispatching')]
+    assert dispatched == ['b_large.pcap', 'a_small.pcap']
+    # The small file listed first still gets the first indices
+    serial = Read_Output(str(tmp_path / 'serial' / 'out'))
+    assert serial and Read_Output(config['save_folder']) == serial
+    assert total == sum(os.sep + 'Tabular' + os.sep in name for name in serial)
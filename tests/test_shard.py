@@ -0,0 +1,48 @@
+import pytest
+from captures import Build_Frame, Read_All, Read_Output, Read_Samples, Run_Gflow, Synthetic_Flow
+from GFlowMeter.dissect import LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL
+from GFlowMeter.flowkey import SAMPLED_PROTOCOLS, Get_Flow_Key
+from GFlowMeter.shard import Get_Shard
+
+FLOWS = [Synthetic_Flow('tcp', 4, bytes((10, 0, 0, port % 7)), bytes((172, 16, 0, 1)), port, 443)
+         for port in range(40000, 40050)] + \
+    [Synthetic_Flow('udp', 6, bytes(15) + bytes((port % 5,)), bytes(15) + b'\x02', port, 53)
+     for port in range(40000, 40050)]
+TIMEOUTS = {'idle_timeout': 1.5, 'active_timeout': 4}
+
+
+def test_both_directions_go_to_one_shard() -> None:
+    shards = {}
+    for flow in FLOWS:
+        forward, reply = (Build_Frame('ether', flow, direction, 0, b'data') for direction in (True, False))
+        shard = Get_Shard(forward, LINKTYPE_ETHERNET, 4)
+        assert 0 <= shard < 4 and Get_Shard(reply, LINKTYPE_ETHERNET, 4) == shard
+        # The link-layer header does not matter
+        assert Get_Shard(Build_Frame('sll', flow, True, 0, b''), LINKTYPE_LINUX_SLL, 4) == shard
+        shards[shard] = shards.get(shard, 0) + 1
+    assert len(shards) == 4
+
+
+def test_only_sampled_packets_get_a_shard(capture: str) -> None:
+    for record in Read_All(capture):
+        key = Get_Flow_Key(record.data, record.link_type, True)
+        assert (Get_Shard(record.data, record.link_type, 3) != -1) == (key.protocol in SAMPLED_PROTOCOLS)
+    icmp = Synthetic_Flow('icmp', 4, bytes((10, 0, 0, 1)), bytes((172, 16, 0, 1)), 0, 0)
+    assert Get_Shard(Build_Frame('ether', icmp, True, 0, b'ping'), LINKTYPE_ETHERNET, 3) == -1
+    # A truncated transport header is keyed without ports, like other IP traffic
+    frame = Build_Frame('ether', FLOWS[0], True, 0, b'')
+    assert Get_Shard(frame[:14 + 20 + 2], LINKTYPE_ETHERNET, 3) == -1
+    assert Get_Shard(b'\x00' * 10, LINKTYPE_ETHERNET, 3) == -1
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'npy'])
+def test_sharded_run_gives_the_serial_samples(capture: str, tmp_path, output_format: str) -> None:
+    outputs = []
+    for run, settings in (('serial', {}), ('sharded', {'workers': 3, 'shard_flows': True})):
+        result = Run_Gflow(str(tmp_path / run), capture, output_format=output_format, **TIMEOUTS, **settings)
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Samples(str(tmp_path / run / 'out'), output_format))
+    assert outputs[0]['Tabular'] and outputs[0] == outputs[1]
+    if output_format == 'csv':
+        # Per-sample files, so also the same bytes
+        assert Read_Output(str(tmp_path / 'serial' / 'out')) == Read_Output(str(tmp_path / 'sharded' / 'out'))
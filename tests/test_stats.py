@@ -0,0 +1,104 @@
+import os
+import numpy as np
+import pytest
+from GFlowMeter.stats import BWD, FWD, Flow_Stats, Get_Statistical_Matrix
+
+MISC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'GFlowMeter', 'misc')
+
+
+def Feature_Names(bidirectional: bool) -> list:
+    with open(os.path.join(MISC, 'Bi_Feature_Names.txt' if bidirectional else 'Uni_Feature_Names.txt')) as file:
+        return [line.strip() for line in file if line.strip()]
+
+
+def Features(packets: list, bidirectional: bool = True) -> dict:
+    # packets: (direction, timestamp, total bytes, payload bytes)
+    flow = Flow_Stats(bidirectional)
+    for packet in packets:
+        flow.Add(*packet)
+    names = Feature_Names(bidirectional)
+    return dict(zip(names, Get_Statistical_Matrix([flow], names)[0].tolist()))
+
+
+def Expected(packets: list, description: str) -> dict:
+    # The features of some packets computed directly from their values
+    timestamps = np.array([packet[1] for packet in packets], dtype=np.float64)
+    sizes = np.array([packet[2] for packet in packets], dtype=np.float64)
+    payloads = np.array([packet[3] for packet in packets], dtype=np.float64)
+    iat = np.diff(timestamps)
+    duration = timestamps.max() - timestamps.min()
+    expected = {'Total Packets': len(packets), 'Total Bytes': sizes.sum(), 'Header Bytes': (sizes - payloads).sum()}
+    for values, name in ((sizes, 'Packet Bytes'), (payloads, 'Payload Bytes')):
+        expected.update({f'{name} Min': values.min(), f'{name} Max': values.max(), f'{name} Avg': values.mean(),
+                         f'{name} Variance': values.var()})
+    expected.update({'Duration': duration, 'Bytes/s': sizes.sum() / duration, 'Packets/s': len(packets) / duration,
+                     'IAT Total': iat.sum(), 'IAT Min': iat.min(), 'IAT Max': iat.max(), 'IAT Avg': iat.mean(),
+                     'IAT Variance': iat.var()})
+    return {description + name: value for name, value in expected.items()}
+
+
+PACKETS = [(FWD, 1.0, 60, 0), (BWD, 1.25, 1500, 1440), (FWD, 1.5, 52, 0), (FWD, 2.5, 700, 640), (BWD, 3.0, 40, 0)]
+
+
+def test_bidirectional_flow() -> None:
+    features = Features(PACKETS)
+    expected = Expected(PACKETS, 'Flow ')
+    expected.update(Expected([packet for packet in PACKETS if packet[0] == FWD], 'Fwd '))
+    expected.update(Expected([packet for packet in PACKETS if packet[0] == BWD], 'Bwd '))
+    assert set(expected) == set(features)
+    for name, value in expected.items():
+        assert features[name] == pytest.approx(value, rel=1e-12), name
+
+
+def test_unidirectional_flow() -> None:
+    packets = [(FWD, timestamp, size, payload) for _, timestamp, size, payload in PACKETS]
+    features = Features(packets, bidirectional=False)
+    expected = Expected(packets, 'Flow ')
+    assert set(expected) == set(features)
+    for name, value in expected.items():
+        assert features[name] == pytest.approx(value, rel=1e-12), name
+
+
+def test_single_packet() -> None:
+    features = Features([(FWD, 5.0, 100, 60)])
+    assert features['Flow Total Packets'] == features['Fwd Total Packets'] == 1
+    assert features['Fwd Packet Bytes Min'] == features['Fwd Packet Bytes Max'] == 100
+    assert features['Fwd Packet Bytes Variance'] == 0 and features['Fwd Header Bytes'] == 40
+    assert all(value == 0 for name, value in features.items()
+               if name.startswith('Bwd ') or 'IAT' in name or name.endswith(('Duration', '/s')))
+
+
+def test_one_direction_only() -> None:
+    packets = [packet for packet in PACKETS if packet[0] == FWD]
+    features = Features(packets)
+    assert all(value == 0 for name, value in features.items() if name.startswith('Bwd '))
+    for name, value in Expected(packets, '').items():
+        assert features['Flow ' + name] == pytest.approx(value, rel=1e-12) == features['Fwd ' + name], name
+
+
+def test_equal_timestamps() -> None:
+    features = Features([(FWD, 2.0, 100, 60), (BWD, 2.0, 80, 40), (FWD, 2.0, 90, 50)])
+    assert features['Flow Total Packets'] == 3 and features['Flow Total Bytes'] == 270
+    assert all(value == 0 for name, value in features.items() if 'IAT' in name or name.endswith(('Duration', '/s')))
+
+
+def test_many_flows_match_one_at_a_time() -> None:
+    rng = np.random.default_rng(0)
+    flows = []
+    for _ in range(50):
+        flow = Flow_Stats(True)
+        for timestamp in np.sort(rng.uniform(0, 10, rng.integers(1, 12))).tolist():
+            size = int(rng.integers(40, 1500))
+            flow.Add(int(rng.integers(0, 2)), timestamp, size, size - 40)
+        flows.append(flow)
+    names = Feature_Names(True)
+    matrix = Get_Statistical_Matrix(flows, names)
+    assert np.array_equal(matrix, np.concatenate([Get_Statistical_Matrix([flow], names) for flow in flows]))
+    assert Get_Statistical_Matrix([], names).shape == (0, len(names))
+
+
+def test_out_of_order_packets_have_no_negative_iat() -> None:
+    features = Features([(FWD, 1.0, 60, 0), (FWD, 3.0, 60, 0), (FWD, 2.0, 60, 0), (FWD, 4.0, 60, 0)])
+    assert features['Fwd IAT Min'] == 0 and features['Fwd IAT Max'] == 2
+    assert features['Fwd IAT Total'] == features['Fwd Duration'] == 3
+    assert features['Fwd IAT Avg'] == 1
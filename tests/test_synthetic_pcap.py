@@ -0,0 +1,39 @@
+import pytest
+from captures import Generate_Pcap, Read_All, Traffic_Profile
+from GFlowMeter.dissect import LINKTYPE_ETHERNET, LINKTYPE_LINUX_SLL
+from GFlowMeter.flowkey import Get_Flow_Key, Protocol
+
+PROFILE = Traffic_Profile(flows=30, packets_per_flow=6, max_payload=200, duration=5.0, seed=3)
+
+
+def test_same_profile_gives_the_same_file(tmp_path) -> None:
+    paths = [tmp_path / f'{name}.pcap' for name in ('first', 'second', 'other')]
+    results = [Generate_Pcap(str(paths[0]), PROFILE), Generate_Pcap(str(paths[1]), PROFILE),
+               Generate_Pcap(str(paths[2]), PROFILE._replace(seed=4))]
+    assert results[0] == results[1] and results[0][0] == 30 * 6
+    contents = [path.read_bytes() for path in paths]
+    assert contents[0] == contents[1] != contents[2]
+
+
+@pytest.mark.parametrize('link_type', ['ether', 'sll'])
+def test_pcapng_holds_the_pcap_packets(tmp_path, link_type: str) -> None:
+    profile = PROFILE._replace(link_type=link_type)
+    Generate_Pcap(str(tmp_path / 'capture.pcap'), profile)
+    pcap = Read_All(str(tmp_path / 'capture.pcap'))
+    Generate_Pcap(str(tmp_path / 'capture.pcapng'), profile._replace(file_format='pcapng'))
+    pcapng = Read_All(str(tmp_path / 'capture.pcapng'))
+    assert [record.data for record in pcap] == [record.data for record in pcapng]
+    assert [record.timestamp for record in pcap] == pytest.approx([record.timestamp for record in pcapng], abs=1e-6)
+    expected = LINKTYPE_ETHERNET if link_type == 'ether' else LINKTYPE_LINUX_SLL
+    assert {record.link_type for record in pcap} == {expected}
+    assert all(0 <= record.timestamp - pcap[0].timestamp <= 5.0 for record in pcap)
+
+
+def test_protocol_mix(tmp_path) -> None:
+    path = str(tmp_path / 'udp.pcap')
+    Generate_Pcap(path, PROFILE._replace(protocol_mix={'udp': 1.0}, ipv6_ratio=1.0))
+    keys = {Get_Flow_Key(record.data, record.link_type, True) for record in Read_All(path)}
+    assert len(keys) == 30 and {key.protocol for key in keys} == {Protocol.UDP}
+    assert all(key.address_a >> 32 != 0xFFFF for key in keys)
+    with pytest.raises(ValueError):
+        Generate_Pcap(path, PROFILE._replace(protocol_mix={'quic': 1.0}))
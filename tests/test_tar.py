@@ -0,0 +1,60 @@
+import os
+import tarfile
+import pytest
+from captures import Read_Output, Read_Samples, Run_Gflow
+
+
+def Shard_Members(save_folder: str) -> list:
+    # Members of every shard, as (shard name, member) in order
+    members = []
+    for name in sorted(os.listdir(save_folder)):
+        if name.endswith('.tar'):
+            with tarfile.open(os.path.join(save_folder, name)) as shard:
+                members += [(name, member) for member in shard.getmembers()]
+    return members
+
+
+@pytest.mark.parametrize('dataset_type', ['A', 'B', 'C'])
+def test_tar_samples_equal_csv(capture: str, tmp_path, dataset_type: str) -> None:
+    outputs = []
+    for output_format in ('csv', 'tar'):
+        result = Run_Gflow(str(tmp_path / output_format), capture, output_format=output_format,
+                           dataset_type=dataset_type)
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Samples(str(tmp_path / output_format / 'out'), output_format))
+    assert outputs[0]['Tabular'] or outputs[0]['Statistical']
+    assert outputs[0] == outputs[1]
+
+
+def test_members_are_reproducible(capture: str, tmp_path) -> None:
+    for run in ('first', 'second'):
+        result = Run_Gflow(str(tmp_path / run), capture, output_format='tar')
+        assert result.returncode == 0, result.stderr
+    assert Read_Output(str(tmp_path / 'first' / 'out')) == Read_Output(str(tmp_path / 'second' / 'out'))
+    members = [member for _, member in Shard_Members(str(tmp_path / 'first' / 'out'))]
+    assert all((member.mode, member.mtime, member.uid, member.uname) == (0o644, 0, 0, '') for member in members)
+    # Every sample is its tabular, statistical and metadata members, in that order
+    assert [member.name.split('.', 1)[1] for member in members[:3]] == ['tabular.bin', 'statistical.npy', 'json']
+    assert len({member.name.split('.')[0] for member in members}) * 3 == len(members)
+
+
+@pytest.mark.parametrize('limits', [{'shard_max_samples': 7}, {'shard_max_mb': 0.004}])
+def test_shard_rollover(capture: str, tmp_path, limits: dict) -> None:
+    result = Run_Gflow(str(tmp_path), capture, output_format='tar', **limits)
+    assert result.returncode == 0, result.stderr
+    save_folder = str(tmp_path / 'out')
+    samples = {}
+    for name, member in Shard_Members(save_folder):
+        if member.name.endswith('.json'):
+            samples[name] = samples.get(name, 0) + 1
+    assert len(samples) > 1
+    if 'shard_max_samples' in limits:
+        assert set(list(samples.values())[:-1]) == {7} and samples[max(samples)] <= 7
+    else:
+        max_bytes = 0.004 * 1024 ** 2
+        # A shard only goes over the bound with a single sample, plus the two closing blocks
+        assert all(os.path.getsize(os.path.join(save_folder, name)) - 1024 <= max_bytes or count == 1
+                   for name, count in samples.items())
+    # Sample indices continue across shards
+    indices = sorted(Read_Samples(save_folder, 'tar')['Tabular'])
+    assert indices == list(range(len(indices)))
@@ -0,0 +1,48 @@
+from captures import Build_Frame, Read_All, Synthetic_Flow
+from GFlowMeter.dissect import LINKTYPE_ETHERNET
+from GFlowMeter.flowtable import Flow_Table
+from GFlowMeter.reader import Record
+
+UDP4 = Synthetic_Flow('udp', 4, bytes((10, 0, 0, 1)), bytes((172, 16, 0, 1)), 40000, 53)
+TCP4 = Synthetic_Flow('tcp', 4, bytes((10, 0, 0, 2)), bytes((172, 16, 0, 2)), 40001, 443)
+
+
+def Packet(flow: Synthetic_Flow, timestamp: float, forward: bool = True) -> Record:
+    return Record(timestamp, 0, Build_Frame('ether', flow, forward, 0, b'data'), LINKTYPE_ETHERNET)
+
+
+def Sessions(table: Flow_Table, records: list) -> list:
+    # (sample index, packets, first seen, last seen) of every flow, in the order they ended
+    ended = []
+    for record in records:
+        table.Add(record)
+        ended += table.Pop_Expired()
+    table.Flush()
+    ended += table.Pop_Expired()
+    return [(flow.sample_index, flow.packets, flow.first_seen, flow.last_seen) for flow in ended]
+
+
+def test_idle_timeout_starts_a_new_flow() -> None:
+    records = [Packet(UDP4, 0.0), Packet(UDP4, 0.5, False), Packet(UDP4, 2.0), Packet(UDP4, 2.2, False)]
+    assert Sessions(Flow_Table(idle_timeout=1.0), records) == [(0, 2, 0.0, 0.5), (1, 2, 2.0, 2.2)]
+
+
+def test_active_timeout_cuts_long_flows() -> None:
+    records = [Packet(UDP4, timestamp / 2) for timestamp in range(7)]
+    assert Sessions(Flow_Table(active_timeout=1.0), records) == [(0, 3, 0.0, 1.0), (1, 3, 1.5, 2.5), (2, 1, 3.0, 3.0)]
+
+
+def test_flows_expire_when_the_clock_passes_them() -> None:
+    table = Flow_Table(idle_timeout=1.0)
+    table.Add(Packet(UDP4, 0.0))
+    table.Add(Packet(TCP4, 0.8))
+    assert table.Pop_Expired() == []
+    table.Add(Packet(TCP4, 1.5))
+    assert [flow.sample_index for flow in table.Pop_Expired()] == [0]
+    assert len(table) == 1
+
+
+def test_no_timeouts_keep_every_flow_open(capture: str) -> None:
+    records = Read_All(capture)
+    table = Flow_Table()
+    assert Sessions(table, records) == Sessions(Flow_Table(idle_timeout=1e9, active_timeout=1e9), records)
@@ -0,0 +1,37 @@
+import pytest
+from captures import Read_All
+from GFlowMeter.utils import Split_Cap, Time_Window
+
+
+def Numbers(capture_interval: float, timestamps: list) -> list:
+    window = Time_Window(capture_interval)
+    return [window.Get_Number(timestamp) for timestamp in timestamps]
+
+
+def test_windows_start_at_the_first_packet() -> None:
+    assert Numbers(1.0, [10.5, 11.0, 11.5, 12.5, 12.6]) == [1, 1, 1, 2, 3]
+
+
+def test_empty_windows_are_not_numbered() -> None:
+    assert Numbers(1.0, [0.0, 0.5, 7.2, 7.3, 9.0]) == [1, 1, 2, 2, 3]
+
+
+def test_out_of_order_packets_stay_in_the_current_window() -> None:
+    assert Numbers(1.0, [0.0, 1.5, 0.2, 2.1, 1.9]) == [1, 2, 2, 3, 3]
+
+
+def test_capture_interval_must_be_positive() -> None:
+    with pytest.raises(ValueError):
+        Time_Window(0)
+
+
+def test_split_cap_covers_every_record(capture: str) -> None:
+    records = Read_All(capture)
+    windows = [(number, list(window)) for number, window in Split_Cap(2, capture)]
+    assert [number for number, _ in windows] == list(range(1, len(windows) + 1))
+    assert [record for _, window in windows for record in window] == records
+    start = records[0].timestamp
+    for _, window in windows:
+        assert window[-1].timestamp - window[0].timestamp <= 2
+        assert window[0].timestamp >= start
+        start = window[-1].timestamp
@@ -0,0 +1,86 @@
+import threading
+import numpy as np
+import pytest
+from captures import Read_Samples, Run_Gflow
+from GFlowMeter.flowkey import Flow_Key, Protocol
+from GFlowMeter.writers import Background_Writer, CSV_Writer, Dataset_Writer, Get_Writer, Split_Dataset, Write_Error
+
+
+def Dataset(samples: int) -> Split_Dataset:
+    return Split_Dataset('capture.pcap', 1, np.arange(samples, dtype=np.int64),
+                         [Flow_Key(Protocol.TCP, index, 1, index + 1, 2) for index in range(samples)],
+                         np.arange(samples * 4, dtype=np.uint8).reshape(samples, 4),
+                         np.linspace(0, 1, samples * 2).reshape(samples, 2), ['a', 'b'])
+
+
+def test_slice_and_take() -> None:
+    dataset = Dataset(5)
+    part = dataset.Slice(1, 3)
+    assert part.sample_indices.tolist() == [1, 2] and part.flow_keys == dataset.flow_keys[1:3]
+    taken = dataset.Take(np.array([4, 0]))
+    assert taken.sample_indices.tolist() == [4, 0]
+    assert np.array_equal(taken.tabular, dataset.tabular[[4, 0]])
+    assert np.array_equal(taken.statistical, dataset.statistical[[4, 0]])
+
+
+def test_csv_writer(tmp_path) -> None:
+    with CSV_Writer(str(tmp_path)) as writer:
+        writer.Write(Dataset(3))
+        writer.Write(Dataset(0))
+    assert writer.rows == 3
+    assert (tmp_path / 'Tabular' / 'Sample_2.csv').read_text().splitlines() == ['0,1,2,3', '8,9,10,11']
+    assert (tmp_path / 'Statistical' / 'Sample_0.csv').read_text().splitlines() == ['a,b', '0.0,0.2']
+    assert not list(tmp_path.glob('**/*.tmp'))
+
+
+def test_unknown_output_format(tmp_path) -> None:
+    with pytest.raises(ValueError):
+        Get_Writer('xlsx', str(tmp_path))
+
+
+def test_backend_without_write_dataset() -> None:
+    class Incomplete_Writer(Dataset_Writer):
+        output_format = 'incomplete'
+
+    with pytest.raises(TypeError, match='Write_Dataset'):
+        Incomplete_Writer()
+
+
+def test_parquet_has_the_csv_samples(capture: str, tmp_path) -> None:
+    pytest.importorskip('pyarrow')
+    outputs = []
+    for output_format in ('csv', 'parquet'):
+        result = Run_Gflow(str(tmp_path / output_format), capture, output_format=output_format)
+        assert result.returncode == 0, result.stderr
+        outputs.append(Read_Samples(str(tmp_path / output_format / 'out'), output_format))
+    assert outputs[0]['Tabular'] and outputs[0]['Statistical']
+    assert outputs[0] == outputs[1]
+
+
+class Failing_Writer(CSV_Writer):
+    # Fails on its second dataset, once released
+    def __init__(self, save_folder: str) -> None:
+        super().__init__(save_folder)
+        self.released = threading.Event()
+
+    def Write_Dataset(self, dataset: Split_Dataset) -> int:
+        self.released.wait()
+        if self.rows:
+            raise OSError('No space left on device')
+        return super().Write_Dataset(dataset)
+
+
+def test_background_writer_stops_after_a_failed_write(tmp_path) -> None:
+    failing = Failing_Writer(str(tmp_path))
+    writer = Background_Writer(failing, max_pending=8)
+    done = []
+    for split in range(3):
+        writer.Write(Dataset(2)._replace(split=split))
+        writer.Then(lambda split=split: done.append(split))
+    failing.released.set()
+    with pytest.raises(Write_Error, match='No space left'):
+        writer.close()
+    # The callback of the failed split and everything after it were dropped
+    assert done == [0] and writer.rows == 2
+    with pytest.raises(Write_Error):
+        writer.Then(lambda: done.append('late'))